@@ -1,6 +1,7 @@
 import serial
 import csv
 import time
+from frame_validator import FrameValidator
 
 # ============ Parameter Configuration =============
 PORT = 'COM55'           # Serial port (Windows example), Linux can use '/dev/ttyUSB0'
@@ -8,6 +9,9 @@ BAUD = 115200           # Baud rate
 OUTPUT_CSV = 'mlx90640_data.csv'
 MAX_SAMPLES = 1024       # Maximum number of frames to collect (set to None for unlimited)
 SHOW_PROGRESS = True    # Whether to print real-time information
+VALIDATE = True         # Reject bad lines/frames (see frame_validator.py) instead of writing them
+QUARANTINE_CSV = 'mlx90640_quarantine.csv'  # Rejected lines with reason, for inspection
+REPORT_EVERY = 100      # Print validation rates every N lines
 # ================================================
 
 def main():
@@ -15,14 +19,17 @@ def main():
     time.sleep(2)  # Wait for serial port to stabilize
 
     print(f"Connected to {PORT}, starting data collection...")
-    with open(OUTPUT_CSV, 'w', newline='') as f:
+    validator = FrameValidator() if VALIDATE else None
+    with open(OUTPUT_CSV, 'w', newline='') as f, open(QUARANTINE_CSV, 'w', newline='') as qf:
         writer = csv.writer(f)
+        quarantine = csv.writer(qf)
+        quarantine.writerow(['time', 'reason', 'detail', 'line'])
         sample_count = 0
         header_written = False
 
         while True:
             try:
-                line = ser.readline().decode('utf-8').strip()
+                line = ser.readline().decode('utf-8', errors='replace').strip()
                 if not line:
                     continue
 
@@ -38,6 +45,16 @@ def main():
                 if not header_written:
                     continue
 
+                if validator:
+                    row, reason, detail = validator.validate(line)
+                    if validator.lines % REPORT_EVERY == 0:
+                        print(f"Validation: {validator.report()}")
+                    if reason:
+                        quarantine.writerow([f'{time.time():.3f}', reason, detail, line])
+                        if SHOW_PROGRESS:
+                            print(f"Rejected line ({reason}: {detail})")
+                        continue
+
                 # Write data row
                 writer.writerow(row)
                 sample_count += 1
@@ -57,6 +74,10 @@ def main():
                 print(f"Exception: {e}")
                 continue
 
+    if validator:
+        print(f"Validation: {validator.report()}")
+        if validator.rejected:
+            print(f"Rejected lines saved to {QUARANTINE_CSV}")
     ser.close()
     print("Serial port closed, data collection completed.")
 
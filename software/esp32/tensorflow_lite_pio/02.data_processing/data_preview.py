@@ -1,18 +1,28 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-import seaborn as sns
-from mpl_toolkits.axes_grid1 import make_axes_locatable
 import os
+import sys
+import matplotlib
+import numpy as np
 
 # Load data files
 BASE_DIR = os.path.dirname(__file__)
-data_fire = pd.read_csv(os.path.join(BASE_DIR, 'data', 'mlx90640_data_1.csv'))
-data_no_fire = pd.read_csv(os.path.join(BASE_DIR, 'data', 'mlx90640_data_0.csv'))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+from thermal_gallery import write_contact_sheets
+from thermal_dataset import load_dataset
+
+# Headless mode (CI / no display): only write PNG files, never block on plt.show()
+HEADLESS = os.environ.get('THERMAL_HEADLESS', '0') == '1'
+PREVIEW_DIR = os.path.join(BASE_DIR, 'preview')
+if HEADLESS:
+    matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+from mpl_toolkits.axes_grid1 import make_axes_locatable
 
-# Extract features (temperature data) and labels, ensure conversion to float
-features_fire = data_fire.iloc[:, 1:].astype(float).values  # Temperature values for fire source data
-features_no_fire = data_no_fire.iloc[:, 1:].astype(float).values  # Temperature values for no fire source data
+dataset = load_dataset(os.path.join(BASE_DIR, 'data'))
+
+# Extract features (temperature data) per class, flattened to one row per frame
+features_fire = dataset.by_class(1).features(shape=(768,))  # Temperature values for fire source data
+features_no_fire = dataset.by_class(0).features(shape=(768,))  # Temperature values for no fire source data
 
 # Calculate basic statistical information
 print("Fire source data statistics:")
@@ -41,28 +51,12 @@ def plot_thermal_image(data, title, subplot_pos):
     cax = divider.append_axes("right", size="5%", pad=0.05)
     plt.colorbar(im, cax=cax, label='Temperature (°C)')
 
-# Create a large figure to contain random sample subplots
-plt.figure(figsize=(20, 10))
-
-# Randomly select 4 sample indices
-random_indices = np.random.choice(len(features_fire), 4, replace=False)
-
-# Thermal image comparison (random samples)
-for i, idx in enumerate(random_indices):
-    # Fire source sample
-    plt.subplot(2, 4, i+1)
-    im = plt.imshow(features_fire[idx].reshape(24, 32), cmap='coolwarm', interpolation='nearest', vmin=0, vmax=120)
-    plt.title(f'Fire Source Sample {idx+1}')
-    plt.colorbar(label='Temperature (°C)')
-    
-    # No fire source sample
-    plt.subplot(2, 4, i+5)
-    im = plt.imshow(features_no_fire[idx].reshape(24, 32), cmap='coolwarm', interpolation='nearest', vmin=0, vmax=120)
-    plt.title(f'No Fire Source Sample {idx+1}')
-    plt.colorbar(label='Temperature (°C)')
-
-plt.tight_layout()
-plt.show()
+# Contact sheets of every captured frame (one vectorized render instead of one subplot per frame)
+fire_sheets = write_contact_sheets(features_fire, os.path.join(PREVIEW_DIR, 'fire'),
+                                   labels=np.ones(len(features_fire), dtype=np.int32))
+no_fire_sheets = write_contact_sheets(features_no_fire, os.path.join(PREVIEW_DIR, 'no_fire'),
+                                      labels=np.zeros(len(features_no_fire), dtype=np.int32))
+print(f"\nContact sheets written to {PREVIEW_DIR}: {len(fire_sheets)} fire, {len(no_fire_sheets)} no fire")
 
 # Display average thermal images in a new figure
 plt.figure(figsize=(15, 5))
@@ -71,5 +65,8 @@ plot_thermal_image(np.mean(features_fire, axis=0), 'Fire Source Average Thermal
 # No fire source average thermal image
 plot_thermal_image(np.mean(features_no_fire, axis=0), 'No Fire Source Average Thermal Image', 122)
 plt.tight_layout()
-plt.show()
+if HEADLESS:
+    plt.savefig(os.path.join(PREVIEW_DIR, 'average.png'))
+else:
+    plt.show()
 
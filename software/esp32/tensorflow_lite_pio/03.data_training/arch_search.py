@@ -0,0 +1,208 @@
+"""
+MCU-constrained architecture search for the thermal classifier.
+
+Candidate architectures (see thermal_model.build_model) are trained in
+parallel worker processes, converted to int8 TFLite and scored on int8
+accuracy, flatbuffer size, tensor-arena size and MAC count (arena and
+ESP32-C6 latency come from tflite_estimator.py). The Pareto front over those
+objectives is printed, and the recommended model is the fastest one whose
+arena fits the RAM budget and whose accuracy is within tolerance of the best.
+
+Results are cached per candidate in arch_search/ keyed by config, training
+settings and dataset hash, so re-running only trains new candidates.
+
+Usage:
+    python arch_search.py --workers 4 --epochs 10 --arena-budget-kb 64
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import multiprocessing
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+
+RESULTS_DIR = os.path.join(BASE_DIR, 'arch_search')
+
+SEARCH_SPACE = {
+    'conv_filters': [8, 12, 16, 24],
+    'kernel_size': [3, 5],
+    'sep_filters': [0, 16, 32],
+    'dense_units': [0, 16, 32],
+    'pool_size': [2],
+}
+
+# Objectives for the Pareto front: (metric, True if larger is better)
+OBJECTIVES = (('int8_accuracy', True), ('macs', False), ('flatbuffer_bytes', False), ('arena_bytes', False))
+
+
+def candidate_configs(max_candidates=None, seed=0):
+    """Grid over SEARCH_SPACE, baseline first, remaining order shuffled"""
+    import random
+    from thermal_model import DEFAULT_CONFIG
+    keys = sorted(SEARCH_SPACE)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(SEARCH_SPACE[k] for k in keys))]
+    baseline = {k: DEFAULT_CONFIG[k] for k in keys}
+    grid = [c for c in grid if c != baseline]
+    random.Random(seed).shuffle(grid)
+    configs = [baseline] + grid
+    return configs[:max_candidates] if max_candidates else configs
+
+
+def config_key(config, settings):
+    payload = json.dumps({'config': config, 'settings': settings}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def init_worker(threads):
+    """Pin each worker to a share of the CPU so parallel trainings don't oversubscribe"""
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def evaluate_candidate(job):
+    """Train, convert and measure one candidate (runs in a worker process)"""
+    config, settings = job
+    import numpy as np
+    import tensorflow as tf
+    from thermal_dataset import load_dataset
+    from input_pipeline import make_dataset
+    from thermal_model import build_model, count_macs, convert_to_int8, run_tflite
+    from tflite_estimator import estimate_tflite
+
+    tf.keras.utils.set_random_seed(settings['seed'])
+    dataset = load_dataset(settings['data_dir'], verbose=False)
+    train_set, test_set = dataset.split(test_size=0.2, random_state=24)
+    fit_set, val_set = train_set.split(test_size=0.1, random_state=7)
+
+    model = build_model(config)
+    t0 = time.perf_counter()
+    model.fit(make_dataset(fit_set, settings['batch_size'], training=True, seed=settings['seed']),
+              validation_data=make_dataset(val_set, settings['batch_size'], training=False),
+              epochs=settings['epochs'], verbose=0)
+    train_seconds = time.perf_counter() - t0
+    _, float_accuracy = model.evaluate(make_dataset(test_set, settings['batch_size'], training=False), verbose=0)
+
+    tflite_model = convert_to_int8(model, train_set.stratified_sample(settings['calibration_frames']).features())
+    scores, host_seconds = run_tflite(tflite_model, test_set.features())
+    int8_accuracy = float(np.mean((scores > 0.5) == (test_set.labels > 0)))
+    macs, _ = count_macs(model)
+    device = estimate_tflite(tflite_model)
+
+    return {
+        'config': config,
+        'float_accuracy': float(float_accuracy),
+        'int8_accuracy': int8_accuracy,
+        'macs': int(macs),
+        'params': int(model.count_params()),
+        'flatbuffer_bytes': len(tflite_model),
+        'arena_bytes': int(device['recommended_arena_bytes']),
+        'device_ms': float(device['latency_ms']),
+        'host_us_per_frame': host_seconds * 1e6,
+        'train_seconds': train_seconds,
+    }
+
+
+def dominates(a, b):
+    """True if result a is at least as good as b on every objective and better on one"""
+    better = False
+    for metric, maximize in OBJECTIVES:
+        x, y = (a[metric], b[metric]) if maximize else (b[metric], a[metric])
+        if x < y:
+            return False
+        if x > y:
+            better = True
+    return better
+
+
+def pareto_front(results):
+    return [r for r in results if not any(dominates(o, r) for o in results if o is not r)]
+
+
+def recommend(results, arena_budget, tolerance):
+    """Fastest estimated on-device latency among candidates that fit the arena budget and are within tolerance of the best accuracy"""
+    fitting = [r for r in results if r['arena_bytes'] <= arena_budget]
+    if not fitting:
+        return None
+    best = max(r['int8_accuracy'] for r in fitting)
+    good = [r for r in fitting if r['int8_accuracy'] >= best - tolerance]
+    return min(good, key=lambda r: (r['device_ms'], r['flatbuffer_bytes']))
+
+
+def format_row(r):
+    c = r['config']
+    arch = f"C{c['conv_filters']}k{c['kernel_size']}-S{c['sep_filters']}-D{c['dense_units']}"
+    return (f"{arch:<16} acc {r['float_accuracy']:.4f} int8 {r['int8_accuracy']:.4f}  "
+            f"MACs {r['macs']:>9,}  tflite {r['flatbuffer_bytes'] / 1024:6.1f} KB  "
+            f"arena {r['arena_bytes'] / 1024:5.1f} KB  C6 ~{r['device_ms']:5.2f} ms  host {r['host_us_per_frame']:6.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search int8 classifier architectures under MCU constraints')
+    parser.add_argument('--data-dir', default=os.path.join(BASE_DIR, 'data'))
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--threads-per-worker', type=int, default=0, help='0 = split CPUs evenly across workers')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-candidates', type=int, default=0, help='0 = whole search space')
+    parser.add_argument('--calibration-frames', type=int, default=200)
+    parser.add_argument('--arena-budget-kb', type=float, default=64.0)
+    parser.add_argument('--tolerance', type=float, default=0.01, help='Accepted int8 accuracy loss vs best')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from thermal_dataset import load_dataset
+    dataset = load_dataset(args.data_dir)
+    settings = {'data_dir': args.data_dir, 'epochs': args.epochs, 'batch_size': args.batch_size,
+                'calibration_frames': args.calibration_frames, 'seed': args.seed}
+    cache_settings = dict(settings, data_dir=None, data_hash=dataset.content_hash)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results, jobs = [], []
+    for config in candidate_configs(args.max_candidates or None, args.seed):
+        path = os.path.join(RESULTS_DIR, config_key(config, cache_settings) + '.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                results.append(json.load(f))
+        else:
+            jobs.append((config, settings))
+    print(f"{len(results)} cached candidates, {len(jobs)} to train with {args.workers} workers")
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    ctx = multiprocessing.get_context('spawn')  # TensorFlow is not fork-safe
+    with ctx.Pool(args.workers, initializer=init_worker, initargs=(threads,)) as pool:
+        for result in pool.imap_unordered(evaluate_candidate, jobs):
+            path = os.path.join(RESULTS_DIR, config_key(result['config'], cache_settings) + '.json')
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=4)
+            results.append(result)
+            print(f"[{len(results)}] {format_row(result)}")
+
+    front = sorted(pareto_front(results), key=lambda r: r['macs'])
+    with open(os.path.join(RESULTS_DIR, 'summary.json'), 'w') as f:
+        json.dump({'results': results, 'pareto_front': front}, f, indent=4)
+
+    print("\n=== Pareto front (int8 accuracy / MACs / flatbuffer / arena) ===")
+    for r in front:
+        print(format_row(r))
+
+    choice = recommend(results, args.arena_budget_kb * 1024, args.tolerance)
+    if choice is None:
+        print(f"\n❌ No candidate fits the {args.arena_budget_kb:.0f} KB arena budget")
+        sys.exit(1)
+    print("\n✅ Recommended (fastest within budget and tolerance):")
+    print(format_row(choice))
+    print(f"MODEL_CONFIG = {json.dumps(choice['config'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Content-addressed incremental build: dataset -> train -> convert -> estimate -> deploy.
+
+Each stage has a key hashed from its inputs (dataset content, the scripts
+and modules that define training/conversion, and the upstream artifacts).
+Outputs are stored in build/store/<stage>/<key>/; when a key was built
+before, its outputs are restored instead of re-running the stage, so only
+the stages whose inputs actually changed do any work.
+
+Usage:
+    python build_model.py                 # build model.h + model_arena.h, deploy to 04.run_model/src
+    python build_model.py --force convert # re-run conversion even if cached
+    python build_model.py --data-dir /path/to/csvs  # train and convert on another data directory
+    python build_model.py --deploy ../04.run_model/src/model.h ../../project/project_patformio/src/model.h
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+
+BUILD_DIR = os.path.join(BASE_DIR, 'build')
+STORE_DIR = os.path.join(BUILD_DIR, 'store')
+STATE_FILE = os.path.join(BUILD_DIR, 'state.json')
+DEFAULT_DEPLOY = [os.path.join(BASE_DIR, '..', '04.run_model', 'src', 'model.h')]
+
+# Stage definitions: script to run, source files that define its behaviour, outputs it produces
+STAGES = {
+    'train': {
+        'script': 'model_training.py',
+        'sources': ['model_training.py', 'thermal_model.py', 'model_compression.py', 'input_pipeline.py',
+                    '../common/thermal_dataset.py', '../common/thermal_dedup.py'],
+        'inputs': [],
+        'outputs': ['thermal_classifier_model.keras'],
+    },
+    'convert': {
+        'script': 'model_conversion.py',
+        'sources': ['model_conversion.py', 'thermal_model.py', 'quant_eval.py', 'c_header.py',
+                    '../common/thermal_dataset.py', '../common/thermal_dedup.py'],
+        'inputs': ['thermal_classifier_model.keras'],
+        'outputs': ['thermal_classifier_model.tflite', 'model.h', 'quantization_report.json'],
+    },
+    'estimate': {
+        'script': 'tflite_estimator.py',
+        'sources': ['tflite_estimator.py'],
+        'inputs': ['thermal_classifier_model.tflite'],
+        'outputs': ['model_arena.h'],
+    },
+}
+
+
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_key(name, dataset_hash, artifact_hashes):
+    """Hash of everything a stage depends on"""
+    stage = STAGES[name]
+    digest = hashlib.sha1(name.encode())
+    digest.update(dataset_hash.encode())
+    for rel in stage['sources']:
+        digest.update(rel.encode())
+        digest.update(hash_file(os.path.join(BASE_DIR, rel)).encode())
+    for rel in stage['inputs']:
+        digest.update(artifact_hashes[rel].encode())
+    return digest.hexdigest()[:20]
+
+
+def load_state():
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state):
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    with open(STATE_FILE, 'w') as f:
+        json.dump(state, f, indent=4)
+
+
+def outputs_current(name, key, state):
+    """Working-copy outputs already match the recorded build of this key"""
+    record = state.get(name)
+    if not record or record.get('key') != key:
+        return False
+    for rel, digest in record['outputs'].items():
+        path = os.path.join(BASE_DIR, rel)
+        if not os.path.exists(path) or hash_file(path) != digest:
+            return False
+    return True
+
+
+def run_stage(name, key, state, force=False, data_dir=None):
+    """Run, restore or skip a stage, returns {output: hash}"""
+    stage = STAGES[name]
+    store = os.path.join(STORE_DIR, name, key)
+
+    if not force and outputs_current(name, key, state):
+        print(f"[{name}] up to date ({key})")
+        return state[name]['outputs']
+
+    if not force and all(os.path.exists(os.path.join(store, rel)) for rel in stage['outputs']):
+        for rel in stage['outputs']:
+            shutil.copy2(os.path.join(store, rel), os.path.join(BASE_DIR, rel))
+        print(f"[{name}] restored from store ({key})")
+    else:
+        print(f"[{name}] running {stage['script']} ({key})")
+        t0 = time.perf_counter()
+        env = dict(os.environ, THERMAL_HEADLESS='1')
+        if data_dir:
+            env['THERMAL_DATA_DIR'] = os.path.abspath(data_dir)  # Read by model_training.py and model_conversion.py
+        result = subprocess.run([sys.executable, stage['script']], cwd=BASE_DIR, env=env)
+        if result.returncode != 0:
+            print(f"[{name}] ❌ failed with exit code {result.returncode}")
+            sys.exit(result.returncode)
+        os.makedirs(store, exist_ok=True)
+        for rel in stage['outputs']:
+            shutil.copy2(os.path.join(BASE_DIR, rel), os.path.join(store, rel))
+        print(f"[{name}] done in {time.perf_counter() - t0:.1f} s")
+
+    outputs = {rel: hash_file(os.path.join(BASE_DIR, rel)) for rel in stage['outputs']}
+    state[name] = {'key': key, 'outputs': outputs}
+    save_state(state)
+    return outputs
+
+
+def deploy(targets):
+    """Copy model.h (and model_arena.h next to it) to firmware projects, skipping identical files"""
+    for target in targets:
+        pairs = [('model.h', target), ('model_arena.h', os.path.join(os.path.dirname(target), 'model_arena.h'))]
+        for name, dest in pairs:
+            source = os.path.join(BASE_DIR, name)
+            if os.path.exists(dest) and hash_file(dest) == hash_file(source):
+                print(f"[deploy] {os.path.relpath(dest, BASE_DIR)} up to date")
+                continue
+            shutil.copy2(source, dest)
+            print(f"[deploy] {os.path.relpath(dest, BASE_DIR)} updated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental training -> conversion -> model.h build')
+    parser.add_argument('--data-dir', default=os.path.join(BASE_DIR, 'data'),
+                        help='Directory with the collected CSVs, used by the train and convert stages')
+    parser.add_argument('--force', nargs='*', choices=list(STAGES), default=None,
+                        help='Re-run the given stages (all when no stage is named)')
+    parser.add_argument('--deploy', nargs='*', default=DEFAULT_DEPLOY, help='model.h destinations')
+    args = parser.parse_args()
+    forced = set(STAGES) if args.force == [] else set(args.force or [])
+
+    from thermal_dataset import load_dataset
+    dataset_hash = load_dataset(args.data_dir).content_hash
+
+    state = load_state()
+    artifacts = {}
+    for name in STAGES:
+        key = stage_key(name, dataset_hash, artifacts)
+        artifacts.update(run_stage(name, key, state, force=name in forced, data_dir=args.data_dir))
+
+    if args.deploy:
+        deploy(args.deploy)
+
+
+if __name__ == '__main__':
+    main()
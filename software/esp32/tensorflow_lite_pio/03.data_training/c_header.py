@@ -0,0 +1,67 @@
+"""
+Fast C header emitter for TFLite flatbuffers.
+
+Bytes are formatted with a 256-entry lookup table in one vectorized numpy
+step and streamed to disk in blocks, instead of one format() call and one
+string concatenation per byte. The array is emitted as 16-byte aligned
+const data (kept in flash, not RAM) with length and CRC32 constants.
+"""
+import os
+import zlib
+import numpy as np
+
+BYTES_PER_LINE = 12
+LINES_PER_BLOCK = 4096
+
+# '0x00, ' ... '0xff, ' as a (256, 6) byte table
+_HEX_TABLE = np.frombuffer(''.join(f'0x{i:02x}, ' for i in range(256)).encode('ascii'), dtype=np.uint8).reshape(256, 6)
+
+
+def format_hex_lines(data, bytes_per_line=BYTES_PER_LINE, indent=b'  '):
+    """Format bytes as C array lines, returns one bytes object (no trailing comma on the last byte)"""
+    data = np.frombuffer(bytes(data), dtype=np.uint8) if not isinstance(data, np.ndarray) else data
+    count = len(data)
+    if count == 0:
+        return b''
+    full = count // bytes_per_line * bytes_per_line
+    parts = []
+    if full:
+        cells = _HEX_TABLE[data[:full]].reshape(-1, bytes_per_line * 6)
+        # Drop the trailing space of each line and add indent + newline
+        lines = np.empty((len(cells), len(indent) + bytes_per_line * 6), dtype=np.uint8)
+        lines[:, :len(indent)] = np.frombuffer(indent, dtype=np.uint8)
+        lines[:, len(indent):-1] = cells[:, :-1]
+        lines[:, -1] = ord('\n')
+        parts.append(lines.tobytes())
+    if full < count:
+        tail = _HEX_TABLE[data[full:]].reshape(-1)
+        parts.append(indent + tail[:-1].tobytes() + b'\n')
+    text = b''.join(parts)
+    # Remove the comma after the final byte
+    return text[:-2] + b'\n'
+
+
+def write_c_header(path, data, var_name='g_model', source=None):
+    """Stream a C/C++ header with `alignas(16) const unsigned char <var_name>[]`, returns the CRC32"""
+    data = np.frombuffer(bytes(data), dtype=np.uint8)
+    guard = var_name.upper() + '_H'
+    crc = zlib.crc32(data.tobytes()) & 0xffffffff
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(f'#ifndef {guard}\n#define {guard}\n\n'.encode())
+        f.write(b'#include <stdint.h>\n\n')
+        if source:
+            f.write(f'// Generated from {os.path.basename(source)}, do not edit\n'.encode())
+        f.write(f'const unsigned int {var_name}_len = {len(data)};\n'.encode())
+        f.write(f'const uint32_t {var_name}_crc32 = 0x{crc:08x};\n'.encode())
+        f.write(f'alignas(16) const unsigned char {var_name}[] = {{\n'.encode())
+        step = BYTES_PER_LINE * LINES_PER_BLOCK
+        for start in range(0, len(data), step):
+            block = format_hex_lines(data[start:start + step])
+            if start + step < len(data):
+                # Blocks other than the last keep their trailing comma
+                block = block[:-1] + b',\n'
+            f.write(block)
+        f.write(f'}};\n\n#endif // {guard}\n'.encode())
+    os.replace(tmp, path)
+    return crc
@@ -0,0 +1,154 @@
+"""
+Parallel k-fold cross-validation and seed sweep for the thermal classifier.
+
+Every (fold, seed) pair trains model_training.py's model from scratch in a
+worker process (CPU threads split across workers, as in arch_search.py),
+evaluates float loss/accuracy on the held-out fold, converts to int8 and
+measures int8 accuracy. Fold membership is fixed by --split-seed, seeds only
+change initialisation and shuffling, so seed and fold variance separate.
+
+Each result is cached in cross_validation/ keyed by model config, training
+settings, dataset hash, fold and seed, so adding seeds or folds only trains
+the new pairs.
+
+Usage:
+    python cross_validate.py --folds 5 --seeds 0 1 2 --workers 4
+    python cross_validate.py --config '{"conv_filters": 8, "dense_units": 16}'
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+from arch_search import config_key, init_worker
+
+RESULTS_DIR = os.path.join(BASE_DIR, 'cross_validation')
+METRICS = ('loss', 'accuracy', 'int8_accuracy')
+
+
+def evaluate_fold(job):
+    """Train and evaluate one (fold, seed) pair (runs in a worker process)"""
+    config, settings, fold, seed = job
+    import numpy as np
+    import tensorflow as tf
+    from thermal_dataset import load_dataset
+    from input_pipeline import make_dataset
+    from thermal_model import build_model, convert_to_int8, run_tflite
+
+    tf.keras.utils.set_random_seed(seed)
+    dataset = load_dataset(settings['data_dir'], verbose=False)
+    train_set, test_set = dataset.kfold(settings['folds'], fold, random_state=settings['split_seed'])
+    fit_set, val_set = train_set.split(test_size=0.1, random_state=7)
+
+    model = build_model(config)
+    t0 = time.perf_counter()
+    model.fit(make_dataset(fit_set, settings['batch_size'], training=True, seed=seed),
+              validation_data=make_dataset(val_set, settings['batch_size'], training=False),
+              epochs=settings['epochs'], verbose=0)
+    train_seconds = time.perf_counter() - t0
+    loss, accuracy = model.evaluate(make_dataset(test_set, settings['batch_size'], training=False), verbose=0)
+
+    tflite_model = convert_to_int8(model, train_set.stratified_sample(settings['calibration_frames']).features())
+    scores, _ = run_tflite(tflite_model, test_set.features())
+    return {
+        'fold': fold,
+        'seed': seed,
+        'config': config,
+        'loss': float(loss),
+        'accuracy': float(accuracy),
+        'int8_accuracy': float(np.mean((scores > 0.5) == (test_set.labels > 0))),
+        'test_frames': len(test_set),
+        'train_seconds': train_seconds,
+    }
+
+
+def aggregate(results):
+    """Mean, variance, std, min and max per metric over all runs, plus the spread of per-seed and per-fold means"""
+    import numpy as np
+    summary = {}
+    for metric in METRICS:
+        values = np.array([r[metric] for r in results], dtype=np.float64)
+        by_seed = [np.mean([r[metric] for r in results if r['seed'] == s]) for s in sorted({r['seed'] for r in results})]
+        by_fold = [np.mean([r[metric] for r in results if r['fold'] == f]) for f in sorted({r['fold'] for r in results})]
+        ddof = 1 if len(values) > 1 else 0
+        summary[metric] = {
+            'mean': float(values.mean()),
+            'var': float(values.var(ddof=ddof)),
+            'std': float(values.std(ddof=ddof)),
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'seed_std': float(np.std(by_seed, ddof=1)) if len(by_seed) > 1 else 0.0,
+            'fold_std': float(np.std(by_fold, ddof=1)) if len(by_fold) > 1 else 0.0,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel k-fold cross-validation and seed sweep')
+    parser.add_argument('--data-dir', default=os.path.join(BASE_DIR, 'data'))
+    parser.add_argument('--config', default='{}', help='JSON overrides of thermal_model.DEFAULT_CONFIG')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--split-seed', type=int, default=24, help='Fixes fold membership')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--threads-per-worker', type=int, default=0, help='0 = split CPUs evenly across workers')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--calibration-frames', type=int, default=200)
+    args = parser.parse_args()
+
+    from thermal_model import DEFAULT_CONFIG
+    from thermal_dataset import load_dataset
+    config = dict(DEFAULT_CONFIG, **json.loads(args.config))
+    dataset = load_dataset(args.data_dir)
+    settings = {'data_dir': args.data_dir, 'folds': args.folds, 'split_seed': args.split_seed,
+                'epochs': args.epochs, 'batch_size': args.batch_size,
+                'calibration_frames': args.calibration_frames}
+    cache_settings = dict(settings, data_dir=None, data_hash=dataset.content_hash)
+
+    def result_path(fold, seed):
+        return os.path.join(RESULTS_DIR, config_key(config, dict(cache_settings, fold=fold, seed=seed)) + '.json')
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results, jobs = [], []
+    for seed in args.seeds:
+        for fold in range(args.folds):
+            path = result_path(fold, seed)
+            if os.path.exists(path):
+                with open(path) as f:
+                    results.append(json.load(f))
+            else:
+                jobs.append((config, settings, fold, seed))
+    print(f"{len(results)} cached runs, {len(jobs)} to train with {args.workers} workers")
+
+    if jobs:
+        threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+        ctx = multiprocessing.get_context('spawn')  # TensorFlow is not fork-safe
+        with ctx.Pool(args.workers, initializer=init_worker, initargs=(threads,)) as pool:
+            for result in pool.imap_unordered(evaluate_fold, jobs):
+                with open(result_path(result['fold'], result['seed']), 'w') as f:
+                    json.dump(result, f, indent=4)
+                results.append(result)
+                print(f"[{len(results)}] fold {result['fold']} seed {result['seed']}: loss {result['loss']:.4f}  "
+                      f"acc {result['accuracy']:.4f}  int8 {result['int8_accuracy']:.4f}  "
+                      f"({result['train_seconds']:.0f} s)")
+
+    results.sort(key=lambda r: (r['seed'], r['fold']))
+    summary = aggregate(results)
+    with open(os.path.join(RESULTS_DIR, 'summary.json'), 'w') as f:
+        json.dump({'config': config, 'settings': dict(settings, seeds=args.seeds),
+                   'summary': summary, 'results': results}, f, indent=4)
+
+    print(f"\n=== {args.folds}-fold x {len(args.seeds)} seeds ({len(results)} runs) ===")
+    print(f"{'metric':<14} {'mean':>8} {'std':>8} {'var':>10} {'min':>8} {'max':>8} {'seed std':>9} {'fold std':>9}")
+    for metric, s in summary.items():
+        print(f"{metric:<14} {s['mean']:>8.4f} {s['std']:>8.4f} {s['var']:>10.2e} {s['min']:>8.4f} "
+              f"{s['max']:>8.4f} {s['seed_std']:>9.4f} {s['fold_std']:>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Host emulator of the 04.run_model inference loop.
+
+Mirrors loop() in 04.run_model/src/main.cpp step by step for every recorded
+frame: quantize the float frame with the model's input scale/zero point the
+way the firmware does (float32 math, truncation toward zero, narrowing to
+int8), invoke one frame at a time, dequantize the int8 output, apply the
+firmware's score gain and threshold. Frames are sharded over a pool of
+interpreters (one per worker process), so whole datasets replay at host
+speed. XNNPACK is disabled so the int8 builtin kernels run, as on the MCU.
+
+Reports throughput, per-frame timing, accuracy against the labels and
+decision agreement with the Keras model.
+
+Usage:
+    python device_emulator.py                           # thermal_classifier_model.tflite over all recorded frames
+    python device_emulator.py ../04.run_model/src/model.h --split test --workers 8 --csv replay.csv
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+import numpy as np
+import tensorflow as tf
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+from thermal_dataset import load_dataset, TEMP_SCALE
+from tflite_estimator import read_model_bytes
+from quant_eval import THRESHOLD
+
+# Constants of loop() in 04.run_model/src/main.cpp
+FIRMWARE_SCORE_GAIN = 2.0   # score = (result - zero_point) * scale * 2
+FIRMWARE_THRESHOLD = 0.6    # score >= 0.6 -> "Fire detected"
+
+
+def firmware_quantize(frame, scale, zero_point):
+    """`int8_t q = val / scale + zero_point` as compiled for the ESP32-C6, returns (int8 values, wrapped count)
+
+    The float -> int conversion truncates toward zero and saturates to int32,
+    storing into int8_t keeps the low byte, so values outside [-128, 127] wrap.
+    """
+    x = np.asarray(frame, dtype=np.float32) / np.float32(scale) + np.float32(zero_point)
+    q = np.clip(np.trunc(x), -2 ** 31, 2 ** 31 - 1).astype(np.int64)
+    return q.astype(np.int8), int(np.count_nonzero((q < -128) | (q > 127)))
+
+
+def nearest_quantize(frame, scale, zero_point):
+    """Round-to-nearest with saturation (what conversion calibrates for), returns (int8 values, clipped count)"""
+    q = np.round(np.asarray(frame, dtype=np.float32) / np.float32(scale)) + zero_point
+    return np.clip(q, -128, 127).astype(np.int8), int(np.count_nonzero((q < -128) | (q > 127)))
+
+
+QUANTIZERS = {'firmware': firmware_quantize, 'nearest': nearest_quantize}
+
+
+class DeviceEmulator:
+    """One interpreter running the firmware loop on a single frame at a time"""
+
+    def __init__(self, tflite_model, rounding='firmware'):
+        self.interpreter = tf.lite.Interpreter(
+            model_content=bytes(tflite_model), num_threads=1,
+            experimental_op_resolver_type=tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+        self.interpreter.allocate_tensors()
+        input_detail = self.interpreter.get_input_details()[0]
+        output_detail = self.interpreter.get_output_details()[0]
+        self.input_index, self.output_index = input_detail['index'], output_detail['index']
+        self.input_shape = tuple(input_detail['shape'])
+        self.in_scale, self.in_zero = input_detail['quantization']
+        self.out_scale, self.out_zero = output_detail['quantization']
+        self.quantize = QUANTIZERS[rounding]
+
+    def step(self, frame):
+        """One loop() iteration, returns (raw int8 output, score, fire, wrapped pixels, invoke seconds)"""
+        q, wrapped = self.quantize(frame, self.in_scale, self.in_zero)
+        self.interpreter.set_tensor(self.input_index, q.reshape(self.input_shape))
+        t0 = time.perf_counter()
+        self.interpreter.invoke()
+        invoke_seconds = time.perf_counter() - t0
+        raw = int(self.interpreter.get_tensor(self.output_index).reshape(-1)[0])
+        score = np.float32(raw - self.out_zero) * np.float32(self.out_scale) * np.float32(FIRMWARE_SCORE_GAIN)
+        return raw, float(score), bool(score >= FIRMWARE_THRESHOLD), wrapped, invoke_seconds
+
+
+_worker = {}
+
+
+def _init_worker(tflite_model, data_dir, rounding):
+    """Load the dataset (memory-mapped cache) and build this process's interpreter once"""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    _worker['dataset'] = load_dataset(data_dir, verbose=False)
+    _worker['emulator'] = DeviceEmulator(tflite_model, rounding)
+
+
+def _replay_shard(rows, chunk_size=1024):
+    """Run the loop over dataset rows with this process's interpreter, returns per-frame arrays"""
+    emulator = _worker['emulator']
+    n = len(rows)
+    out = {
+        'raw': np.zeros(n, dtype=np.int8),
+        'score': np.zeros(n, dtype=np.float32),
+        'fire': np.zeros(n, dtype=bool),
+        'wrapped': np.zeros(n, dtype=np.int32),
+        'invoke_seconds': np.zeros(n, dtype=np.float64),
+        'loop_seconds': np.zeros(n, dtype=np.float64),
+    }
+    out['span'] = np.array([time.time(), 0.0])
+    i = 0
+    for pixels, _ in _worker['dataset'].subset(rows).iter_chunks(chunk_size):
+        frames = pixels.astype(np.float32) * np.float32(1.0 / TEMP_SCALE)
+        for frame in frames:
+            t0 = time.perf_counter()
+            raw, score, fire, wrapped, invoke_seconds = emulator.step(frame)
+            out['loop_seconds'][i] = time.perf_counter() - t0
+            out['invoke_seconds'][i] = invoke_seconds
+            out['raw'][i], out['score'][i], out['fire'][i], out['wrapped'][i] = raw, score, fire, wrapped
+            i += 1
+    out['span'][1] = time.time()
+    return out
+
+
+def replay(tflite_model, data_dir, rows, workers=1, rounding='firmware', shard_size=2048):
+    """Run the firmware loop over the given dataset rows, returns (per-frame arrays, replay seconds)
+
+    Each worker process owns one interpreter; rows are handed out in shards
+    and results are reassembled in the original order. Replay seconds span
+    the first shard start to the last shard end, excluding process startup.
+    """
+    shards = [rows[i:i + shard_size] for i in range(0, len(rows), shard_size)]
+    if workers <= 1:
+        _init_worker(tflite_model, data_dir, rounding)
+        parts = [_replay_shard(shard) for shard in shards]
+    else:
+        ctx = multiprocessing.get_context('spawn')  # TensorFlow is not fork-safe
+        with ctx.Pool(workers, initializer=_init_worker, initargs=(bytes(tflite_model), data_dir, rounding)) as pool:
+            parts = pool.map(_replay_shard, shards)
+    replay_seconds = max(p['span'][1] for p in parts) - min(p['span'][0] for p in parts)
+    out = {key: np.concatenate([p[key] for p in parts]) for key in parts[0] if key != 'span'}
+    return out, replay_seconds
+
+
+def keras_scores(keras_model, view, batch_size=256, chunk_size=4096):
+    """Float model probabilities for the same frames, streamed in chunks"""
+    scores = []
+    for pixels, _ in view.iter_chunks(chunk_size):
+        frames = (pixels.astype(np.float32) * np.float32(1.0 / TEMP_SCALE)).reshape((-1,) + keras_model.input_shape[1:])
+        scores.append(keras_model.predict(frames, batch_size=batch_size, verbose=0).reshape(-1))
+    return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+
+def _percentiles_us(seconds):
+    if not len(seconds):
+        return {}
+    p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1e6
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(seconds.max() * 1e6)}
+
+
+def summarize(out, replay_seconds, labels, keras=None, workers=1, rounding='firmware'):
+    n = len(out['fire'])
+    report = {
+        'frames': int(n),
+        'workers': int(workers),
+        'rounding': rounding,
+        'replay_seconds': float(replay_seconds),
+        'frames_per_second': float(n / replay_seconds) if replay_seconds > 0 else 0.0,
+        'invoke_us': _percentiles_us(out['invoke_seconds']),
+        'loop_us': _percentiles_us(out['loop_seconds']),
+        'fire_rate': float(out['fire'].mean()) if n else 0.0,
+        'accuracy': float(np.mean(out['fire'] == (labels > 0))) if n else 0.0,
+        'frames_with_wrapped_pixels': int(np.count_nonzero(out['wrapped'])),
+    }
+    if keras is not None:
+        # Same threshold as training/conversion, and the firmware's effective probability threshold
+        effective = FIRMWARE_THRESHOLD / FIRMWARE_SCORE_GAIN
+        report['keras_accuracy'] = float(np.mean((keras > THRESHOLD) == (labels > 0)))
+        report['agreement_keras'] = float(np.mean(out['fire'] == (keras > THRESHOLD)))
+        report['agreement_keras_at_firmware_threshold'] = float(np.mean(out['fire'] == (keras >= effective)))
+    return report
+
+
+def print_report(report):
+    print("\n=== Device loop emulation ===")
+    print(f"Frames: {report['frames']}  workers: {report['workers']}  rounding: {report['rounding']}")
+    print(f"Throughput: {report['frames_per_second']:,.0f} frames/s ({report['replay_seconds']:.2f} s)")
+    for name in ('invoke_us', 'loop_us'):
+        t = report[name]
+        if t:
+            print(f"{name[:-3]:>6} per frame: p50 {t['p50']:.1f} us  p95 {t['p95']:.1f} us  "
+                  f"p99 {t['p99']:.1f} us  max {t['max']:.1f} us")
+    print(f"Fire rate: {report['fire_rate']:.4f}  accuracy vs labels: {report['accuracy']:.4f}")
+    if report['frames_with_wrapped_pixels']:
+        print(f"⚠️ {report['frames_with_wrapped_pixels']} frames have input pixels outside the int8 range "
+              f"({'wrapped' if report['rounding'] == 'firmware' else 'clipped'})")
+    if 'agreement_keras' in report:
+        print(f"Keras accuracy: {report['keras_accuracy']:.4f}")
+        print(f"Agreement with Keras: {report['agreement_keras']:.4f} at {THRESHOLD}, "
+              f"{report['agreement_keras_at_firmware_threshold']:.4f} at the firmware's effective "
+              f"{FIRMWARE_THRESHOLD / FIRMWARE_SCORE_GAIN:.2f}")
+
+
+def write_frames_csv(path, out, labels, keras=None):
+    columns = [labels, out['raw'], out['score'], out['fire'].astype(np.int8), out['invoke_seconds'] * 1e6]
+    header = 'label,raw,score,fire,invoke_us'
+    fmt = ['%d', '%d', '%.5f', '%d', '%.2f']
+    if keras is not None:
+        columns.append(keras)
+        header += ',keras_score'
+        fmt.append('%.5f')
+    np.savetxt(path, np.column_stack(columns), fmt=fmt, delimiter=',', header=header, comments='')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded frames through an emulation of the firmware loop')
+    parser.add_argument('model', nargs='?', default='thermal_classifier_model.tflite', help='.tflite or model.h')
+    parser.add_argument('--data-dir', default=os.path.join(BASE_DIR, 'data'))
+    parser.add_argument('--split', choices=['all', 'test'], default='all', help='test = held-out split of training')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Interpreters in the pool')
+    parser.add_argument('--rounding', choices=list(QUANTIZERS), default='firmware',
+                        help='firmware = truncate and wrap like main.cpp, nearest = round and saturate')
+    parser.add_argument('--keras', default='thermal_classifier_model.keras', help='Float model for agreement')
+    parser.add_argument('--no-keras', action='store_true')
+    parser.add_argument('--json', help='Write the report as JSON')
+    parser.add_argument('--csv', help='Write per-frame results as CSV')
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.data_dir)
+    view = dataset.split(test_size=0.2, random_state=24)[1] if args.split == 'test' else dataset
+    labels = view.labels
+
+    out, replay_seconds = replay(read_model_bytes(args.model), args.data_dir, view.index, args.workers, args.rounding)
+
+    keras = None
+    if not args.no_keras and os.path.exists(args.keras):
+        keras = keras_scores(tf.keras.models.load_model(args.keras), view)
+
+    report = summarize(out, replay_seconds, labels, keras, args.workers, args.rounding)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+    if args.csv:
+        write_frames_csv(args.csv, out, labels, keras)
+        print(f"📦 Saved per-frame results to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+tf.data input pipeline for the thermal classifier.
+
+Frames are streamed in chunks from the memory-mapped dataset cache
+(common/thermal_dataset.py) as raw int16 centi-degrees, cached, shuffled,
+batched, then decoded and augmented per batch in parallel and prefetched,
+so the accelerator never waits on Python-side data handling. With a
+`cache_path` the cache lives on disk and datasets larger than RAM work.
+"""
+import os
+import sys
+import tensorflow as tf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from thermal_dataset import FRAME_H, FRAME_W, TEMP_SCALE
+
+# Augmentation defaults suited to MLX90640 frames
+AUGMENT_DEFAULTS = {
+    'flip_horizontal': 0.5,   # Probability of mirroring left/right
+    'flip_vertical': 0.0,     # Sensor is mounted upright, off by default
+    'max_shift': 2,           # Random translation in pixels (border mirrored)
+    'ambient_offset': 2.0,    # Whole-frame offset in °C (ambient drift)
+    'noise_std': 0.3,         # Per-pixel Gaussian sensor noise in °C
+}
+
+
+def round_batch_size(batch_size, multiple=8):
+    """Round up to a multiple of 8 so float16 kernels get tensor-core friendly shapes"""
+    return int(-(-batch_size // multiple) * multiple)
+
+
+def decode(pixels, labels):
+    """int16 centi-degrees -> float32 °C frames (B, 24, 32, 1)"""
+    frames = tf.cast(pixels, tf.float32) * (1.0 / TEMP_SCALE)
+    frames = tf.reshape(frames, (-1, FRAME_H, FRAME_W, 1))
+    return frames, tf.cast(labels, tf.float32)
+
+
+def _random_flip(frames, probability, axis):
+    batch = tf.shape(frames)[0]
+    mask = tf.random.uniform((batch, 1, 1, 1)) < probability
+    return tf.where(mask, tf.reverse(frames, axis=[axis]), frames)
+
+
+def _random_shift(frames, max_shift):
+    """Per-sample translation by up to max_shift pixels, the border mirrored (symmetric padding)"""
+    batch = tf.shape(frames)[0]
+    padded = tf.pad(frames, [[0, 0], [max_shift, max_shift], [max_shift, max_shift], [0, 0]], mode='SYMMETRIC')
+    dy = tf.random.uniform((batch, 1), 0, 2 * max_shift + 1, dtype=tf.int32)
+    dx = tf.random.uniform((batch, 1), 0, 2 * max_shift + 1, dtype=tf.int32)
+    rows = tf.range(FRAME_H)[None, :] + dy
+    cols = tf.range(FRAME_W)[None, :] + dx
+    shifted = tf.gather(padded, rows, axis=1, batch_dims=1)
+    return tf.gather(shifted, cols, axis=2, batch_dims=1)
+
+
+def augment(frames, labels, options=None):
+    """Batch-wise augmentation: flips, small shifts, ambient offset, sensor noise"""
+    opts = dict(AUGMENT_DEFAULTS, **(options or {}))
+    if opts['flip_horizontal'] > 0:
+        frames = _random_flip(frames, opts['flip_horizontal'], axis=2)
+    if opts['flip_vertical'] > 0:
+        frames = _random_flip(frames, opts['flip_vertical'], axis=1)
+    if opts['max_shift'] > 0:
+        frames = _random_shift(frames, opts['max_shift'])
+    batch = tf.shape(frames)[0]
+    if opts['ambient_offset'] > 0:
+        frames += tf.random.uniform((batch, 1, 1, 1), -opts['ambient_offset'], opts['ambient_offset'])
+    if opts['noise_std'] > 0:
+        frames += tf.random.normal(tf.shape(frames), stddev=opts['noise_std'])
+    return frames, labels
+
+
+def make_dataset(view, batch_size=32, training=True, augment_options=None, shuffle_buffer=4096,
+                 cache_path='', chunk_size=1024, mixed_precision=False, seed=None):
+    """Build a tf.data pipeline over a ThermalDataset view
+
+    training=True shuffles every epoch, augments and drops the last partial
+    batch (static batch shape); evaluation pipelines keep order and all rows.
+    cache_path='' caches in memory, a file path caches on disk.
+    """
+    if mixed_precision:
+        batch_size = round_batch_size(batch_size)
+
+    ds = tf.data.Dataset.from_generator(
+        lambda: view.iter_chunks(chunk_size),
+        output_signature=(
+            tf.TensorSpec(shape=(None, FRAME_H * FRAME_W), dtype=tf.int16),
+            tf.TensorSpec(shape=(None,), dtype=tf.int32),
+        ),
+    )
+    # Cache the compact int16 rows, before any per-epoch randomness
+    ds = ds.unbatch().cache(cache_path)
+    if training:
+        ds = ds.shuffle(min(shuffle_buffer, max(len(view), 1)), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size, drop_remainder=training and len(view) >= batch_size)
+    ds = ds.map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+    if training and augment_options is not False:
+        ds = ds.map(lambda x, y: augment(x, y, augment_options), num_parallel_calls=tf.data.AUTOTUNE)
+    options = tf.data.Options()
+    options.deterministic = not training
+    ds = ds.with_options(options)
+    return ds.prefetch(tf.data.AUTOTUNE)
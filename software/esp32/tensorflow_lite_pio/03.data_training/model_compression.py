@@ -0,0 +1,203 @@
+"""
+Quantization-aware training and structured pruning for the thermal classifier.
+
+Pruning removes whole output channels (Conv2D filters, SeparableConv2D
+pointwise filters, hidden Dense units) ranked by L1 norm, following a
+polynomial sparsity schedule over the training epochs. Masked channels are
+zeroed (weights and bias) during training; strip_model then rebuilds a
+physically smaller model, so the int8 flatbuffer and on-device Invoke shrink
+(TFLM has no sparse kernels, zeroed weights alone would save nothing).
+
+Quantization-aware training fake-quantizes activations (thermal_model.FakeQuant
+layers, build_model(fake_quant=True)) and weights. Weight fake-quantization
+uses a straight-through estimator: before each batch the float weights are
+saved and replaced by their per-channel int8 rounding, after the batch the
+optimizer's update is applied back to the saved float weights.
+
+The stripped model is a plain Keras model, so model_conversion.py converts it
+to int8 TFLite and model.h unchanged.
+"""
+import numpy as np
+import tensorflow as tf
+from thermal_model import FakeQuant, build_model, count_macs
+
+# Polynomial schedule defaults (same shape as the TF model optimization toolkit)
+PRUNE_DEFAULTS = {
+    'target_sparsity': 0.5,   # Fraction of channels removed per prunable layer at the end
+    'begin_epoch': 1,         # First epoch that prunes
+    'end_epoch': 6,           # Epoch at which target sparsity is reached
+    'power': 3,               # Schedule exponent, prunes fast early and slowly near the end
+}
+
+
+def schedule_sparsity(epoch, target_sparsity, begin_epoch, end_epoch, power=3):
+    """Sparsity for an epoch, 0 before begin_epoch, target_sparsity from end_epoch on"""
+    if epoch < begin_epoch:
+        return 0.0
+    progress = min(1.0, (epoch - begin_epoch + 1) / max(1, end_epoch - begin_epoch + 1))
+    return target_sparsity * (1.0 - (1.0 - progress) ** power)
+
+
+def fake_quantize_weights(w, axis=-1):
+    """Symmetric per-channel int8 rounding along axis (as the TFLite converter quantizes weights)"""
+    reduce_axes = tuple(i for i in range(w.ndim) if i != axis % w.ndim)
+    scale = np.max(np.abs(w), axis=reduce_axes, keepdims=True) / 127.0
+    scale = np.where(scale > 0, scale, 1.0)
+    return (np.clip(np.round(w / scale), -127, 127) * scale).astype(w.dtype)
+
+
+def prunable_layers(model):
+    """Layers whose output channels can be removed: all but the final Dense"""
+    kinds = (tf.keras.layers.Conv2D, tf.keras.layers.SeparableConv2D, tf.keras.layers.Dense)
+    return [l for l in model.layers if isinstance(l, kinds)][:-1]
+
+
+def _output_kernel(layer):
+    return layer.pointwise_kernel if isinstance(layer, tf.keras.layers.SeparableConv2D) else layer.kernel
+
+
+def _quantized_kernels(model):
+    """(variable, per-channel axis) for every weight tensor that int8 conversion quantizes"""
+    pairs = []
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.SeparableConv2D):
+            pairs += [(layer.depthwise_kernel, 2), (layer.pointwise_kernel, -1)]
+        elif isinstance(layer, (tf.keras.layers.Conv2D, tf.keras.layers.Dense)):
+            pairs.append((layer.kernel, -1))
+    return pairs
+
+
+class CompressionCallback(tf.keras.callbacks.Callback):
+    """Applies the pruning schedule and weight fake-quantization during model.fit
+
+    Reports per epoch: channel sparsity, weight sparsity, parameters and MACs
+    of the stripped model, and the accuracy metrics from the fit logs.
+    """
+
+    def __init__(self, config, qat=True, prune=True, verbose=True, **prune_options):
+        super().__init__()
+        self.config = config
+        self.qat = qat
+        self.prune = prune
+        self.verbose = verbose
+        self.prune_options = dict(PRUNE_DEFAULTS, **prune_options)
+        self.masks = {}
+        self.history = []
+        self._float_weights = None
+
+    def on_train_begin(self, logs=None):
+        self.masks = {layer.name: np.ones(_output_kernel(layer).shape[-1], dtype=bool)
+                      for layer in prunable_layers(self.model)}
+
+    def on_epoch_begin(self, epoch, logs=None):
+        if not self.prune:
+            return
+        sparsity = schedule_sparsity(epoch, **self.prune_options)
+        for layer in prunable_layers(self.model):
+            kernel = _output_kernel(layer).numpy()
+            norms = np.abs(kernel).reshape(-1, kernel.shape[-1]).sum(axis=0)
+            channels = len(norms)
+            keep = max(1, channels - int(round(sparsity * channels)))
+            mask = np.zeros(channels, dtype=bool)
+            mask[np.argsort(-norms, kind='stable')[:keep]] = True
+            self.masks[layer.name] = mask
+        self._apply_masks()
+
+    def _apply_masks(self):
+        for layer in prunable_layers(self.model):
+            mask = self.masks[layer.name]
+            kernel = _output_kernel(layer)
+            kernel.assign(kernel.numpy() * mask)
+            if layer.use_bias:
+                layer.bias.assign(layer.bias.numpy() * mask)
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if not self.qat:
+            return
+        self._float_weights = []
+        for variable, axis in _quantized_kernels(self.model):
+            w = variable.numpy()
+            q = fake_quantize_weights(w, axis)
+            self._float_weights.append((variable, w, q))
+            variable.assign(q)
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self._float_weights is not None:
+            # Straight-through estimator: apply the update computed on quantized weights to the float weights
+            for variable, w, q in self._float_weights:
+                variable.assign(w + (variable.numpy() - q))
+            self._float_weights = None
+        if self.prune:
+            self._apply_masks()
+
+    def on_epoch_end(self, epoch, logs=None):
+        stripped, stripped_config = strip_model(self.model, self.config, self.masks)
+        macs, _ = count_macs(stripped)
+        kernels = [v.numpy() for v, _ in _quantized_kernels(self.model)]
+        channels = sum(len(m) for m in self.masks.values())
+        entry = {
+            'epoch': epoch + 1,
+            'channel_sparsity': 1.0 - sum(int(m.sum()) for m in self.masks.values()) / max(1, channels),
+            'weight_sparsity': float(sum((k == 0).sum() for k in kernels) / max(1, sum(k.size for k in kernels))),
+            'params': int(stripped.count_params()),
+            'macs': int(macs),
+            'config': stripped_config,
+        }
+        entry.update({k: float(v) for k, v in (logs or {}).items() if 'accuracy' in k})
+        self.history.append(entry)
+        if self.verbose:
+            accuracy = '  '.join(f"{k} {v:.4f}" for k, v in entry.items() if 'accuracy' in k)
+            print(f"  compression: channels pruned {entry['channel_sparsity']:.1%}, weights zero "
+                  f"{entry['weight_sparsity']:.1%}, stripped {entry['params']:,} params "
+                  f"(~{entry['params'] / 1024:.1f} KB int8), {entry['macs']:,} MACs  {accuracy}")
+
+
+def _kept(masks, layer, channels):
+    mask = masks.get(layer.name)
+    return np.flatnonzero(mask) if mask is not None else np.arange(channels)
+
+
+def strip_model(model, config, masks=None):
+    """Rebuild a plain (no FakeQuant) model keeping only unpruned channels, returns (model, config)
+
+    Weights are sliced so the stripped model computes the same function as
+    the masked model without fake quantization.
+    """
+    masks = masks or {}
+    source = [l for l in model.layers if not isinstance(l, FakeQuant)]
+    cfg = dict(config)
+    for layer in source:
+        if isinstance(layer, tf.keras.layers.SeparableConv2D):
+            cfg['sep_filters'] = len(_kept(masks, layer, layer.filters))
+        elif isinstance(layer, tf.keras.layers.Conv2D):
+            cfg['conv_filters'] = len(_kept(masks, layer, layer.filters))
+    hidden = [l for l in source if isinstance(l, tf.keras.layers.Dense)][:-1]
+    if hidden:
+        cfg['dense_units'] = len(_kept(masks, hidden[0], hidden[0].units))
+
+    stripped = build_model(cfg)
+    prev = np.arange(model.input_shape[-1])  # Kept channels feeding the current layer
+    for old, new in zip(source, stripped.layers):
+        if isinstance(old, tf.keras.layers.SeparableConv2D):
+            keep = _kept(masks, old, old.filters)
+            weights = [old.depthwise_kernel.numpy()[:, :, prev, :],
+                       old.pointwise_kernel.numpy()[:, :, prev, :][..., keep]]
+        elif isinstance(old, tf.keras.layers.Conv2D):
+            keep = _kept(masks, old, old.filters)
+            weights = [old.kernel.numpy()[:, :, prev, :][..., keep]]
+        elif isinstance(old, tf.keras.layers.Dense):
+            keep = _kept(masks, old, old.units)
+            weights = [old.kernel.numpy()[prev][:, keep]]
+        elif isinstance(old, tf.keras.layers.Flatten):
+            # Flatten is (y, x, channel) row-major: keep every position of the kept channels
+            _, h, w, c = old.input.shape
+            prev = (np.arange(h * w)[:, None] * c + prev[None, :]).reshape(-1)
+            continue
+        else:
+            continue
+        if old.use_bias:
+            weights.append(old.bias.numpy()[keep])
+        new.set_weights(weights)
+        prev = keep
+    stripped.optimizer.build(stripped.trainable_variables)  # Saved .keras files then reload cleanly
+    return stripped, cfg
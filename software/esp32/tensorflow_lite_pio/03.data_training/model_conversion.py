@@ -1,64 +1,63 @@
 import os
+import sys
+import json
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 import tensorflow as tf
 import numpy as np
 
-# Function: Convert some hex value into an array for C programming
-def hex_to_c_array(hex_data, var_name):
-    c_str = ''
-    # Create header guard
-    c_str += '#ifndef ' + var_name.upper() + '_H\n'
-    c_str += '#define ' + var_name.upper() + '_H\n\n'
-    # Add array length at top of file
-    c_str += '\nunsigned int ' + var_name + '_len = ' + str(len(hex_data)) + ';\n'
-    # Declare C variable
-    c_str += 'unsigned char ' + var_name + '[] = {'
-    hex_array = []
-    for i, val in enumerate(hex_data):
-        # Construct string from hex
-        hex_str = format(val, '#04x')
-        # Add formatting so each line stays within 80 characters
-        if (i + 1) < len(hex_data):
-            hex_str += ','
-        if (i + 1) % 12 == 0:
-            hex_str += '\n '
-        hex_array.append(hex_str)
-    # Add closing brace
-    c_str += '\n ' + format(' '.join(hex_array)) + '\n};\n\n'
-    # Close out header guard
-    c_str += '#endif //' + var_name.upper() + '_H'
-    return c_str
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+from thermal_dataset import load_dataset
+from thermal_dedup import dedup_split
+from thermal_model import convert_to_int8
+from quant_eval import evaluate_quantization, print_report
+from c_header import write_c_header
 
+# Collected CSVs, overridden by build_model.py --data-dir (same as model_training.py)
+DATA_DIR = os.environ.get('THERMAL_DATA_DIR', os.path.join(BASE_DIR, 'data'))
 
+# ============ Parameter Configuration =============
+CALIBRATION_FRAMES = 200    # Stratified sample of real training frames for int8 calibration
+MAX_ACCURACY_DROP = 0.01    # Fail when int8 accuracy is this much below float accuracy
+MAX_SCORE_DRIFT = 0.15      # Fail when the mean |float - int8| score difference exceeds this
+DEDUPLICATE = False         # Same setting as model_training.py, so evaluation uses the same held-out frames
+# ================================================
 
-# Define representative dataset generator (very important!)
-def representative_dataset():
-    for _ in range(100):
-        # Simulate raw temperature values (assuming thermal camera data is 0~200)
-        data = np.random.uniform(0, 200, size=(1, 24, 32, 1)).astype(np.float32)
-        yield [data]
-
+# Calibrate int8 ranges on real thermal frames (same split as model_training.py)
+dataset = load_dataset(DATA_DIR)
+if DEDUPLICATE:
+    train_set, test_set = dedup_split(dataset, test_size=0.2, random_state=24)
+else:
+    train_set, test_set = dataset.split(test_size=0.2, random_state=24)
+calibration = train_set.stratified_sample(CALIBRATION_FRAMES)
+print(f"Calibrating on {len(calibration)} frames {calibration.class_counts()}")
 
 # Load saved Keras model
 model = tf.keras.models.load_model('thermal_classifier_model.keras')
+tflite_model = convert_to_int8(model, calibration.features())
+
+# Batched float vs int8 evaluation on the held-out set
+report = evaluate_quantization(model, tflite_model, test_set.features(), test_set.labels)
+print_report(report)
+with open('quantization_report.json', 'w') as f:
+    json.dump(report, f, indent=4)
 
-converter = tf.lite.TFLiteConverter.from_keras_model(model)
-converter.optimizations = [tf.lite.Optimize.DEFAULT]
-converter.representative_dataset = representative_dataset
-converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
-converter.inference_input_type = tf.int8
-converter.inference_output_type = tf.int8
-tflite_model = converter.convert()
+accuracy_drop = report['float_accuracy'] - report['int8_accuracy']
+if accuracy_drop > MAX_ACCURACY_DROP or report['score_drift_mean'] > MAX_SCORE_DRIFT:
+    print(f"❌ Quantization loss too high: accuracy drop {accuracy_drop:.4f} (max {MAX_ACCURACY_DROP}), "
+          f"mean score drift {report['score_drift_mean']:.4f} (max {MAX_SCORE_DRIFT})")
+    sys.exit(1)
+print(f"✅ Quantization within limits (accuracy drop {accuracy_drop:.4f})")
 
 
-# Save TensorFlow Lite model
+# Save TensorFlow Lite model (only reached when quantization is within limits)
 with open('thermal_classifier_model.tflite', 'wb') as f:
     f.write(tflite_model)
 print("📦 Saved as thermal_classifier_model.tflite")
 
 
-with open('model' + '.h', 'w') as file:
-    file.write(hex_to_c_array(tflite_model, 'g_model'))
+crc = write_c_header('model.h', tflite_model, 'g_model', source='thermal_classifier_model.tflite')
+print(f"📦 Saved as model.h ({len(tflite_model)} bytes, crc32 0x{crc:08x})")
 
 # Get model input/output information
 interpreter = tf.lite.Interpreter(model_path='thermal_classifier_model.tflite')
@@ -1,56 +1,81 @@
 import os
+import sys
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
-import pandas as pd
 import numpy as np
 import tensorflow as tf
-import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
-from sklearn.utils import shuffle
-
 import matplotlib
-matplotlib.rc("font",family='Arial')
-
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+from thermal_gallery import write_contact_sheets
+from thermal_dataset import load_dataset
+from thermal_dedup import dedup_split
+from input_pipeline import make_dataset
+from thermal_model import DEFAULT_CONFIG, build_model
+from model_compression import CompressionCallback, strip_model
+
+# Headless mode (CI / no display): only write PNG files, never block on plt.show()
+HEADLESS = os.environ.get('THERMAL_HEADLESS', '0') == '1'
+# Collected CSVs, overridden by build_model.py --data-dir
+DATA_DIR = os.environ.get('THERMAL_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+if HEADLESS:
+    matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+matplotlib.rc("font",family='Arial')
 
-# === 1. Read and preprocess data ===
-df_1 = pd.read_csv('data/mlx90640_data_1.csv')
-df_0 = pd.read_csv('data/mlx90640_data_0.csv')
-
-data = pd.concat([df_1, df_0], ignore_index=True)
-data = shuffle(data, random_state=42)
+# ============ Parameter Configuration =============
+EPOCHS = 10
+BATCH_SIZE = 32
+AUGMENT = True            # On-the-fly flips / shifts / ambient offset / sensor noise
+MIXED_PRECISION = False   # mixed_float16 for GPU training; batch size is rounded to a multiple of 8
+DEDUPLICATE = False       # Drop near-duplicate frames and keep each cluster on one side of the split
+CACHE_PATH = ''           # '' caches in RAM, a file path (e.g. 'data/.cache/train.tfcache') for datasets larger than RAM
+MODEL_CONFIG = dict(DEFAULT_CONFIG)  # e.g. paste the configuration recommended by arch_search.py
+QAT = False               # Quantization-aware training (fake-quantized activations and weights)
+PRUNE = False             # Structured channel pruning, the saved model is physically smaller
+PRUNE_OPTIONS = {'target_sparsity': 0.5, 'begin_epoch': 1, 'end_epoch': 6}  # see model_compression.PRUNE_DEFAULTS
+# ================================================
 
-labels = data['label'].values.astype(np.int32)
-features = data.drop(columns=['label']).values.astype(np.float32)
+if MIXED_PRECISION:
+    tf.keras.mixed_precision.set_global_policy('mixed_float16')
 
-# Reshape data
-features = features.reshape(-1, 24, 32, 1)  
 
-X_train, X_test, y_train, y_test = train_test_split(
-    features, labels, test_size=0.2, random_state=24
-)
+# === 1. Read and preprocess data ===
+# Parsed once and cached as a memory-mapped binary (see common/thermal_dataset.py)
+dataset = load_dataset(DATA_DIR)
+if DEDUPLICATE:
+    # Near-duplicates (see common/thermal_dedup.py) would otherwise leak between train and test
+    train_set, test_set = dedup_split(dataset, test_size=0.2, random_state=24)
+    print(f"Deduplicated: {len(train_set) + len(test_set)} of {len(dataset)} frames kept")
+else:
+    train_set, test_set = dataset.split(test_size=0.2, random_state=24)
+
+fit_set, val_set = train_set.split(test_size=0.1, random_state=7)
+
+train_ds = make_dataset(fit_set, BATCH_SIZE, training=True, augment_options=None if AUGMENT else False,
+                        cache_path=CACHE_PATH, mixed_precision=MIXED_PRECISION)
+val_ds = make_dataset(val_set, BATCH_SIZE, training=False)
+test_ds = make_dataset(test_set, BATCH_SIZE, training=False)
+X_test, y_test = test_set.features(), test_set.labels
 
 # === 2. Build model ===
-model = tf.keras.Sequential([
-    tf.keras.Input(shape=(24, 32, 1)),
-    tf.keras.layers.Conv2D(16, (3, 3), activation='relu'),  # Reduce channel count
-    tf.keras.layers.MaxPooling2D((2, 2)),
-    tf.keras.layers.SeparableConv2D(32, (3, 3), activation='relu'),  # Separable convolution
-    tf.keras.layers.MaxPooling2D((2, 2)),
-    tf.keras.layers.Flatten(),
-    tf.keras.layers.Dense(32, activation='relu'),
-    tf.keras.layers.Dense(1, activation='sigmoid')
-])
-
-
-model.compile(optimizer='adam',
-              loss='binary_crossentropy',
-              metrics=['accuracy'])
+# Conv2D 16 -> SeparableConv2D 32 -> Dense 32 (see thermal_model.DEFAULT_CONFIG, tune with arch_search.py)
+model = build_model(MODEL_CONFIG, fake_quant=QAT)
+callbacks = []
+if QAT or PRUNE:
+    compression = CompressionCallback(MODEL_CONFIG, qat=QAT, prune=PRUNE, **PRUNE_OPTIONS)
+    callbacks.append(compression)
 
 # === 3. Train model and save training history ===
-history = model.fit(X_train, y_train,
-                    epochs=10,
-                    batch_size=32,
-                    validation_split=0.1)
+history = model.fit(train_ds,
+                    epochs=EPOCHS,
+                    validation_data=val_ds,
+                    callbacks=callbacks)
+
+if QAT or PRUNE:
+    # Drop FakeQuant layers and pruned channels, conversion then sees a plain smaller model
+    model, stripped_config = strip_model(model, MODEL_CONFIG, compression.masks)
+    print(f"✂️ Stripped model: {stripped_config}, {model.count_params():,} params")
 
 # === 4. Visualize training process ===
 plt.figure(figsize=(12, 4))
@@ -74,40 +99,30 @@ plt.ylabel('Accuracy')
 plt.legend()
 
 plt.tight_layout()
-plt.show()
+if HEADLESS:
+    plt.savefig('training_curves.png')
+else:
+    plt.show()
 
 # === 5. Save model ===
 model.save('thermal_classifier_model.keras')
 print("✅ Model saved as thermal_classifier_model.keras")
 
 # === 6. Evaluate model ===
-test_loss, test_acc = model.evaluate(X_test, y_test)
+test_loss, test_acc = model.evaluate(test_ds)
 print(f'🧪 Test accuracy: {test_acc:.4f}')
 
-# === 7. Load model and make predictions (multiple samples) ===
-# Randomly select 8 samples from test set
-random_indices = np.random.choice(len(X_test), 8, replace=False)
-sample_images = X_test[random_indices]
-true_labels = y_test[random_indices]
-
+# === 7. Load model and make predictions (whole test set) ===
 loaded_model = tf.keras.models.load_model('thermal_classifier_model.keras')
-predictions = loaded_model.predict(sample_images, verbose=0)
-pred_labels = (predictions > 0.5).astype(int).flatten()
+predictions = loaded_model.predict(X_test, batch_size=256, verbose=0).flatten()
+pred_labels = (predictions > 0.5).astype(int)
 
-# === 8. Display thermal images ===
-plt.figure(figsize=(20, 10))
-
-for i in range(8):
-    plt.subplot(2, 4, i+1)
-    im = plt.imshow(sample_images[i].reshape(24, 32), cmap='coolwarm', 
-                   interpolation='nearest', vmin=0, vmax=200)
-    plt.colorbar(label='Normalized Temperature')
-    plt.title(f'Sample {i+1}\nActual: {true_labels[i]}, Predicted: {pred_labels[i]}\n(Probability: {predictions[i][0]:.2f})')
-
-plt.tight_layout()
-plt.show()
+# === 8. Write test-set contact sheets (caption green = correct, red = wrong) ===
+sheets = write_contact_sheets(X_test, 'predictions/test', vmin=0, vmax=200,
+                              labels=y_test, predictions=predictions)
+print(f"🖼️ Prediction contact sheets written: {len(sheets)} (predictions/test_*.png)")
 
 # Print prediction statistics
 print("\n=== Prediction Statistics ===")
-correct = np.sum(pred_labels == true_labels)
-print(f"✅ Correct predictions: {correct}/8 ({correct/8*100:.1f}%)")
+correct = np.sum(pred_labels == y_test)
+print(f"✅ Correct predictions: {correct}/{len(y_test)} ({correct/len(y_test)*100:.1f}%)")
@@ -0,0 +1,62 @@
+"""
+Float (Keras) vs int8 (TFLite) evaluation of a converted model.
+
+Runs both models over the held-out frames in batches and reports accuracy,
+score drift, confusion matrices and host latency per frame, so conversion
+can fail when quantization costs more accuracy than allowed.
+"""
+import time
+import numpy as np
+from thermal_model import run_tflite
+
+THRESHOLD = 0.5
+
+
+def confusion_matrix(labels, predicted):
+    """2x2 matrix [[TN, FP], [FN, TP]]"""
+    labels = np.asarray(labels).astype(bool)
+    predicted = np.asarray(predicted).astype(bool)
+    return np.array([
+        [np.sum(~labels & ~predicted), np.sum(~labels & predicted)],
+        [np.sum(labels & ~predicted), np.sum(labels & predicted)],
+    ], dtype=np.int64)
+
+
+def evaluate_quantization(keras_model, tflite_model, frames, labels, batch_size=256):
+    """Compare float and int8 predictions on the same frames, returns a report dict"""
+    frames = np.asarray(frames, dtype=np.float32)
+    labels = np.asarray(labels).reshape(-1)
+
+    t0 = time.perf_counter()
+    float_scores = keras_model.predict(frames, batch_size=batch_size, verbose=0).reshape(-1)
+    float_seconds = (time.perf_counter() - t0) / max(len(frames), 1)
+    int8_scores, int8_seconds = run_tflite(tflite_model, frames, batch_size)
+
+    float_pred = float_scores > THRESHOLD
+    int8_pred = int8_scores > THRESHOLD
+    drift = np.abs(float_scores - int8_scores)
+    return {
+        'frames': int(len(frames)),
+        'float_accuracy': float(np.mean(float_pred == (labels > 0))),
+        'int8_accuracy': float(np.mean(int8_pred == (labels > 0))),
+        'decision_agreement': float(np.mean(float_pred == int8_pred)),
+        'score_drift_mean': float(np.mean(drift)),
+        'score_drift_max': float(np.max(drift)) if len(drift) else 0.0,
+        'float_confusion': confusion_matrix(labels > 0, float_pred).tolist(),
+        'int8_confusion': confusion_matrix(labels > 0, int8_pred).tolist(),
+        'float_us_per_frame': float_seconds * 1e6,
+        'int8_us_per_frame': int8_seconds * 1e6,
+    }
+
+
+def print_report(report):
+    print("\n=== Float vs int8 evaluation (held-out set) ===")
+    print(f"Frames: {report['frames']}")
+    print(f"Float accuracy: {report['float_accuracy']:.4f}   int8 accuracy: {report['int8_accuracy']:.4f}")
+    print(f"Decision agreement: {report['decision_agreement']:.4f}")
+    print(f"Score drift: mean {report['score_drift_mean']:.4f}, max {report['score_drift_max']:.4f}")
+    for name in ('float', 'int8'):
+        (tn, fp), (fn, tp) = report[f'{name}_confusion']
+        print(f"{name:>5} confusion  TN {tn:5d}  FP {fp:5d}  FN {fn:5d}  TP {tp:5d}")
+    print(f"Host latency: float {report['float_us_per_frame']:.1f} us/frame, "
+          f"int8 {report['int8_us_per_frame']:.1f} us/frame")
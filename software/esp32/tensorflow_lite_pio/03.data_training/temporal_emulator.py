@@ -0,0 +1,153 @@
+"""
+Incremental evaluation of the temporal model over recordings.
+
+Each recording (source CSV) is replayed frame by frame in capture order
+through temporal_model.StreamingClassifier (int8 encoder + head, ring buffer
+of embeddings), exactly as a device would run it. Reports accuracy, per-frame
+latency, state size, agreement with the float window model evaluated in
+batch on the same windows, and how many frames each fire onset took to detect.
+
+The recordings hold a single label each (one all-fire and one all-no-fire
+CSV), so a recording on its own has no onset. Onsets are measured on
+spliced streams instead: the last --splice-frames frames of each no-fire
+recording followed by the last --splice-frames frames of each fire
+recording. Both ends are the time-split test side of temporal_training.py.
+The splice is artificial (a jump between recordings, not a real ignition),
+so its delay is a lower bound on what a real onset would take.
+
+Usage:
+    python temporal_emulator.py
+    python temporal_emulator.py --recording mlx90640_data_1.csv --csv stream.csv
+    python temporal_emulator.py --splice-frames 0   # skip the spliced onset check
+"""
+import os
+import sys
+import time
+import argparse
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+import numpy as np
+import tensorflow as tf
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+from thermal_dataset import load_dataset, TEMP_SCALE
+from quant_eval import THRESHOLD
+from temporal_model import StreamingClassifier, gather_windows
+
+
+def stream_recording(streamer, dataset, rows, chunk_size=1024):
+    """Push the given rows in order, returns (probabilities with NaN until the window fills, seconds per frame)"""
+    streamer.reset()
+    scores = np.full(len(rows), np.nan, dtype=np.float32)
+    seconds = np.zeros(len(rows), dtype=np.float64)
+    i = 0
+    for pixels, _ in dataset.subset(rows).iter_chunks(chunk_size):
+        for frame in pixels.astype(np.float32) * np.float32(1.0 / TEMP_SCALE):
+            t0 = time.perf_counter()
+            score = streamer.push(frame)
+            seconds[i] = time.perf_counter() - t0
+            if score is not None:
+                scores[i] = score
+            i += 1
+    return scores, seconds
+
+
+def onset_delays(labels, fire):
+    """Frames from each 0 -> 1 label transition until the stream first reports fire (None if never)"""
+    delays = []
+    for start in np.flatnonzero(np.diff(labels) > 0) + 1:
+        hits = np.flatnonzero(fire[start:])
+        delays.append(int(hits[0]) if len(hits) else None)
+    return delays
+
+
+def recording_labels(dataset):
+    """Majority label of each source CSV"""
+    return [int(np.mean(dataset.labels[dataset.sources == source]) > 0.5) for source in range(len(dataset.files))]
+
+
+def splice_onsets(streamer, dataset, frames):
+    """Stream the end of each no-fire recording followed by the end of each fire recording
+
+    Returns [(no-fire name, fire name, onset delay in frames or None)].
+    """
+    sources = dataset.sources
+    majority = recording_labels(dataset)
+    results = []
+    for quiet in (s for s, label in enumerate(majority) if label == 0):
+        for burning in (s for s, label in enumerate(majority) if label == 1):
+            rows = np.concatenate([np.flatnonzero(sources == quiet)[-frames:],
+                                   np.flatnonzero(sources == burning)[-frames:]])
+            scores, _ = stream_recording(streamer, dataset, rows)
+            fire = np.where(np.isnan(scores), False, scores > THRESHOLD)
+            delays = onset_delays(dataset.labels[rows], fire)
+            results.append((dataset.files[quiet], dataset.files[burning], delays[0] if delays else None))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream recordings through the int8 temporal model')
+    parser.add_argument('--data-dir', default=os.path.join(BASE_DIR, 'data'))
+    parser.add_argument('--encoder', default='thermal_temporal_encoder.tflite')
+    parser.add_argument('--head', default='thermal_temporal_head.tflite')
+    parser.add_argument('--keras', default='thermal_temporal_model.keras', help='Float window model for agreement')
+    parser.add_argument('--recording', action='append', help='Only these source CSVs (default: all)')
+    parser.add_argument('--csv', help='Write per-frame stream output as CSV')
+    parser.add_argument('--splice-frames', type=int, default=64,
+                        help='Frames taken from each side of a no-fire -> fire splice (0 disables)')
+    args = parser.parse_args()
+
+    with open(args.encoder, 'rb') as f:
+        encoder = f.read()
+    with open(args.head, 'rb') as f:
+        head = f.read()
+    streamer = StreamingClassifier(encoder, head)
+    keras_model = tf.keras.models.load_model(args.keras) if os.path.exists(args.keras) else None
+
+    dataset = load_dataset(args.data_dir)
+    sources = dataset.sources
+    labels = dataset.labels
+    rows_out, scores_out, seconds_out = [], [], []
+    print(f"\nWindow {streamer.length} frames, state {streamer.state_bytes} bytes per stream")
+    for source, name in enumerate(dataset.files):
+        if args.recording and name not in args.recording:
+            continue
+        rows = np.flatnonzero(sources == source)
+        scores, seconds = stream_recording(streamer, dataset, rows)
+        valid = ~np.isnan(scores)
+        fire = np.where(valid, scores > THRESHOLD, False)
+        accuracy = np.mean(fire[valid] == (labels[rows][valid] > 0)) if valid.any() else float('nan')
+        line = (f"{name}: {len(rows)} frames, accuracy {accuracy:.4f}, "
+                f"{np.median(seconds) * 1e6:.1f} us/frame median")
+        if keras_model is not None and valid.any():
+            ends = np.arange(len(rows))[valid]
+            windows = gather_windows(dataset.subset(rows), ends, streamer.length)
+            batch = keras_model.predict(windows, batch_size=256, verbose=0).reshape(-1)
+            line += (f", agreement with float window model {np.mean((batch > THRESHOLD) == fire[valid]):.4f}"
+                     f" (max score drift {np.max(np.abs(batch - scores[valid])):.3f})")
+        print(line)
+        delays = onset_delays(labels[rows], fire)
+        if delays:
+            print(f"  fire onsets: {len(delays)}, detection delay in frames: {delays}")
+        rows_out.append(rows)
+        scores_out.append(scores)
+        seconds_out.append(seconds)
+
+    if args.splice_frames > 0:
+        print(f"\nSpliced onsets ({args.splice_frames} no-fire frames, then {args.splice_frames} fire frames):")
+        splices = splice_onsets(streamer, dataset, args.splice_frames)
+        for quiet, burning, delay in splices:
+            print(f"  {quiet} -> {burning}: " + ("never detected" if delay is None else f"detected after {delay} frames"))
+        if not splices:
+            print("  needs at least one no-fire and one fire recording")
+
+    if args.csv and rows_out:
+        rows, scores, seconds = (np.concatenate(a) for a in (rows_out, scores_out, seconds_out))
+        np.savetxt(args.csv, np.column_stack([rows, sources[rows], labels[rows], scores, seconds * 1e6]),
+                   fmt=['%d', '%d', '%d', '%.5f', '%.2f'], delimiter=',',
+                   header='row,source,label,score,push_us', comments='')
+        print(f"📦 Saved per-frame stream output to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Temporal multi-frame fire model built for streaming evaluation.
+
+A per-frame encoder (small CNN -> embedding) runs once per new frame; a
+causal 1D convolution over the last SEQUENCE_LENGTH embeddings classifies
+the window, so flicker and slow heating trends can become visible to the
+model once the training data contains them.
+On a stream the only state is a ring buffer of the last embeddings (int8 on
+the device), so each new frame costs one encoder pass plus one head pass
+regardless of how long the recording is.
+
+Windows are cut from the captured data in capture order (row order within
+each source CSV, never crossing files) and labelled with their last frame.
+Train/test are split by time per recording with a gap of one window length,
+so overlapping windows never end up on both sides.
+
+Limitation: the collected data is one all-fire and one all-no-fire CSV, so
+every window has a constant label and the model only learns per-frame
+classification over a short history; it never sees a fire onset in training.
+temporal_emulator.py measures onset delay on spliced streams (the end of a
+no-fire recording followed by the end of a fire recording) instead.
+"""
+import os
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+import numpy as np
+import tensorflow as tf
+from thermal_dataset import TEMP_SCALE
+from thermal_model import INPUT_SHAPE, quantize
+
+SEQUENCE_LENGTH = 8
+
+TEMPORAL_CONFIG = {
+    'conv_filters': 8,
+    'sep_filters': 16,
+    'embedding_units': 16,   # Per-frame state on the device: SEQUENCE_LENGTH x embedding_units int8
+    'temporal_filters': 16,
+}
+
+
+# ---------- Sequences ----------
+
+def window_ends(dataset, length=SEQUENCE_LENGTH, stride=1):
+    """Positions that end a full window of `length` consecutive frames from the same recording
+
+    The dataset view must be in capture order (e.g. the full loaded dataset).
+    """
+    sources = dataset.sources
+    rows = np.arange(len(sources))
+    run_start = np.zeros(len(sources), dtype=np.int64)
+    changes = np.flatnonzero(np.diff(sources)) + 1
+    run_start[changes] = changes
+    run_start = np.maximum.accumulate(run_start)
+    ends = rows[rows - run_start >= length - 1]
+    return ends[::stride]
+
+
+def temporal_split(dataset, ends, test_size=0.2, gap=SEQUENCE_LENGTH):
+    """Split window ends by time per recording: early windows train, late windows test, `gap` windows dropped between"""
+    sources = dataset.sources[ends]
+    train, test = [], []
+    for source in np.unique(sources):
+        own = ends[sources == source]
+        cut = int(round(len(own) * (1 - test_size)))
+        train.append(own[:max(0, cut - gap)])
+        test.append(own[cut:])
+    return np.concatenate(train), np.concatenate(test)
+
+
+def window_labels(dataset, ends):
+    return dataset.labels[ends]
+
+
+def mixed_windows(dataset, ends, length=SEQUENCE_LENGTH):
+    """Number of windows whose frames do not all share the label of their last frame"""
+    rows = np.asarray(ends)[:, None] - np.arange(length - 1, -1, -1)[None, :]
+    labels = dataset.labels[rows.reshape(-1)].reshape(rows.shape)
+    return int(np.sum(labels.min(axis=1) != labels.max(axis=1)))
+
+
+def gather_windows(dataset, ends, length=SEQUENCE_LENGTH):
+    """Float windows (N, length, 24, 32, 1) in °C"""
+    rows = np.asarray(ends)[:, None] - np.arange(length - 1, -1, -1)[None, :]
+    pixels = dataset.subset(rows.reshape(-1)).raw_pixels.astype(np.float32) * np.float32(1.0 / TEMP_SCALE)
+    return pixels.reshape((len(ends), length) + INPUT_SHAPE)
+
+
+def make_window_dataset(dataset, ends, batch_size=32, training=True, length=SEQUENCE_LENGTH, seed=None):
+    """tf.data of (window, label) batches, windows gathered from the memory-mapped cache per batch"""
+    ends = np.asarray(ends)
+    labels = window_labels(dataset, ends).astype(np.float32)
+
+    def generate():
+        order = np.random.default_rng(seed).permutation(len(ends)) if training else np.arange(len(ends))
+        for start in range(0, len(order), batch_size):
+            picked = np.sort(order[start:start + batch_size])
+            yield gather_windows(dataset, ends[picked], length), labels[picked]
+
+    spec = (tf.TensorSpec((None, length) + INPUT_SHAPE, tf.float32), tf.TensorSpec((None,), tf.float32))
+    return tf.data.Dataset.from_generator(generate, output_signature=spec).prefetch(tf.data.AUTOTUNE)
+
+
+# ---------- Model ----------
+
+def build_temporal_model(config=None, length=SEQUENCE_LENGTH, compile_model=True):
+    """Returns (window model, frame encoder, temporal head); encoder and head share weights with the window model"""
+    cfg = dict(TEMPORAL_CONFIG, **(config or {}))
+    frame = tf.keras.Input(shape=INPUT_SHAPE)
+    x = tf.keras.layers.Conv2D(cfg['conv_filters'], (3, 3), activation='relu')(frame)
+    x = tf.keras.layers.MaxPooling2D((2, 2))(x)
+    x = tf.keras.layers.SeparableConv2D(cfg['sep_filters'], (3, 3), activation='relu')(x)
+    x = tf.keras.layers.MaxPooling2D((2, 2))(x)
+    x = tf.keras.layers.Flatten()(x)
+    embedding = tf.keras.layers.Dense(cfg['embedding_units'], activation='relu')(x)
+    encoder = tf.keras.Model(frame, embedding, name='frame_encoder')
+
+    # Causal conv over the whole history: one output step per window, i.e. per new frame when streaming
+    history = tf.keras.Input(shape=(length, cfg['embedding_units']))
+    h = tf.keras.layers.Conv1D(cfg['temporal_filters'], length, activation='relu')(history)
+    h = tf.keras.layers.Flatten()(h)
+    score = tf.keras.layers.Dense(1, activation='sigmoid', dtype='float32')(h)
+    head = tf.keras.Model(history, score, name='temporal_head')
+
+    window = tf.keras.Input(shape=(length,) + INPUT_SHAPE)
+    model = tf.keras.Model(window, head(tf.keras.layers.TimeDistributed(encoder)(window)), name='temporal_classifier')
+    if compile_model:
+        model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    return model, encoder, head
+
+
+def split_temporal_model(model):
+    """(encoder, head) of a saved window model"""
+    encoder = next(l for l in model.layers if isinstance(l, tf.keras.layers.TimeDistributed)).layer
+    head = model.get_layer('temporal_head')
+    return encoder, head
+
+
+# ---------- Streaming ----------
+
+def _interpreter(tflite_model):
+    interpreter = tf.lite.Interpreter(
+        model_content=bytes(tflite_model), num_threads=1,
+        experimental_op_resolver_type=tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+    interpreter.allocate_tensors()
+    return interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0]
+
+
+class StreamingClassifier:
+    """Frame-by-frame evaluation of the int8 encoder + head with a ring buffer of int8 embeddings
+
+    push() costs one encoder and one head Invoke per frame; the state is
+    SEQUENCE_LENGTH x embedding_units bytes regardless of stream length.
+    """
+
+    def __init__(self, encoder_tflite, head_tflite):
+        self.encoder, self.enc_in, self.enc_out = _interpreter(encoder_tflite)
+        self.head, self.head_in, self.head_out = _interpreter(head_tflite)
+        self.length, self.units = (int(d) for d in self.head_in['shape'][1:])
+        self.state = np.zeros((self.length, self.units), dtype=np.int8)
+        self.reset()
+
+    @property
+    def state_bytes(self):
+        return self.state.nbytes
+
+    def reset(self):
+        self.state[:] = self.enc_out['quantization'][1]  # Quantized zero
+        self.filled = 0
+        self.pos = 0
+
+    def push(self, frame):
+        """Add one frame (768 values in °C), returns the fire probability once the window is full, else None"""
+        q = quantize(frame, *self.enc_in['quantization']).reshape(self.enc_in['shape'])
+        self.encoder.set_tensor(self.enc_in['index'], q)
+        self.encoder.invoke()
+        self.state[self.pos] = self.encoder.get_tensor(self.enc_out['index']).reshape(-1)
+        self.pos = (self.pos + 1) % self.length
+        self.filled = min(self.filled + 1, self.length)
+        if self.filled < self.length:
+            return None
+
+        # Oldest first; requantize encoder int8 -> head int8 input params
+        ordered = np.concatenate([self.state[self.pos:], self.state[:self.pos]])
+        enc_scale, enc_zero = self.enc_out['quantization']
+        embeddings = (ordered.astype(np.float32) - enc_zero) * enc_scale
+        self.head.set_tensor(self.head_in['index'], quantize(embeddings, *self.head_in['quantization'])[None])
+        self.head.invoke()
+        raw = self.head.get_tensor(self.head_out['index']).reshape(-1)[0]
+        out_scale, out_zero = self.head_out['quantization']
+        return float((np.float32(raw) - out_zero) * out_scale)
@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+import numpy as np
+import tensorflow as tf
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'common'))
+from thermal_dataset import load_dataset
+from thermal_model import convert_to_int8
+from temporal_model import (SEQUENCE_LENGTH, TEMPORAL_CONFIG, window_ends, temporal_split, window_labels,
+                            mixed_windows, gather_windows, make_window_dataset, build_temporal_model)
+
+# ============ Parameter Configuration =============
+EPOCHS = 10
+BATCH_SIZE = 32
+LENGTH = SEQUENCE_LENGTH   # Frames per window (2 Hz sensor: 8 frames = 4 s of history)
+STRIDE = 1                 # Window step when cutting training sequences
+MODEL_CONFIG = dict(TEMPORAL_CONFIG)
+CALIBRATION_WINDOWS = 100
+# ================================================
+
+# === 1. Cut windows in capture order, split by time per recording ===
+dataset = load_dataset(os.path.join(BASE_DIR, 'data'))
+ends = window_ends(dataset, LENGTH, STRIDE)
+train_ends, test_ends = temporal_split(dataset, ends, test_size=0.2, gap=LENGTH)
+fit_ends, val_ends = temporal_split(dataset, train_ends, test_size=0.1, gap=LENGTH)
+print(f"Windows of {LENGTH} frames: train {len(fit_ends)}, val {len(val_ends)}, test {len(test_ends)}")
+mixed = mixed_windows(dataset, ends, LENGTH)
+if not mixed:
+    # Windows never cross recordings, and each recording has a single label
+    print("⚠️ Every window has a constant label: the model learns per-frame classification only, "
+          "never a fire onset; temporal_emulator.py checks onsets on spliced streams")
+
+train_ds = make_window_dataset(dataset, fit_ends, BATCH_SIZE, training=True, length=LENGTH)
+val_ds = make_window_dataset(dataset, val_ends, BATCH_SIZE, training=False, length=LENGTH)
+test_ds = make_window_dataset(dataset, test_ends, BATCH_SIZE, training=False, length=LENGTH)
+
+# === 2. Build and train the window model ===
+model, encoder, head = build_temporal_model(MODEL_CONFIG, LENGTH)
+model.fit(train_ds, epochs=EPOCHS, validation_data=val_ds)
+test_loss, test_acc = model.evaluate(test_ds)
+print(f'🧪 Temporal test accuracy: {test_acc:.4f}')
+
+model.save('thermal_temporal_model.keras')
+print("✅ Model saved as thermal_temporal_model.keras")
+
+# === 3. int8 encoder (per frame) and head (per window of embeddings) for streaming ===
+rng = np.random.default_rng(0)
+calibration_ends = rng.choice(train_ends, min(CALIBRATION_WINDOWS, len(train_ends)), replace=False)
+calibration_windows = gather_windows(dataset, np.sort(calibration_ends), LENGTH)
+calibration_frames = calibration_windows.reshape((-1,) + calibration_windows.shape[2:])
+calibration_embeddings = encoder.predict(calibration_frames, verbose=0).reshape(
+    len(calibration_windows), LENGTH, -1)
+
+for name, part, samples in (('encoder', encoder, calibration_frames), ('head', head, calibration_embeddings)):
+    path = f'thermal_temporal_{name}.tflite'
+    with open(path, 'wb') as f:
+        f.write(convert_to_int8(part, samples))
+    print(f"📦 Saved as {path}")
+
+with open('thermal_temporal_model.json', 'w') as f:
+    json.dump({'length': LENGTH, 'config': MODEL_CONFIG, 'test_accuracy': float(test_acc),
+               'test_windows': int(len(test_ends)), 'mixed_label_windows': mixed,
+               'test_class_counts': np.bincount(window_labels(dataset, test_ends), minlength=2).tolist()}, f, indent=4)
+print("Streaming check: python temporal_emulator.py")
@@ -0,0 +1,336 @@
+"""
+Static tensor-arena and latency estimator for TFLite Micro targets.
+
+Parses the .tflite flatbuffer directly (no TensorFlow needed), computes the
+lifetime of every activation tensor, places them with a greedy-by-size
+memory plan (the same strategy as TFLM's GreedyMemoryPlanner) to predict the
+peak arena, counts MACs per operator and estimates inference latency from a
+per-op cost table for the ESP32-C6. The recommended arena size is written
+to model_arena.h next to model.h.
+
+Usage:
+    python tflite_estimator.py thermal_classifier_model.tflite
+    python tflite_estimator.py ../04.run_model/src/model.h --cost-table my_costs.json
+"""
+import os
+import re
+import json
+import struct
+import argparse
+
+# TensorType -> bytes per element
+TYPE_SIZES = {0: 4, 1: 2, 2: 4, 3: 1, 4: 8, 6: 1, 7: 2, 9: 1, 10: 8, 12: 8, 15: 4, 16: 2, 18: 2}
+TYPE_NAMES = {0: 'float32', 1: 'float16', 2: 'int32', 3: 'uint8', 4: 'int64', 6: 'bool', 7: 'int16', 9: 'int8'}
+
+BUILTIN_NAMES = {
+    0: 'ADD', 1: 'AVERAGE_POOL_2D', 2: 'CONCATENATION', 3: 'CONV_2D', 4: 'DEPTHWISE_CONV_2D', 6: 'DEQUANTIZE',
+    9: 'FULLY_CONNECTED', 14: 'LOGISTIC', 17: 'MAX_POOL_2D', 18: 'MUL', 19: 'RELU', 21: 'RELU6', 22: 'RESHAPE',
+    25: 'SOFTMAX', 28: 'TANH', 34: 'PAD', 39: 'TRANSPOSE', 40: 'MEAN', 41: 'SUB', 43: 'SQUEEZE',
+    45: 'STRIDED_SLICE', 114: 'QUANTIZE',
+}
+
+# ESP32-C6 (single RISC-V core, 160 MHz, no SIMD) int8 reference-kernel costs.
+# cycles = overhead + per_mac * MACs + per_element * output elements
+ESP32C6_COST_TABLE = {
+    'clock_hz': 160_000_000,
+    'default': {'overhead': 2000, 'per_mac': 0, 'per_element': 4},
+    'CONV_2D': {'overhead': 4000, 'per_mac': 4.5, 'per_element': 12},
+    'DEPTHWISE_CONV_2D': {'overhead': 4000, 'per_mac': 6.0, 'per_element': 12},
+    'FULLY_CONNECTED': {'overhead': 3000, 'per_mac': 3.5, 'per_element': 12},
+    'MAX_POOL_2D': {'overhead': 2000, 'per_mac': 2.5, 'per_element': 4},
+    'AVERAGE_POOL_2D': {'overhead': 2000, 'per_mac': 3.0, 'per_element': 8},
+    'RESHAPE': {'overhead': 500, 'per_mac': 0, 'per_element': 0},
+    'LOGISTIC': {'overhead': 1000, 'per_mac': 0, 'per_element': 60},
+    'SOFTMAX': {'overhead': 2000, 'per_mac': 0, 'per_element': 120},
+}
+
+# TFLM persistent allocations outside the activation plan (approximate, per 32-bit build). Not yet
+# calibrated against interpreter->arena_used_bytes() on the ESP32, which 04.run_model logs at start-up;
+# until then the firmware never goes below its validated arena size.
+PERSISTENT_PER_TENSOR = 32 + 12       # TfLiteTensor-related bookkeeping + TfLiteEvalTensor
+PERSISTENT_PER_OP = 64                # TfLiteNode + registration pointers
+PERSISTENT_PER_CHANNEL = 8            # Per-channel output multiplier + shift
+PERSISTENT_FIXED = 1024               # Interpreter, allocator and planner state
+ARENA_ALIGNMENT = 16
+ARENA_MARGIN = 1.15                   # Head room for kernel scratch buffers and allocator rounding
+
+
+# ---------- Minimal flatbuffer reader ----------
+
+class _Table:
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+        vtable = pos - struct.unpack_from('<i', buf, pos)[0]
+        self.vtable = vtable
+        self.vtable_size = struct.unpack_from('<H', buf, vtable)[0]
+
+    def _field(self, index):
+        entry = 4 + 2 * index
+        if entry >= self.vtable_size:
+            return 0
+        return struct.unpack_from('<H', self.buf, self.vtable + entry)[0]
+
+    def scalar(self, index, fmt, default=0):
+        off = self._field(index)
+        return struct.unpack_from('<' + fmt, self.buf, self.pos + off)[0] if off else default
+
+    def _indirect(self, index):
+        off = self._field(index)
+        if not off:
+            return None
+        at = self.pos + off
+        return at + struct.unpack_from('<I', self.buf, at)[0]
+
+    def table(self, index):
+        at = self._indirect(index)
+        return None if at is None else _Table(self.buf, at)
+
+    def vector(self, index, fmt):
+        at = self._indirect(index)
+        if at is None:
+            return []
+        n = struct.unpack_from('<I', self.buf, at)[0]
+        return list(struct.unpack_from(f'<{n}{fmt}', self.buf, at + 4))
+
+    def vector_length(self, index):
+        at = self._indirect(index)
+        return 0 if at is None else struct.unpack_from('<I', self.buf, at)[0]
+
+    def tables(self, index):
+        at = self._indirect(index)
+        if at is None:
+            return []
+        n = struct.unpack_from('<I', self.buf, at)[0]
+        items = []
+        for i in range(n):
+            elem = at + 4 + 4 * i
+            items.append(_Table(self.buf, elem + struct.unpack_from('<I', self.buf, elem)[0]))
+        return items
+
+    def string(self, index):
+        at = self._indirect(index)
+        if at is None:
+            return ''
+        n = struct.unpack_from('<I', self.buf, at)[0]
+        return self.buf[at + 4:at + 4 + n].decode('utf-8', 'replace')
+
+
+def parse_model(data):
+    """Parse the parts of a TFLite model needed for planning, returns a dict"""
+    if data[4:8] != b'TFL3':
+        raise ValueError("Not a TFLite flatbuffer (missing TFL3 identifier)")
+    model = _Table(data, struct.unpack_from('<I', data, 0)[0])
+
+    opcodes = []
+    for code in model.tables(1):
+        deprecated = code.scalar(0, 'b')
+        builtin = code.scalar(3, 'i')
+        opcodes.append(max(deprecated, builtin))
+    buffer_sizes = [b.vector_length(0) or b.scalar(2, 'Q') for b in model.tables(4)]
+
+    subgraph = model.tables(2)[0]
+    tensors = []
+    for t in subgraph.tables(0):
+        quant = t.table(4)
+        scales = quant.vector(2, 'f') if quant else []
+        buffer = t.scalar(2, 'I')
+        tensors.append({
+            'name': t.string(3),
+            'shape': t.vector(0, 'i'),
+            'type': t.scalar(1, 'b'),
+            'constant': buffer < len(buffer_sizes) and buffer_sizes[buffer] > 0,
+            'channels': len(scales),
+        })
+    operators = []
+    for op in subgraph.tables(3):
+        options = op.table(4)
+        operators.append({
+            'code': opcodes[op.scalar(0, 'I')],
+            'inputs': op.vector(1, 'i'),
+            'outputs': op.vector(2, 'i'),
+            'options': options,
+        })
+    return {
+        'tensors': tensors,
+        'operators': operators,
+        'inputs': subgraph.vector(1, 'i'),
+        'outputs': subgraph.vector(2, 'i'),
+        'size': len(data),
+    }
+
+
+def read_model_bytes(path):
+    """Read a .tflite file or the byte array of a generated model.h"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith('.h'):
+        text = data.decode('utf-8', 'replace')
+        body = text[text.index('{', text.index('g_model[]')) + 1:text.rindex('}')]
+        data = bytes(int(h, 16) for h in re.findall(r'0x([0-9a-fA-F]{2})', body))
+    return data
+
+
+# ---------- Planning ----------
+
+def tensor_bytes(tensor):
+    count = 1
+    for d in tensor['shape']:
+        count *= max(d, 1)
+    return count * TYPE_SIZES.get(tensor['type'], 4)
+
+
+def _align(n, alignment=ARENA_ALIGNMENT):
+    return (n + alignment - 1) // alignment * alignment
+
+
+def tensor_lifetimes(model):
+    """First/last operator index for every non-constant tensor"""
+    last_op = len(model['operators']) - 1
+    lifetimes = {}
+    for t in model['inputs']:
+        lifetimes[t] = [0, 0]
+    for i, op in enumerate(model['operators']):
+        for t in op['outputs']:
+            lifetimes.setdefault(t, [i, i])
+        for t in op['inputs']:
+            if t >= 0 and not model['tensors'][t]['constant']:
+                lifetimes.setdefault(t, [0, i])[1] = i
+    for t in model['outputs']:
+        lifetimes[t][1] = last_op
+    return lifetimes
+
+
+def greedy_plan(model):
+    """Greedy-by-size placement of activation tensors, returns (peak bytes, {tensor: offset})"""
+    lifetimes = tensor_lifetimes(model)
+    order = sorted(lifetimes, key=lambda t: -tensor_bytes(model['tensors'][t]))
+    placed = []  # (offset, size, first, last)
+    offsets = {}
+    for t in order:
+        size = _align(tensor_bytes(model['tensors'][t]))
+        first, last = lifetimes[t]
+        live = sorted((o, s) for o, s, f, l in placed if not (l < first or f > last))
+        offset = 0
+        for o, s in live:
+            if offset + size <= o:
+                break
+            offset = max(offset, o + s)
+        placed.append((offset, size, first, last))
+        offsets[t] = offset
+    peak = max((o + s for o, s, _, _ in placed), default=0)
+    return peak, offsets
+
+
+# ---------- Operator cost ----------
+
+def _elements(shape):
+    count = 1
+    for d in shape:
+        count *= max(d, 1)
+    return count
+
+
+def op_macs(model, op):
+    tensors = model['tensors']
+    name = BUILTIN_NAMES.get(op['code'], f"OP_{op['code']}")
+    out = tensors[op['outputs'][0]]['shape']
+    if name == 'CONV_2D':
+        _, kh, kw, in_c = tensors[op['inputs'][1]]['shape']
+        return _elements(out) * kh * kw * in_c
+    if name == 'DEPTHWISE_CONV_2D':
+        _, kh, kw, _ = tensors[op['inputs'][1]]['shape']
+        return _elements(out) * kh * kw
+    if name == 'FULLY_CONNECTED':
+        units, depth = tensors[op['inputs'][1]]['shape'][-2:]
+        return _elements(out) // max(units, 1) * units * depth
+    if name in ('MAX_POOL_2D', 'AVERAGE_POOL_2D') and op['options'] is not None:
+        fw = op['options'].scalar(3, 'i', 1)
+        fh = op['options'].scalar(4, 'i', 1)
+        return _elements(out) * fw * fh
+    return 0
+
+
+def estimate(model, cost_table=ESP32C6_COST_TABLE):
+    """Full report: arena plan, persistent overhead, recommended size, per-layer MACs and latency"""
+    peak, _ = greedy_plan(model)
+    channels = sum(t['channels'] for t in model['tensors'] if t['channels'] > 1)
+    persistent = (PERSISTENT_FIXED + PERSISTENT_PER_TENSOR * len(model['tensors'])
+                  + PERSISTENT_PER_OP * len(model['operators']) + PERSISTENT_PER_CHANNEL * channels)
+    recommended = _align(int((peak + persistent) * ARENA_MARGIN), 1024)
+
+    layers = []
+    total_cycles = 0
+    for op in model['operators']:
+        name = BUILTIN_NAMES.get(op['code'], f"OP_{op['code']}")
+        cost = cost_table.get(name, cost_table['default'])
+        out = model['tensors'][op['outputs'][0]]
+        macs = op_macs(model, op)
+        cycles = cost['overhead'] + cost['per_mac'] * macs + cost['per_element'] * _elements(out['shape'])
+        total_cycles += cycles
+        layers.append({'op': name, 'output_shape': out['shape'], 'output_type': TYPE_NAMES.get(out['type'], '?'),
+                       'macs': macs, 'us': cycles / cost_table['clock_hz'] * 1e6})
+    return {
+        'flatbuffer_bytes': model['size'],
+        'activation_peak_bytes': peak,
+        'persistent_bytes': persistent,
+        'recommended_arena_bytes': recommended,
+        'macs': sum(l['macs'] for l in layers),
+        'latency_ms': total_cycles / cost_table['clock_hz'] * 1e3,
+        'layers': layers,
+    }
+
+
+def estimate_tflite(data, cost_table=ESP32C6_COST_TABLE):
+    return estimate(parse_model(bytes(data)), cost_table)
+
+
+def write_arena_header(path, report, source=None):
+    with open(path, 'w') as f:
+        f.write('#ifndef MODEL_ARENA_H\n#define MODEL_ARENA_H\n\n')
+        if source:
+            f.write(f'// Generated by tflite_estimator.py from {os.path.basename(source)}, do not edit\n')
+        f.write(f"// Planned activations: {report['activation_peak_bytes']} bytes, "
+                f"persistent estimate: {report['persistent_bytes']} bytes\n")
+        f.write(f"// {report['macs']} MACs, estimated {report['latency_ms']:.2f} ms per inference on ESP32-C6\n")
+        f.write('// Uncalibrated estimate: firmware uses max(this, its validated arena size)\n')
+        f.write(f"constexpr int kRecommendedTensorArenaSize = {report['recommended_arena_bytes']};\n\n")
+        f.write('#endif // MODEL_ARENA_H\n')
+
+
+def print_report(report):
+    print(f"{'#':>3}  {'Op':<18} {'Output':<18} {'Type':<7} {'MACs':>10} {'Est. us':>9}")
+    for i, layer in enumerate(report['layers']):
+        shape = 'x'.join(str(d) for d in layer['output_shape'])
+        print(f"{i:>3}  {layer['op']:<18} {shape:<18} {layer['output_type']:<7} {layer['macs']:>10,} {layer['us']:>9.1f}")
+    print(f"\nFlatbuffer: {report['flatbuffer_bytes']} bytes")
+    print(f"Activation plan peak: {report['activation_peak_bytes']} bytes")
+    print(f"Persistent estimate: {report['persistent_bytes']} bytes")
+    print(f"Recommended kTensorArenaSize: {report['recommended_arena_bytes']}")
+    print(f"Total: {report['macs']:,} MACs, ~{report['latency_ms']:.2f} ms per inference")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate TFLM arena size and latency for a .tflite model')
+    parser.add_argument('model', nargs='?', default='thermal_classifier_model.tflite', help='.tflite or model.h')
+    parser.add_argument('--cost-table', help='JSON file overriding per-op costs (same keys as ESP32C6_COST_TABLE)')
+    parser.add_argument('--header', default='model_arena.h', help='Output header with kRecommendedTensorArenaSize')
+    parser.add_argument('--json', help='Also write the full report as JSON')
+    args = parser.parse_args()
+
+    cost_table = dict(ESP32C6_COST_TABLE)
+    if args.cost_table:
+        with open(args.cost_table) as f:
+            cost_table.update(json.load(f))
+
+    report = estimate_tflite(read_model_bytes(args.model), cost_table)
+    print_report(report)
+    write_arena_header(args.header, report, source=args.model)
+    print(f"📦 Saved as {args.header}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Thermal classifier model helpers shared by training, conversion and search.
+
+A model is described by a small config dict so candidate architectures can
+be built, converted to int8 TFLite and measured the same way everywhere.
+"""
+import os
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+import time
+import numpy as np
+import tensorflow as tf
+
+INPUT_SHAPE = (24, 32, 1)
+
+# The hand-picked model: Conv2D 16 -> SeparableConv2D 32 -> Dense 32
+DEFAULT_CONFIG = {
+    'conv_filters': 16,
+    'kernel_size': 3,
+    'sep_filters': 32,   # 0 disables the separable block
+    'dense_units': 32,   # 0 connects Flatten directly to the output
+    'pool_size': 2,
+}
+
+
+@tf.keras.utils.register_keras_serializable(package='thermal')
+class FakeQuant(tf.keras.layers.Layer):
+    """Simulated int8 activation quantization for quantization-aware training
+
+    Tracks the activation range with an exponential moving average while
+    training and rounds to 256 levels in the forward pass (straight-through
+    gradient). Removed again by model_compression.strip_model before conversion.
+    """
+
+    def __init__(self, momentum=0.99, **kwargs):
+        kwargs.setdefault('dtype', 'float32')  # fake_quant ops need float32 under mixed precision
+        super().__init__(**kwargs)
+        self.momentum = momentum
+
+    def build(self, input_shape):
+        self.range_min = self.add_weight(name='range_min', shape=(), initializer='zeros', trainable=False)
+        self.range_max = self.add_weight(name='range_max', shape=(), initializer='ones', trainable=False)
+        self.seen = self.add_weight(name='seen', shape=(), initializer='zeros', trainable=False)
+
+    def call(self, inputs, training=False):
+        if training:
+            m = tf.where(self.seen > 0, self.momentum, 0.0)
+            self.range_min.assign(m * self.range_min + (1 - m) * tf.reduce_min(inputs))
+            self.range_max.assign(m * self.range_max + (1 - m) * tf.reduce_max(inputs))
+            self.seen.assign(1.0)
+        low = tf.minimum(self.range_min, 0.0)
+        high = tf.maximum(self.range_max, low + 1e-3)
+        return tf.quantization.fake_quant_with_min_max_vars(inputs, low, high, num_bits=8)
+
+    def get_config(self):
+        return dict(super().get_config(), momentum=self.momentum)
+
+
+def build_model(config=None, compile_model=True, fake_quant=False):
+    """Build (and compile) a Sequential classifier from a config dict
+
+    With fake_quant the input and every hidden activation pass through a
+    FakeQuant layer for quantization-aware training.
+    """
+    cfg = dict(DEFAULT_CONFIG, **(config or {}))
+    k, p = cfg['kernel_size'], cfg['pool_size']
+    fq = (lambda: [FakeQuant()]) if fake_quant else (lambda: [])
+    layers = [tf.keras.Input(shape=INPUT_SHAPE)] + fq() + [
+        tf.keras.layers.Conv2D(cfg['conv_filters'], (k, k), activation='relu'),
+        *fq(),
+        tf.keras.layers.MaxPooling2D((p, p)),
+    ]
+    if cfg['sep_filters']:
+        layers += [
+            tf.keras.layers.SeparableConv2D(cfg['sep_filters'], (3, 3), activation='relu'),
+            *fq(),
+            tf.keras.layers.MaxPooling2D((2, 2)),
+        ]
+    layers.append(tf.keras.layers.Flatten())
+    if cfg['dense_units']:
+        layers.append(tf.keras.layers.Dense(cfg['dense_units'], activation='relu'))
+        layers += fq()
+    # Keep output float32 under mixed precision
+    layers.append(tf.keras.layers.Dense(1, activation='sigmoid', dtype='float32'))
+
+    model = tf.keras.Sequential(layers)
+    if compile_model:
+        model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def _shape(tensor):
+    return tuple(int(d) for d in tensor.shape[1:])
+
+
+def count_macs(model):
+    """Multiply-accumulate count per inference, returns (total, [(layer name, macs)])"""
+    per_layer = []
+    for layer in model.layers:
+        out_shape = _shape(layer.output)
+        in_shape = _shape(layer.input)
+        macs = 0
+        if isinstance(layer, tf.keras.layers.SeparableConv2D):
+            kh, kw = layer.kernel_size
+            oh, ow, oc = out_shape
+            ic = in_shape[-1]
+            macs = oh * ow * ic * kh * kw + oh * ow * ic * oc
+        elif isinstance(layer, tf.keras.layers.Conv2D):
+            kh, kw = layer.kernel_size
+            oh, ow, oc = out_shape
+            macs = oh * ow * oc * kh * kw * in_shape[-1]
+        elif isinstance(layer, tf.keras.layers.Dense):
+            macs = in_shape[-1] * out_shape[-1]
+        per_layer.append((layer.name, macs))
+    return sum(m for _, m in per_layer), per_layer
+
+
+def convert_to_int8(model, representative_frames):
+    """Full-integer TFLite conversion calibrated on the given frames (N, 24, 32, 1)"""
+    frames = np.asarray(representative_frames, dtype=np.float32)
+
+    def representative_dataset():
+        for i in range(len(frames)):
+            yield [frames[i:i + 1]]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def quantize(frames, scale, zero_point):
+    """Float frames -> int8 with round-to-nearest and saturation"""
+    q = np.round(np.asarray(frames, dtype=np.float32) / scale) + zero_point
+    return np.clip(q, -128, 127).astype(np.int8)
+
+
+def run_tflite(tflite_model, frames, batch_size=256):
+    """Batched int8 inference on the host, returns (probabilities (N,), seconds per frame)"""
+    interpreter = tf.lite.Interpreter(model_content=bytes(tflite_model))
+    input_detail = interpreter.get_input_details()[0]
+    in_scale, in_zero = input_detail['quantization']
+    frames = np.asarray(frames, dtype=np.float32).reshape((-1,) + INPUT_SHAPE)
+
+    scores = np.empty(len(frames), dtype=np.float32)
+    current = None
+    elapsed = 0.0
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        if current != len(batch):
+            interpreter.resize_tensor_input(input_detail['index'], [len(batch)] + list(INPUT_SHAPE))
+            interpreter.allocate_tensors()
+            input_index = interpreter.get_input_details()[0]['index']
+            output_detail = interpreter.get_output_details()[0]
+            current = len(batch)
+        interpreter.set_tensor(input_index, quantize(batch, in_scale, in_zero))
+        t0 = time.perf_counter()
+        interpreter.invoke()
+        elapsed += time.perf_counter() - t0
+        out_scale, out_zero = output_detail['quantization']
+        raw = interpreter.get_tensor(output_detail['index']).reshape(-1).astype(np.float32)
+        scores[start:start + len(batch)] = (raw - out_zero) * out_scale
+    return scores, elapsed / max(len(frames), 1)
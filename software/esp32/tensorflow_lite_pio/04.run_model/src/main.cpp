@@ -2,6 +2,7 @@
 #include <Adafruit_MLX90640.h>
 #include <Chirale_TensorFlowLite.h>
 #include "model.h"
+#include "model_arena.h" // Generated by 03.data_training/tflite_estimator.py
 #include "tensorflow/lite/micro/all_ops_resolver.h"
 #include "tensorflow/lite/micro/micro_interpreter.h"
 #include "tensorflow/lite/schema/schema_generated.h"
@@ -10,7 +11,11 @@ constexpr uint8_t SDA_PIN = 2;
 constexpr uint8_t SCL_PIN = 3;
 #define MLX_ADDR 0x33
 
-constexpr int kTensorArenaSize = 40000; // Increase appropriately based on model size
+// The estimator's persistent-overhead constants are not yet calibrated on hardware, so never go below
+// the size known to work on the device; arena_used_bytes() is logged in setup() to calibrate them
+constexpr int kValidatedTensorArenaSize = 40000;
+constexpr int kTensorArenaSize = kRecommendedTensorArenaSize > kValidatedTensorArenaSize ? kRecommendedTensorArenaSize
+                                                                                        : kValidatedTensorArenaSize;
 alignas(16) uint8_t tensor_arena[kTensorArenaSize];
 
 Adafruit_MLX90640 mlx;
@@ -61,6 +66,14 @@ void setup()
       ;
   }
 
+  Serial.print("Tensor arena used: ");
+  Serial.print(interpreter->arena_used_bytes());
+  Serial.print(" of ");
+  Serial.print(kTensorArenaSize);
+  Serial.print(" bytes (estimate ");
+  Serial.print(kRecommendedTensorArenaSize);
+  Serial.println(")");
+
   input = interpreter->input(0);
   output = interpreter->output(0);
 
@@ -0,0 +1,10 @@
+#ifndef MODEL_ARENA_H
+#define MODEL_ARENA_H
+
+// Generated by tflite_estimator.py from model.h, do not edit
+// Planned activations: 13200 bytes, persistent estimate: 4060 bytes
+// 210032 MACs, estimated 7.19 ms per inference on ESP32-C6
+// Uncalibrated estimate: firmware uses max(this, its validated arena size)
+constexpr int kRecommendedTensorArenaSize = 20480;
+
+#endif // MODEL_ARENA_H
@@ -0,0 +1,255 @@
+"""
+Shared MLX90640 dataset loader for preview and training scripts.
+
+The collected CSV files (label,p0,...,p767) are parsed once and cached as a
+compact binary next to the data: temperatures as int16 centi-degrees, labels
+as int8. The cache is keyed by a content hash of the CSV files and is
+memory-mapped on later loads, so repeated runs skip text parsing entirely.
+The content hash itself is recorded in .cache/meta.json with each file's
+size and mtime, and the CSVs are only re-read to hash them when one of
+those changes.
+
+Usage:
+    dataset = load_dataset('data')
+    train, test = dataset.split(test_size=0.2, random_state=24)
+    X_train, y_train = train.features(), train.labels
+    fire = dataset.by_class(1)
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+FRAME_H = 24
+FRAME_W = 32
+PIXELS = FRAME_H * FRAME_W
+
+# Default file order matches the training script (fire first, then no fire)
+DEFAULT_FILES = ('mlx90640_data_1.csv', 'mlx90640_data_0.csv')
+CACHE_VERSION = 1
+TEMP_SCALE = 100  # Stored as int16 centi-degrees: 0.01°C resolution, ±327°C range
+STAT_FILE = 'meta.json'
+
+
+def hash_files(paths, chunk_size=1 << 20):
+    """Content hash over the given files (names and bytes)"""
+    digest = hashlib.sha1(f'thermal-dataset-v{CACHE_VERSION}'.encode())
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_hash(paths, cache_dir):
+    """hash_files(paths), reusing the hash in cache_dir/meta.json while every file keeps its size and mtime"""
+    meta_path = os.path.join(cache_dir, STAT_FILE)
+    stats = [[os.path.abspath(path), st.st_size, st.st_mtime_ns] for path, st in ((p, os.stat(p)) for p in paths)]
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('version') == CACHE_VERSION and meta.get('files') == stats:
+            return meta['hash']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    content_hash = hash_files(paths)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'files': stats, 'hash': content_hash}, f, indent=4)
+    os.replace(meta_path + '.tmp', meta_path)
+    return content_hash
+
+
+def parse_csv(path):
+    """Parse one collected CSV, returns (pixels int16 (N, 768), labels int8 (N,))"""
+    data = pd.read_csv(path, dtype=np.float32, engine='c').values
+    if data.shape[1] != PIXELS + 1:
+        raise ValueError(f"{path}: expected {PIXELS + 1} columns, got {data.shape[1]}")
+    pixels = np.rint(data[:, 1:] * TEMP_SCALE)
+    np.clip(pixels, np.iinfo(np.int16).min, np.iinfo(np.int16).max, out=pixels)
+    return pixels.astype(np.int16), data[:, 0].astype(np.int8)
+
+
+class ThermalDataset:
+    """Memory-mapped frames plus an index array selecting a view of them"""
+
+    def __init__(self, pixels, labels, sources, index=None, files=None, content_hash=None):
+        self._pixels = pixels
+        self._labels = labels
+        self._sources = sources
+        self.index = np.arange(len(labels)) if index is None else np.asarray(index, dtype=np.int64)
+        self.files = files or []
+        self.content_hash = content_hash
+
+    def __len__(self):
+        return len(self.index)
+
+    def subset(self, index):
+        """View selecting rows of this view (no data copied)"""
+        return ThermalDataset(self._pixels, self._labels, self._sources, self.index[index],
+                              self.files, self.content_hash)
+
+    @property
+    def labels(self):
+        return self._labels[self.index].astype(np.int32)
+
+    @property
+    def sources(self):
+        """Index into `files` of the CSV each frame came from"""
+        return self._sources[self.index]
+
+    @property
+    def raw_pixels(self):
+        """int16 centi-degree pixels (N, 768)"""
+        return self._pixels[self.index]
+
+    def features(self, dtype=np.float32, shape=(FRAME_H, FRAME_W, 1)):
+        """Decode temperatures in °C, default shape (N, 24, 32, 1)"""
+        out = self.raw_pixels.astype(np.float32)
+        out *= 1.0 / TEMP_SCALE
+        return out.astype(dtype, copy=False).reshape((len(self),) + tuple(shape))
+
+    def iter_chunks(self, chunk_size=1024):
+        """Yield (int16 pixels, int32 labels) chunks of this view in order
+
+        Rows within a chunk are read from the memmap in sorted order for
+        locality, so streaming works for caches larger than RAM.
+        """
+        for start in range(0, len(self.index), chunk_size):
+            rows = self.index[start:start + chunk_size]
+            order = np.argsort(rows)
+            inverse = np.empty_like(order)
+            inverse[order] = np.arange(len(order))
+            pixels = self._pixels[rows[order]][inverse]
+            yield pixels, self._labels[rows].astype(np.int32)
+
+    def by_class(self, label):
+        """View containing only frames with the given label"""
+        return self.subset(np.flatnonzero(self._labels[self.index] == label))
+
+    def class_counts(self):
+        values, counts = np.unique(self._labels[self.index], return_counts=True)
+        return {int(v): int(c) for v, c in zip(values, counts)}
+
+    def stratified_sample(self, count, random_state=0):
+        """View of `count` frames drawn without replacement, keeping the class ratio"""
+        rng = np.random.RandomState(random_state)
+        labels = self._labels[self.index]
+        count = min(count, len(self))
+        picked = []
+        for value in np.unique(labels):
+            group = np.flatnonzero(labels == value)
+            take = max(1, int(round(count * len(group) / len(self))))
+            picked.append(rng.choice(group, min(take, len(group)), replace=False))
+        picked = np.concatenate(picked)
+        return self.subset(picked[rng.permutation(len(picked))][:count])
+
+    def shuffled(self, random_state=42):
+        return self.subset(np.random.RandomState(random_state).permutation(len(self)))
+
+    def kfold(self, k=5, fold=0, random_state=24, stratify=True):
+        """(train, test) views for one fold of k-fold cross-validation, stratified by label by default
+
+        Fold membership depends only on k and random_state, so the same fold
+        index always holds out the same frames.
+        """
+        if not 0 <= fold < k:
+            raise ValueError(f"fold must be in [0, {k}), got {fold}")
+        rng = np.random.RandomState(random_state)
+        labels = self._labels[self.index]
+        groups = [np.flatnonzero(labels == v) for v in np.unique(labels)] if stratify else [np.arange(len(self))]
+        assignment = np.empty(len(self), dtype=np.int64)
+        for group in groups:
+            assignment[group[rng.permutation(len(group))]] = np.arange(len(group)) % k
+        train = np.flatnonzero(assignment != fold)
+        test = np.flatnonzero(assignment == fold)
+        return self.subset(train[rng.permutation(len(train))]), self.subset(test[rng.permutation(len(test))])
+
+    def split(self, test_size=0.2, random_state=24, stratify=True):
+        """Split into (train, test) views, stratified by label by default"""
+        rng = np.random.RandomState(random_state)
+        labels = self._labels[self.index]
+        groups = [np.flatnonzero(labels == v) for v in np.unique(labels)] if stratify else [np.arange(len(self))]
+        train_parts, test_parts = [], []
+        for group in groups:
+            group = group[rng.permutation(len(group))]
+            n_test = int(round(len(group) * test_size))
+            test_parts.append(group[:n_test])
+            train_parts.append(group[n_test:])
+        train = np.concatenate(train_parts)
+        test = np.concatenate(test_parts)
+        # Shuffle across classes so batches are mixed
+        return self.subset(train[rng.permutation(len(train))]), self.subset(test[rng.permutation(len(test))])
+
+    def group_split(self, groups, test_size=0.2, random_state=24, stratify=True):
+        """Split into (train, test) views keeping every group (e.g. near-duplicate cluster) on one side
+
+        `groups` holds one group id per frame of this view. Groups are
+        stratified by their majority label and taken until test_size of the
+        frames is reached.
+        """
+        rng = np.random.RandomState(random_state)
+        groups = np.asarray(groups)
+        ids, inverse, sizes = np.unique(groups, return_inverse=True, return_counts=True)
+        labels = self._labels[self.index].astype(np.int64)
+        fire = np.bincount(inverse, weights=labels > 0, minlength=len(ids))
+        group_label = (fire * 2 > sizes).astype(np.int64) if stratify else np.zeros(len(ids), dtype=np.int64)
+        test_groups = []
+        for value in np.unique(group_label):
+            members = np.flatnonzero(group_label == value)
+            members = members[rng.permutation(len(members))]
+            filled = np.cumsum(sizes[members])
+            test_groups.append(members[:np.searchsorted(filled, filled[-1] * test_size)])
+        in_test = np.isin(inverse, np.concatenate(test_groups))
+        train, test = np.flatnonzero(~in_test), np.flatnonzero(in_test)
+        return self.subset(train[rng.permutation(len(train))]), self.subset(test[rng.permutation(len(test))])
+
+
+def _cache_paths(cache_dir, content_hash):
+    stem = os.path.join(cache_dir, content_hash[:16])
+    return {name: f'{stem}.{name}.npy' for name in ('pixels', 'labels', 'sources')}, f'{stem}.json'
+
+
+def _open_cache(arrays, files, content_hash):
+    loaded = {name: np.load(path, mmap_mode='r') for name, path in arrays.items()}
+    return ThermalDataset(loaded['pixels'], loaded['labels'], loaded['sources'],
+                          files=list(files), content_hash=content_hash)
+
+
+def _atomic_save(path, array):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def load_dataset(data_dir, files=DEFAULT_FILES, cache_dir=None, verbose=True):
+    """Load the collected CSVs, using (and refreshing) the binary cache"""
+    paths = [os.path.join(data_dir, name) for name in files]
+    cache_dir = cache_dir or os.path.join(data_dir, '.cache')
+    content_hash = cached_hash(paths, cache_dir)
+    arrays, meta_path = _cache_paths(cache_dir, content_hash)
+
+    if os.path.exists(meta_path) and all(os.path.exists(p) for p in arrays.values()):
+        dataset = _open_cache(arrays, files, content_hash)
+        if verbose:
+            print(f"Loaded {len(dataset)} frames from cache {content_hash[:16]}")
+        return dataset
+
+    parsed = [parse_csv(path) for path in paths]
+    pixels = np.concatenate([p for p, _ in parsed])
+    labels = np.concatenate([l for _, l in parsed])
+    sources = np.concatenate([np.full(len(l), i, dtype=np.int8) for i, (_, l) in enumerate(parsed)])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _atomic_save(arrays['pixels'], pixels)
+    _atomic_save(arrays['labels'], labels)
+    _atomic_save(arrays['sources'], sources)
+    with open(meta_path, 'w') as f:
+        json.dump({'files': list(files), 'frames': int(len(labels)), 'hash': content_hash,
+                   'version': CACHE_VERSION, 'scale': TEMP_SCALE}, f, indent=4)
+    if verbose:
+        print(f"Parsed {len(labels)} frames from CSV, cached as {content_hash[:16]}")
+    return _open_cache(arrays, files, content_hash)
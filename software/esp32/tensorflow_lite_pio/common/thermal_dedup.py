@@ -0,0 +1,178 @@
+"""
+Near-duplicate detection and leakage-free splitting for thermal frames.
+
+Every frame is reduced to an 8x8 grid of block means (°C) and a 64-bit
+average hash (block mean above the frame mean). Candidates are found with
+banded LSH on the hash: the 64 bits are cut into BANDS bands and frames
+sharing a band value land in the same bucket, so any pair within
+BANDS - 1 differing bits is guaranteed to share a bucket, without O(n²)
+comparisons. Within a bucket, frames are grouped greedily around a leader
+and verified on hamming distance (bit-sliced popcount of XOR) and on the
+largest block-mean difference, then merged across bands with union-find.
+
+Usage:
+    python thermal_dedup.py ../03.data_training/data --tolerance 0.5 --out dedup_split.npz
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from thermal_dataset import FRAME_H, FRAME_W, TEMP_SCALE, load_dataset
+
+GRID = (8, 8)          # Block-mean grid: 24x32 -> 8x8 blocks of 3x4 pixels
+BANDS = 4              # LSH bands of 16 bits: exact recall up to 3 differing hash bits
+MAX_BITS = 3           # Hash bits allowed to differ between near-duplicates
+TOLERANCE = 0.5        # Largest allowed block-mean difference in °C
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def block_means(pixels):
+    """int16 centi-degree pixels (N, 768) -> float32 block means (N, 64) in °C"""
+    gh, gw = GRID
+    blocks = np.asarray(pixels, dtype=np.float32).reshape(-1, gh, FRAME_H // gh, gw, FRAME_W // gw)
+    return blocks.mean(axis=(2, 4)).reshape(-1, gh * gw) * np.float32(1.0 / TEMP_SCALE)
+
+
+def average_hash(blocks):
+    """64-bit hash per frame: bit set where the block is warmer than the frame mean"""
+    bits = blocks > blocks.mean(axis=1, keepdims=True)
+    return np.packbits(bits, axis=1).view('>u8').reshape(-1).astype(np.uint64)
+
+
+def hamming(a, b):
+    """Bit-sliced hamming distance between uint64 hashes (broadcasting)"""
+    x = np.ascontiguousarray(np.bitwise_xor(a, b), dtype=np.uint64)
+    return _POPCOUNT[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1)
+
+
+def fingerprints(dataset, chunk_size=8192):
+    """(block means (N, 64), hashes (N,)) for every frame of a view, streamed in chunks"""
+    blocks = np.empty((len(dataset), GRID[0] * GRID[1]), dtype=np.float32)
+    start = 0
+    for pixels, _ in dataset.iter_chunks(chunk_size):
+        blocks[start:start + len(pixels)] = block_means(pixels)
+        start += len(pixels)
+    return blocks, average_hash(blocks)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_duplicates(blocks, hashes, max_bits=MAX_BITS, tolerance=TOLERANCE, bands=BANDS):
+    """Cluster id per frame (the smallest member index of its near-duplicate cluster)"""
+    n = len(hashes)
+    parent = np.arange(n)
+    width = 64 // bands
+    mask = np.uint64((1 << width) - 1)
+    for band in range(bands):
+        keys = (hashes >> np.uint64(band * width)) & mask
+        order = np.argsort(keys, kind='stable')
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        for bucket in np.split(order, bounds):
+            remaining = bucket
+            while len(remaining) > 1:
+                leader, rest = remaining[0], remaining[1:]
+                close = (hamming(hashes[rest], hashes[leader]) <= max_bits) & \
+                        (np.abs(blocks[rest] - blocks[leader]).max(axis=1) <= tolerance)
+                root = _find(parent, leader)
+                for other in rest[close]:
+                    other_root = _find(parent, other)
+                    if other_root != root:
+                        low, high = min(root, other_root), max(root, other_root)
+                        parent[high] = low
+                        root = low
+                remaining = rest[~close]
+    return np.array([_find(parent, i) for i in range(n)])
+
+
+def find_duplicates(dataset, max_bits=MAX_BITS, tolerance=TOLERANCE, bands=BANDS):
+    """Cluster id per frame of a dataset view"""
+    blocks, hashes = fingerprints(dataset)
+    return cluster_duplicates(blocks, hashes, max_bits, tolerance, bands)
+
+
+def representatives(groups, labels, keep=1):
+    """Positions to keep: the first `keep` frames of every (cluster, label) pair"""
+    key = np.asarray(groups, dtype=np.int64) * 2 + (np.asarray(labels) > 0)
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+    first = np.r_[0, np.flatnonzero(np.diff(sorted_key)) + 1]
+    rank = np.arange(len(key)) - np.repeat(first, np.diff(np.r_[first, len(key)]))
+    return np.sort(order[rank < keep])
+
+
+def dedup_split(dataset, test_size=0.2, random_state=24, keep=1, groups=None, **options):
+    """Deduplicated (train, test) views with every near-duplicate cluster on one side only"""
+    groups = find_duplicates(dataset, **options) if groups is None else groups
+    kept = representatives(groups, dataset.labels, keep)
+    return dataset.subset(kept).group_split(groups[kept], test_size, random_state)
+
+
+def leakage(groups, train_positions, test_positions):
+    """Fraction of test frames that have a near-duplicate in the training set"""
+    if not len(test_positions):
+        return 0.0
+    return float(np.isin(groups[test_positions], groups[train_positions]).mean())
+
+
+def summarize(groups, labels):
+    _, inverse, sizes = np.unique(groups, return_inverse=True, return_counts=True)
+    fire = np.bincount(inverse, weights=np.asarray(labels) > 0, minlength=len(sizes))
+    return {
+        'frames': int(len(groups)),
+        'clusters': int(len(sizes)),
+        'duplicate_frames': int(len(groups) - len(sizes)),
+        'largest_cluster': int(sizes.max()) if len(sizes) else 0,
+        'mixed_label_clusters': int(np.sum((fire > 0) & (fire < sizes))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find near-duplicate thermal frames and write a leakage-free split')
+    parser.add_argument('data_dir', nargs='?', default=os.path.join('..', '03.data_training', 'data'))
+    parser.add_argument('--max-bits', type=int, default=MAX_BITS)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='Largest block-mean difference in °C')
+    parser.add_argument('--bands', type=int, default=BANDS, choices=[2, 4, 8])
+    parser.add_argument('--keep', type=int, default=1, help='Frames kept per cluster and label')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=24)
+    parser.add_argument('--out', help='Write train/test positions and cluster ids as .npz')
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.data_dir)
+    t0 = time.perf_counter()
+    groups = find_duplicates(dataset, args.max_bits, args.tolerance, args.bands)
+    seconds = time.perf_counter() - t0
+    labels = dataset.labels
+    stats = summarize(groups, labels)
+    print(f"{stats['frames']} frames -> {stats['clusters']} clusters in {seconds:.2f} s "
+          f"({stats['duplicate_frames']} near-duplicates, largest cluster {stats['largest_cluster']})")
+    if stats['mixed_label_clusters']:
+        print(f"⚠️ {stats['mixed_label_clusters']} clusters contain both labels (check labelling)")
+
+    # Leakage of the random split used so far vs the deduplicated group split (full dataset: index == position)
+    random_train, random_test = dataset.split(args.test_size, args.seed)
+    print(f"Random split: {leakage(groups, random_train.index, random_test.index):.1%} of test frames "
+          f"have a near-duplicate in train")
+
+    kept = representatives(groups, labels, args.keep)
+    train, test = dataset.subset(kept).group_split(groups[kept], args.test_size, args.seed)
+    print(f"Deduplicated split: train {len(train)} {train.class_counts()}, test {len(test)} {test.class_counts()}, "
+          f"leakage {leakage(groups, train.index, test.index):.1%}")
+
+    if args.out:
+        np.savez(args.out, train=train.index, test=test.index, groups=groups,
+                 content_hash=np.array(dataset.content_hash))
+        print(f"📦 Saved split to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
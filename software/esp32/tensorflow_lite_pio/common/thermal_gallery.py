@@ -0,0 +1,248 @@
+"""
+Headless contact-sheet renderer for MLX90640 thermal frames.
+
+Frames (24x32) are mapped through a colormap lookup table in one vectorized
+step, tiled into a single RGB array and written as PNG with only the standard
+library (zlib), so it runs without a display, in CI, and at thousands of
+frames per second.
+
+Usage:
+    python thermal_gallery.py ../03.data_training/data/mlx90640_data_1.csv --out gallery/fire
+"""
+import os
+import struct
+import zlib
+import argparse
+import numpy as np
+
+FRAME_H = 24
+FRAME_W = 32
+
+# 3x5 bitmap font, only the characters needed for captions
+_FONT = {
+    '0': ('111', '101', '101', '101', '111'),
+    '1': ('010', '110', '010', '010', '111'),
+    '2': ('111', '001', '111', '100', '111'),
+    '3': ('111', '001', '111', '001', '111'),
+    '4': ('101', '101', '111', '001', '001'),
+    '5': ('111', '100', '111', '001', '111'),
+    '6': ('111', '100', '111', '101', '111'),
+    '7': ('111', '001', '010', '010', '010'),
+    '8': ('111', '101', '111', '101', '111'),
+    '9': ('111', '101', '111', '001', '111'),
+    'L': ('100', '100', '100', '100', '111'),
+    'P': ('111', '101', '111', '100', '100'),
+    '.': ('000', '000', '000', '000', '010'),
+    '-': ('000', '000', '111', '000', '000'),
+    ' ': ('000', '000', '000', '000', '000'),
+}
+_CHARS = ''.join(_FONT)
+_GLYPHS = np.array([[[c == '1' for c in row] for row in _FONT[ch]] for ch in _CHARS], dtype=bool)
+_CHAR_CODE = np.full(128, _CHARS.index(' '), dtype=np.int64)
+for _i, _ch in enumerate(_CHARS):
+    _CHAR_CODE[ord(_ch)] = _i
+GLYPH_H, GLYPH_W = 5, 4  # Glyph size including 1px spacing column
+
+BACKGROUND = (32, 32, 32)
+CAPTION_NEUTRAL = (48, 48, 48)
+CAPTION_CORRECT = (20, 110, 40)
+CAPTION_WRONG = (170, 30, 30)
+TEXT_COLOR = (255, 255, 255)
+
+
+def build_lut(cmap='coolwarm', size=256):
+    """Build a (size, 3) uint8 colormap lookup table"""
+    try:
+        from matplotlib import colormaps
+        colors = colormaps[cmap](np.linspace(0.0, 1.0, size))[:, :3]
+    except ImportError:
+        # Fallback without matplotlib: blue -> white -> red ramp
+        t = np.linspace(0.0, 1.0, size)[:, None]
+        blue = np.array([0.23, 0.30, 0.75])
+        white = np.array([0.87, 0.87, 0.87])
+        red = np.array([0.71, 0.02, 0.15])
+        colors = np.where(t < 0.5, blue + (white - blue) * (t * 2), white + (red - white) * (t * 2 - 1))
+    return np.round(colors * 255).astype(np.uint8)
+
+
+def frames_to_indices(frames, vmin=0.0, vmax=120.0, levels=256):
+    """Quantize temperatures to colormap indices, returns (N, 24, 32) uint8"""
+    frames = np.asarray(frames, dtype=np.float32).reshape(-1, FRAME_H, FRAME_W)
+    scaled = (frames - vmin) * ((levels - 1) / float(vmax - vmin))
+    np.clip(scaled, 0, levels - 1, out=scaled)
+    return scaled.astype(np.uint8)
+
+
+def render_text(strings, scale=1):
+    """Render strings with the bitmap font, returns (N, 5*scale, width) bool masks"""
+    width = max((len(s) for s in strings), default=0)
+    codes = np.full((len(strings), max(width, 1)), _CHARS.index(' '), dtype=np.int64)
+    for i, s in enumerate(strings):
+        raw = np.frombuffer(s.encode('ascii', 'replace'), dtype=np.uint8)
+        codes[i, :len(raw)] = _CHAR_CODE[raw & 0x7f]
+    # (N, chars, 5, 3) -> pad spacing column -> (N, 5, chars * 4)
+    glyphs = _GLYPHS[codes]
+    glyphs = np.pad(glyphs, ((0, 0), (0, 0), (0, 0), (0, 1)))
+    masks = glyphs.transpose(0, 2, 1, 3).reshape(len(strings), GLYPH_H, -1)
+    if scale > 1:
+        masks = masks.repeat(scale, axis=1).repeat(scale, axis=2)
+    return masks
+
+
+def make_captions(count, indices=None, labels=None, predictions=None):
+    """Build caption strings: '<index> L<label> P<probability>'"""
+    captions = []
+    for i in range(count):
+        parts = [str(indices[i] if indices is not None else i)]
+        if labels is not None:
+            parts.append(f'L{int(labels[i])}')
+        if predictions is not None:
+            parts.append(f'P{float(predictions[i]):.2f}')
+        captions.append(' '.join(parts))
+    return captions
+
+
+def render_gallery(frames, cols=16, scale=4, pad=2, vmin=0.0, vmax=120.0, cmap='coolwarm', lut=None,
+                   indices=None, labels=None, predictions=None, threshold=0.5, captions=True, text_scale=1):
+    """Render frames into one tiled RGB uint8 array (H, W, 3)
+
+    When both labels and predictions are given, each caption band is colored
+    green for a correct and red for a wrong prediction.
+    """
+    if lut is None:
+        lut = build_lut(cmap)
+    idx = frames_to_indices(frames, vmin, vmax, len(lut))
+    count = len(idx)
+    cols = max(1, min(cols, count))
+    rows = max(1, -(-count // cols))
+    tile_h, tile_w = FRAME_H * scale, FRAME_W * scale
+    caption_h = (GLYPH_H + 2) * text_scale if captions else 0
+    cell_h, cell_w = tile_h + caption_h + pad, tile_w + pad
+
+    # Apply the LUT at sensor resolution, then upscale whole rows of tiles at once
+    grid = np.zeros((rows * cols, FRAME_H, FRAME_W, 3), dtype=np.uint8)
+    np.take(lut, idx, axis=0, out=grid[:count])
+    grid = grid.reshape(rows, cols, FRAME_H, FRAME_W, 3).transpose(0, 2, 1, 3, 4)
+    if scale > 1:
+        grid = grid.repeat(scale, axis=1).repeat(scale, axis=3)
+
+    canvas = np.empty((rows, cell_h, cols, cell_w, 3), dtype=np.uint8)
+    canvas[...] = np.asarray(BACKGROUND, dtype=np.uint8)
+    canvas[:, :tile_h, :, :tile_w] = grid
+
+    if captions and count:
+        band = np.empty((rows * cols, 3), dtype=np.uint8)
+        band[:] = BACKGROUND
+        band[:count] = CAPTION_NEUTRAL
+        if labels is not None and predictions is not None:
+            predicted = np.asarray(predictions, dtype=np.float32).reshape(count) >= threshold
+            correct = predicted == (np.asarray(labels).reshape(count) > 0)
+            band[:count] = np.where(correct[:, None], CAPTION_CORRECT, CAPTION_WRONG)
+        band = band.reshape(rows, cols, 3)
+        canvas[:, tile_h:tile_h + caption_h, :, :tile_w] = band[:, None, :, None, :]
+
+        masks = render_text(make_captions(count, indices, labels, predictions), text_scale)
+        masks = masks[:, :, :tile_w - text_scale]
+        text = np.zeros((rows * cols, GLYPH_H * text_scale, tile_w), dtype=bool)
+        text[:count, :, text_scale:text_scale + masks.shape[2]] = masks
+        text = text.reshape(rows, cols, GLYPH_H * text_scale, tile_w).transpose(0, 2, 1, 3)
+        top = tile_h + text_scale
+        region = canvas[:, top:top + GLYPH_H * text_scale, :, :tile_w]
+        region[text] = TEXT_COLOR
+
+    image = canvas.reshape(rows * cell_h, cols * cell_w, 3)
+    return image
+
+
+def render_colorbar(width, vmin=0.0, vmax=120.0, cmap='coolwarm', lut=None, height=10, text_scale=1):
+    """Render a horizontal colorbar strip labelled with vmin/vmax"""
+    if lut is None:
+        lut = build_lut(cmap)
+    label_h = (GLYPH_H + 2) * text_scale
+    bar = np.empty((height + label_h, width, 3), dtype=np.uint8)
+    bar[...] = BACKGROUND
+    positions = np.linspace(0, len(lut) - 1, width).astype(np.int64)
+    bar[:height] = lut[positions][None, :, :]
+    low, high = render_text([f'{vmin:g}', f'{vmax:g}'], text_scale)
+    low = low[:, :width // 2]
+    high = high[:, :width // 2]
+    top = height + text_scale
+    bar[top:top + low.shape[0], :low.shape[1]][low] = TEXT_COLOR
+    bar[top:top + high.shape[0], width - high.shape[1]:][high] = TEXT_COLOR
+    return bar
+
+
+def write_png(path, image, compress_level=6):
+    """Write an (H, W, 3) uint8 array as PNG using zlib only"""
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+    # Filter type 0 (None) prefix byte on every scanline
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', header))
+        f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), compress_level)))
+        f.write(chunk(b'IEND', b''))
+
+
+def write_contact_sheets(frames, out_prefix, per_sheet=256, cols=16, vmin=0.0, vmax=120.0, cmap='coolwarm',
+                         indices=None, labels=None, predictions=None, colorbar=True, compress_level=1, **kwargs):
+    """Split frames into pages and write '<out_prefix>_<page>.png' contact sheets, returns the paths"""
+    frames = np.asarray(frames).reshape(-1, FRAME_H, FRAME_W)
+    if indices is None:
+        indices = np.arange(len(frames))
+    lut = build_lut(cmap)
+    out_dir = os.path.dirname(out_prefix)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    paths = []
+    for page, start in enumerate(range(0, len(frames), per_sheet)):
+        sl = slice(start, start + per_sheet)
+        image = render_gallery(frames[sl], cols=cols, vmin=vmin, vmax=vmax, lut=lut,
+                               indices=np.asarray(indices)[sl],
+                               labels=None if labels is None else np.asarray(labels)[sl],
+                               predictions=None if predictions is None else np.asarray(predictions)[sl],
+                               **kwargs)
+        if colorbar:
+            image = np.concatenate([image, render_colorbar(image.shape[1], vmin, vmax, lut=lut)], axis=0)
+        path = f'{out_prefix}_{page:03d}.png'
+        write_png(path, image, compress_level)
+        paths.append(path)
+    return paths
+
+
+def load_csv_frames(path):
+    """Load a collected CSV (label,p0..p767), returns (frames, labels)"""
+    data = np.loadtxt(path, delimiter=',', skiprows=1, dtype=np.float32, ndmin=2)
+    return data[:, 1:].reshape(-1, FRAME_H, FRAME_W), data[:, 0].astype(np.int32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render thermal frame CSVs to PNG contact sheets')
+    parser.add_argument('csv', nargs='+', help='Collected CSV files (label,p0,...,p767)')
+    parser.add_argument('--out', default='gallery/sheet', help='Output path prefix')
+    parser.add_argument('--per-sheet', type=int, default=256)
+    parser.add_argument('--cols', type=int, default=16)
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--vmin', type=float, default=0.0)
+    parser.add_argument('--vmax', type=float, default=120.0)
+    parser.add_argument('--cmap', default='coolwarm')
+    args = parser.parse_args()
+
+    loaded = [load_csv_frames(path) for path in args.csv]
+    frames = np.concatenate([f for f, _ in loaded])
+    labels = np.concatenate([l for _, l in loaded])
+    paths = write_contact_sheets(frames, args.out, per_sheet=args.per_sheet, cols=args.cols, scale=args.scale,
+                                 vmin=args.vmin, vmax=args.vmax, cmap=args.cmap, labels=labels)
+    print(f"Rendered {len(frames)} frames into {len(paths)} sheets ({args.out}_*.png)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Local HTTP / WebSocket API over live state and stored history.
+
+An asyncio server (standard library only) runs in its own thread, bound to
+127.0.0.1 by default:
+
+    GET /api/state                      latest detection update per device
+    GET /api/events?start=&end=&mode=&fire=&after_id=&limit=
+                                        fire_events page in id order, with next_after_id
+    GET /api/rollups?start=&end=&step=&group_by=device,mode&device=
+                                        aggregates from the coarsest sufficient rollup
+    GET /ws/live                        WebSocket stream of detection updates
+
+Times are epoch seconds. Query results are cached by path and parameters
+and invalidated when the application writes new rows (events and rollups
+separately). Every WebSocket client has its own bounded queue: when a slow
+client falls behind, its oldest pending updates are dropped and the next
+message reports how many were skipped, so one client never blocks ingestion
+or the others.
+"""
+import json
+import base64
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+DEFAULT_API = {'enabled': True, 'host': '127.0.0.1', 'port': 8765}
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_PAGE = 1000
+
+_STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error'}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class WsClient:
+    """A WebSocket connection's bounded queue of pending messages"""
+
+    def __init__(self, size):
+        self.queue = asyncio.Queue(size)
+        self.dropped = 0   # Updates skipped since the last message sent
+
+
+class ApiServer:
+    def __init__(self, db_manager, host='127.0.0.1', port=8765, cache_size=128, client_queue=64):
+        self.db_manager = db_manager
+        self.host = host
+        self.port = port
+        self.cache_size = cache_size
+        self.client_queue = client_queue
+        self.state = {}                                  # device -> latest update
+        self.cache = OrderedDict()                       # (kind, path, params) -> (generation, body)
+        self.generations = {'events': 0, 'rollups': 0}   # Bumped on every write of that kind
+        self.clients = set()
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.started = threading.Event()
+        self.error = None
+        self.stats = {'requests': 0, 'cache_hits': 0, 'ws_sent': 0, 'ws_dropped': 0}
+
+    @classmethod
+    def from_config(cls, db_manager, config=None):
+        config = dict(DEFAULT_API, **(config or {}))
+        if not config.pop('enabled'):
+            return None
+        return cls(db_manager, **config)
+
+    # ---- Called from the application (any thread) ----
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='api-server', daemon=True)
+        self.thread.start()
+        self.started.wait(5)
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(5)
+
+    def publish(self, update):
+        """New detection update: becomes the device state and is streamed to WebSocket clients"""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._publish, update)
+
+    def invalidate(self, kind):
+        """Rows of `kind` ('events' or 'rollups') were written, cached answers are stale"""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._invalidate, kind)
+
+    # ---- Event loop thread ----
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as e:
+            self.error = f'{self.host}:{self.port}: {e.strerror}'
+            self.loop.close()
+            self.loop = None
+            self.started.set()
+            return
+        self.started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            for client in list(self.clients):
+                if client.queue.full():
+                    client.queue.get_nowait()
+                client.queue.put_nowait(None)
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+
+    def _publish(self, update):
+        self.state[update.get('device')] = update
+        message = json.dumps(update)
+        for client in self.clients:
+            if client.queue.full():
+                client.queue.get_nowait()   # Drop the oldest update for this slow client
+                client.dropped += 1
+                self.stats['ws_dropped'] += 1
+            client.queue.put_nowait(message)
+
+    def _invalidate(self, kind):
+        self.generations[kind] += 1
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            lines = request.decode('latin-1').split('\r\n')
+            method, target, _ = lines[0].split(' ', 2)
+            headers = {k.strip().lower(): v.strip() for k, v in (l.split(':', 1) for l in lines[1:] if ':' in l)}
+            url = urlsplit(target)
+            self.stats['requests'] += 1
+            if url.path == '/ws/live' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._websocket(reader, writer, headers)
+                return
+            if method != 'GET':
+                raise ApiError(405, 'Only GET is supported')
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            body = await self._route(url.path, params)
+            self._respond(writer, 200, body)
+        except ApiError as e:
+            self._respond(writer, e.status, json.dumps({'error': str(e)}).encode())
+        except ValueError as e:
+            self._respond(writer, 400, json.dumps({'error': str(e)}).encode())
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except Exception as e:
+            self._respond(writer, 500, json.dumps({'error': str(e)}).encode())
+        finally:
+            writer.close()
+
+    def _respond(self, writer, status, body):
+        writer.write((f'HTTP/1.1 {status} {_STATUS_TEXT[status]}\r\n'
+                      'Content-Type: application/json\r\n'
+                      f'Content-Length: {len(body)}\r\n'
+                      'Access-Control-Allow-Origin: *\r\n'
+                      'Connection: close\r\n\r\n').encode() + body)
+
+    async def _route(self, path, params):
+        if path == '/api/state':
+            return json.dumps({'devices': self.state}).encode()
+        if path == '/api/events':
+            return await self._cached('events', path, params, self._events)
+        if path == '/api/rollups':
+            return await self._cached('rollups', path, params, self._rollups)
+        raise ApiError(404, f'Unknown path {path}')
+
+    async def _cached(self, kind, path, params, query):
+        key = (kind, path, tuple(sorted(params.items())))
+        generation = self.generations[kind]
+        hit = self.cache.get(key)
+        if hit and hit[0] == generation:
+            self.cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return hit[1]
+        # SQLite work runs in a worker thread so the loop keeps streaming
+        body = json.dumps(await asyncio.to_thread(query, params)).encode()
+        self.cache[key] = (generation, body)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return body
+
+    @staticmethod
+    def _number(params, name, default=None, kind=float):
+        try:
+            return kind(params[name]) if name in params else default
+        except ValueError:
+            raise ApiError(400, f'{name} must be a number')
+
+    def _events(self, params):
+        limit = self._number(params, 'limit', 100, int)
+        if limit < 1:
+            raise ApiError(400, 'limit must be positive')
+        limit = min(limit, MAX_PAGE)
+        fire = params.get('fire')
+        # One row more than the page tells whether another page follows
+        records = self.db_manager.get_all_fire_events(
+            None if fire is None else fire.lower() in ('1', 'true', 'yes'),
+            self._number(params, 'start'), self._number(params, 'end'), params.get('mode'),
+            self._number(params, 'after_id', None, int), limit + 1)
+        fields = ('id', 'timestamp', 'min_temp', 'max_temp', 'center_temp', 'fire_detected', 'mode', 'device')
+        page = [dict(zip(fields, r)) for r in records[:limit]]
+        return {'events': page, 'next_after_id': page[-1]['id'] if len(records) > limit else None}
+
+    def _rollups(self, params):
+        if 'start' not in params or 'end' not in params:
+            raise ApiError(400, 'start and end are required')
+        step = self._number(params, 'step', 3600, int)
+        if step <= 0:
+            raise ApiError(400, 'step must be positive')
+        group_by = [g for g in params.get('group_by', 'device,mode').split(',') if g]
+        rows, table = self.db_manager.get_rollups(self._number(params, 'start'), self._number(params, 'end'), step,
+                                                  group_by, params.get('device'))
+        return {'table': table, 'step': step, 'rows': rows}
+
+    async def _websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WS_GUID).encode()).digest())
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        client = WsClient(self.client_queue)
+        self.clients.add(client)
+        receiver = asyncio.ensure_future(self._ws_receive(reader, writer, client.queue))
+        try:
+            while True:
+                message = await client.queue.get()
+                if message is None:
+                    break
+                if client.dropped:
+                    message = json.dumps({'dropped': client.dropped, 'update': json.loads(message)})
+                    client.dropped = 0
+                writer.write(_ws_frame(0x1, message.encode()))
+                await writer.drain()
+                self.stats['ws_sent'] += 1
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            receiver.cancel()
+
+    async def _ws_receive(self, reader, writer, queue):
+        """Answer pings and notice the client closing (clients do not send data)"""
+        try:
+            while True:
+                head = await reader.readexactly(2)
+                opcode, length = head[0] & 0x0F, head[1] & 0x7F
+                if length == 126:
+                    length = int.from_bytes(await reader.readexactly(2), 'big')
+                elif length == 127:
+                    length = int.from_bytes(await reader.readexactly(8), 'big')
+                mask = await reader.readexactly(4) if head[1] & 0x80 else b'\0\0\0\0'
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+                if opcode == 0x8:
+                    writer.write(_ws_frame(0x8, payload[:2]))
+                    break
+                if opcode == 0x9:
+                    writer.write(_ws_frame(0xA, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+def _ws_frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x80 | opcode, length])
+    elif length < 1 << 16:
+        header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, 'big')
+    else:
+        header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, 'big')
+    return header + payload
@@ -0,0 +1,191 @@
+"""
+Debounced, versioned device configuration sync, without Qt.
+
+The window reports every edit of the configuration controls with edit().
+Nothing is published while the user keeps editing: poll() releases one
+message once the controls have been still for `debounce` seconds, or every
+`max_delay` seconds during a long drag. The message holds only the fields
+that changed since the last message, plus an increasing config_version.
+The firmware applies the fields it finds and ignores config_version.
+
+Devices confirm on /ESP32/config_response (the firmware's ack) and report
+changes made on the device itself on /ESP32/config_update. Both carry the
+device's whole configuration. A report that matches a sent version
+acknowledges that version for the device. The firmware's messages carry
+no device id, so they count as "ESP32" unless they include "device".
+
+A device whose report matches no tracked version has diverged, usually
+because it missed a diff. While any known device has not confirmed the
+latest version, the whole configuration is resent every `ack_timeout`
+seconds, up to `retries` times. push_fleet() sends the whole configuration
+to every device at once; /ESP32/config is one topic that all devices
+subscribe to.
+
+Echo suppression: a change made on a device becomes the new baseline
+(remote_update()), so showing it in the controls produces no diff and
+nothing is sent back.
+"""
+import json
+import time
+
+from rollups import DEFAULT_DEVICE
+
+FIELDS = ('measurement_mode', 'threshold_1', 'threshold_2', 'threshold_3', 'threshold_4', 'threshold_5')
+# Decimal places the firmware reports (config_response / config_update format strings)
+PRECISION = {'measurement_mode': 0, 'threshold_1': 1, 'threshold_2': 2, 'threshold_3': 1, 'threshold_4': 2,
+             'threshold_5': 1}
+# config_response field names
+RESPONSE_FIELDS = {'mode': 'measurement_mode', 'th1': 'threshold_1', 'th2': 'threshold_2', 'th3': 'threshold_3',
+                   'th4': 'threshold_4', 'th5': 'threshold_5'}
+DEFAULT_SYNC = {'debounce': 0.4, 'max_delay': 2.0, 'ack_timeout': 5.0, 'retries': 3}
+
+
+def normalize(config):
+    """Known fields rounded to the precision the firmware reports"""
+    return {key: (int(config[key]) if PRECISION[key] == 0 else round(float(config[key]), PRECISION[key]))
+            for key in FIELDS if key in config}
+
+
+def parse_report(topic, message):
+    """(device, config) of a config_response / config_update message, None for other messages"""
+    data = json.loads(message)
+    device = data.get('device', DEFAULT_DEVICE)
+    if topic.endswith('config_response'):
+        if data.get('status') != 'ok':
+            return None
+        data = {RESPONSE_FIELDS[k]: v for k, v in data.items() if k in RESPONSE_FIELDS}
+    config = normalize(data)
+    return (device, config) if config else None
+
+
+class ConfigSync:
+    def __init__(self, publish, debounce=0.4, max_delay=2.0, ack_timeout=5.0, retries=3):
+        self.publish = publish           # publish(payload_text) -> bool, sends to /ESP32/config
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.desired = {}                # What the controls show
+        self.sent = {}                   # Baseline diffs are computed against
+        self.version = 0
+        self.pending = {}                # version -> {'config', 'sent', 'attempts'}
+        self.devices = {}                # device -> {'version', 'config', 'time', 'state'}
+        self.first_edit = None
+        self.last_edit = None
+        self.stats = {'edits': 0, 'messages': 0, 'suppressed': 0, 'resent': 0}
+
+    @classmethod
+    def from_config(cls, publish, config=None):
+        return cls(publish, **dict(DEFAULT_SYNC, **(config or {})))
+
+    def edit(self, config, now=None):
+        """The controls changed; publishing waits for poll()"""
+        now = time.monotonic() if now is None else now
+        self.desired = normalize(config)
+        self.stats['edits'] += 1
+        if self._diff():
+            self.last_edit = now
+            if self.first_edit is None:
+                self.first_edit = now
+        else:
+            self.first_edit = self.last_edit = None   # Back to what was sent, or a device's own change shown
+
+    def remote_update(self, device, config, now=None):
+        """A device changed its configuration itself: adopt it as the baseline, never echo it back
+
+        It becomes a version that is not sent (nor resent); other devices
+        get it with push_fleet().
+        """
+        now = time.monotonic() if now is None else now
+        self.sent = dict(self.sent, **config)
+        self.desired = dict(self.desired, **config)
+        self.first_edit = self.last_edit = None
+        self.version += 1
+        self.pending[self.version] = {'config': dict(self.sent), 'sent': now, 'attempts': self.retries + 1}
+        self.stats['suppressed'] += 1
+        self.report(device, config, now)
+
+    def _diff(self):
+        return {k: v for k, v in self.desired.items() if self.sent.get(k) != v}
+
+    def poll(self, now=None):
+        """Send what is due (a settled edit, or a resend); returns the payloads sent"""
+        now = time.monotonic() if now is None else now
+        sent = []
+        if self.last_edit is not None and (now - self.last_edit >= self.debounce
+                                           or now - self.first_edit >= self.max_delay):
+            diff = self._diff()
+            if diff and self._send(diff, now):
+                sent.append(diff)
+                self.first_edit = self.last_edit = None
+        if self.pending and self.devices:
+            latest = max(self.pending)
+            entry = self.pending[latest]
+            if (now - entry['sent'] >= self.ack_timeout and entry['attempts'] <= self.retries
+                    and not self._all_acked(latest)):
+                # Full configuration, so a device that missed a diff catches up
+                if self._resend(latest, now):
+                    sent.append(entry['config'])
+        return sent
+
+    def push_fleet(self, now=None):
+        """Send the whole configuration to every device as one new version"""
+        now = time.monotonic() if now is None else now
+        self.first_edit = self.last_edit = None
+        return self._send(dict(self.desired), now)
+
+    def _send(self, fields, now):
+        version = self.version + 1
+        if not self.publish(json.dumps(dict(fields, config_version=version))):
+            return False
+        self.version = version
+        self.sent = dict(self.sent, **fields)
+        self.pending[version] = {'config': dict(self.sent), 'sent': now, 'attempts': 1}
+        self.stats['messages'] += 1
+        return True
+
+    def _resend(self, version, now):
+        entry = self.pending[version]
+        if not self.publish(json.dumps(dict(entry['config'], config_version=version))):
+            return False
+        entry['sent'] = now
+        entry['attempts'] += 1
+        self.stats['resent'] += 1
+        return True
+
+    def _all_acked(self, version):
+        return bool(self.devices) and all(s['version'] is not None and s['version'] >= version
+                                          for s in self.devices.values())
+
+    def report(self, device, config, now=None):
+        """A device's whole configuration from config_response / config_update"""
+        now = time.monotonic() if now is None else now
+        state = self.devices.setdefault(device, {'version': None, 'config': {}, 'time': now, 'state': 'unknown'})
+        state['config'], state['time'] = config, now
+        matched = [v for v, entry in self.pending.items() if _matches(entry['config'], config)]
+        if matched:
+            state['version'] = max(matched)
+            # Versions every known device has confirmed need no more tracking
+            for version in [v for v in self.pending if v < max(self.pending) and self._all_acked(v)]:
+                del self.pending[version]
+        if self.pending and state['version'] == max(self.pending):
+            state['state'] = 'in sync'
+        elif self.pending and not matched:
+            state['state'] = 'diverged'
+        elif not self.pending:
+            state['state'] = 'in sync' if _matches(self.sent, config) else 'diverged'
+        else:
+            state['state'] = 'pending'
+        return state['state']
+
+    def summary(self):
+        """Short status text: version and per-device state"""
+        if not self.devices:
+            return f'v{self.version}: no device reports yet'
+        return f'v{self.version}: ' + ', '.join(
+            f"{device} {state['state']}" + (f" (v{state['version']})" if state['version'] else '')
+            for device, state in sorted(self.devices.items()))
+
+
+def _matches(expected, reported):
+    return all(reported.get(k) == v for k, v in expected.items() if k in reported)
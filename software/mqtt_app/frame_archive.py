@@ -0,0 +1,322 @@
+"""
+Compressed archive of full MLX90640 frames.
+
+Frames are quantized to int16 centi-degrees and grouped into chunks of up to
+chunk_frames frames. Inside a chunk each frame is stored as the difference to
+the previous frame of the same device (the first frame of a device in a chunk
+as the difference between neighbouring pixels), zigzag-encoded so small
+negative and positive steps both become small numbers, split into a high-byte
+and a low-byte plane and compressed with zlib. Chunks never reference each
+other, so any chunk decodes on its own.
+
+File layout: b'TFA1', then per chunk a header (b'TFAC', compressed length,
+frame count, first and last time) and the compressed payload. A sidecar
+.idx file lists (offset, length, frames, first time, last time) per chunk, so
+a frame index or time window is served by decompressing only the chunks that
+cover it; the index is rebuilt from the chunk headers when missing or short.
+
+Usage:
+    python frame_archive.py pack mlx90640_data_1.csv frames.tfa
+    python frame_archive.py info frames.tfa
+"""
+import os
+import sys
+import json
+import zlib
+import time
+import struct
+import argparse
+from bisect import bisect_right
+from datetime import datetime
+import numpy as np
+
+PIXELS = 768
+TEMP_SCALE = 100           # Centi-degrees, as in the training data cache
+MAGIC = b'TFA1'
+CHUNK_MAGIC = b'TFAC'
+CHUNK_HEADER = struct.Struct('<4sIIdd')   # magic, compressed length, frames, first time, last time
+INDEX_ENTRY = struct.Struct('<QIIdd')     # offset, compressed length, frames, first time, last time
+MAX_CHUNK_DEVICES = 256                   # Device numbers are stored as uint8 per frame
+
+
+def _zigzag(d):
+    d = d.view(np.int16)
+    return ((d << 1) ^ (d >> 15)).view(np.uint16)
+
+
+def _unzigzag(z):
+    sign = (-(z & 1).astype(np.int16)).view(np.uint16)
+    return (z >> 1) ^ sign
+
+
+def encode_chunk(times, devices, pixels):
+    """Chunk payload for (n,) times, n device names and (n, 768) int16 centi-degree frames"""
+    names = sorted(set(devices))
+    number = {name: i for i, name in enumerate(names)}
+    device_index = np.array([number[d] for d in devices], dtype=np.uint8)
+    frames = np.ascontiguousarray(pixels, dtype=np.int16).view(np.uint16)
+    deltas = np.empty_like(frames)
+    for i in range(len(names)):
+        rows = np.flatnonzero(device_index == i)
+        # Keyframe: along the pixel row; then frame-to-frame per device (uint16 arithmetic wraps exactly)
+        deltas[rows[0]] = np.diff(frames[rows[0]], prepend=np.uint16(0))
+        deltas[rows[1:]] = frames[rows[1:]] - frames[rows[:-1]]
+    z = _zigzag(deltas)
+    planes = np.concatenate([(z >> 8).astype(np.uint8).ravel(), (z & 0xFF).astype(np.uint8).ravel()])
+    header = json.dumps(names).encode()
+    return b''.join([struct.pack('<HI', len(header), len(times)), header,
+                     np.asarray(times, dtype='<f8').tobytes(), device_index.tobytes(), planes.tobytes()])
+
+
+def decode_chunk(payload):
+    """(times, device names per frame, (n, 768) int16 frames) of a chunk payload"""
+    header_len, n = struct.unpack_from('<HI', payload)
+    pos = 6
+    names = json.loads(payload[pos:pos + header_len])
+    pos += header_len
+    times = np.frombuffer(payload, dtype='<f8', count=n, offset=pos)
+    pos += 8 * n
+    device_index = np.frombuffer(payload, dtype=np.uint8, count=n, offset=pos)
+    pos += n
+    planes = np.frombuffer(payload, dtype=np.uint8, count=2 * n * PIXELS, offset=pos).reshape(2, n, PIXELS)
+    deltas = _unzigzag((planes[0].astype(np.uint16) << 8) | planes[1])
+    frames = np.empty_like(deltas)
+    for i in range(len(names)):
+        rows = np.flatnonzero(device_index == i)
+        key = np.cumsum(deltas[rows[0]], dtype=np.uint16)
+        frames[rows[0]] = key
+        if len(rows) > 1:
+            frames[rows[1:]] = key + np.cumsum(deltas[rows[1:]], axis=0, dtype=np.uint16)
+    return times, [names[i] for i in device_index], frames.view(np.int16)
+
+
+def quantize(frame):
+    """°C values -> int16 centi-degrees"""
+    return np.clip(np.round(np.asarray(frame, dtype=np.float32) * TEMP_SCALE), -32768, 32767).astype(np.int16)
+
+
+class FrameArchive:
+    """Append-only frame archive file with chunk-level random access"""
+
+    def __init__(self, path, chunk_frames=256, level=6):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.chunk_frames = chunk_frames
+        self.level = level
+        self.pending = ([], [], [])   # times, devices, int16 frames of the chunk being filled
+        self.index = []               # (offset, length, frames, first time, last time) per chunk
+        self.starts = []              # Frame number of each chunk's first frame
+        self.frames = 0
+        self.cache = (None, None)     # (chunk number, decoded chunk)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(MAGIC)
+            open(self.index_path, 'wb').close()
+        self._load_index()
+
+    def _load_index(self):
+        size = os.path.getsize(self.path)
+        entries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            entries = [INDEX_ENTRY.unpack_from(data, i)
+                       for i in range(0, len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size)]
+        end = entries[-1][0] + entries[-1][1] if entries else len(MAGIC)
+        if end != size:
+            # Index missing or behind the data: rebuild it from the chunk headers
+            entries = self._scan()
+            with open(self.index_path, 'wb') as f:
+                f.write(b''.join(INDEX_ENTRY.pack(*e) for e in entries))
+        self.index, self.starts, self.frames = [], [], 0
+        for entry in entries:
+            self._add_entry(entry)
+
+    def _scan(self):
+        entries = []
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{self.path} is not a frame archive')
+            offset = len(MAGIC)
+            while True:
+                header = f.read(CHUNK_HEADER.size)
+                if len(header) < CHUNK_HEADER.size:
+                    break
+                magic, length, frames, first, last = CHUNK_HEADER.unpack(header)
+                if magic != CHUNK_MAGIC or len(f.read(length)) < length:
+                    break  # Torn write at the end: drop it
+                entries.append((offset, CHUNK_HEADER.size + length, frames, first, last))
+                offset += CHUNK_HEADER.size + length
+        with open(self.path, 'r+b') as f:
+            f.truncate(offset)
+        return entries
+
+    def _add_entry(self, entry):
+        self.index.append(entry)
+        self.starts.append(self.frames)
+        self.frames += entry[2]
+
+    def __len__(self):
+        return self.frames + len(self.pending[0])
+
+    def append(self, timestamp, device, frame):
+        """Add one frame (768 values in °C), writes a chunk when chunk_frames are pending"""
+        times, devices, frames = self.pending
+        if len(set(devices)) == MAX_CHUNK_DEVICES and device not in devices:
+            self.flush()
+            times, devices, frames = self.pending
+        times.append(float(timestamp))
+        devices.append(str(device))
+        frames.append(quantize(frame))
+        if len(times) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """Compress and write the pending frames as one chunk"""
+        times, devices, frames = self.pending
+        if not times:
+            return
+        payload = zlib.compress(encode_chunk(times, devices, np.stack(frames)), self.level)
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(payload), len(times), min(times), max(times)) + payload)
+        entry = (offset, CHUNK_HEADER.size + len(payload), len(times), min(times), max(times))
+        with open(self.index_path, 'ab') as f:
+            f.write(INDEX_ENTRY.pack(*entry))
+        self._add_entry(entry)
+        self.pending = ([], [], [])
+
+    def close(self):
+        self.flush()
+
+    def chunk(self, number):
+        """Decoded (times, devices, int16 frames) of one stored chunk"""
+        if self.cache[0] == number:
+            return self.cache[1]
+        offset, length, _, _, _ = self.index[number]
+        with open(self.path, 'rb') as f:
+            f.seek(offset + CHUNK_HEADER.size)
+            decoded = decode_chunk(zlib.decompress(f.read(length - CHUNK_HEADER.size)))
+        self.cache = (number, decoded)
+        return decoded
+
+    def frame(self, i):
+        """(time, device, float32 frame in °C) of frame number i"""
+        if i >= self.frames:
+            self.flush()
+        number = bisect_right(self.starts, i) - 1
+        times, devices, frames = self.chunk(number)
+        j = i - self.starts[number]
+        return float(times[j]), devices[j], frames[j].astype(np.float32) / TEMP_SCALE
+
+    def read(self, start=None, end=None, device=None):
+        """(times, devices, float32 frames in °C) within [start, end), decompressing only overlapping chunks"""
+        self.flush()
+        out_times, out_devices, out_frames = [], [], []
+        for number, (_, _, _, first, last) in enumerate(self.index):
+            if (end is not None and first >= end) or (start is not None and last < start):
+                continue
+            times, devices, frames = self.chunk(number)
+            keep = np.ones(len(times), dtype=bool)
+            if start is not None:
+                keep &= times >= start
+            if end is not None:
+                keep &= times < end
+            if device is not None:
+                keep &= np.array([d == device for d in devices])
+            out_times.append(times[keep])
+            out_devices += [d for d, k in zip(devices, keep) if k]
+            out_frames.append(frames[keep])
+        if not out_times:
+            return np.empty(0), [], np.empty((0, PIXELS), dtype=np.float32)
+        return (np.concatenate(out_times), out_devices,
+                np.concatenate(out_frames).astype(np.float32) / TEMP_SCALE)
+
+    def stats(self):
+        stored = os.path.getsize(self.path)
+        raw = self.frames * PIXELS * 4
+        return {'frames': self.frames, 'chunks': len(self.index), 'bytes': stored,
+                'bytes_per_frame': stored / max(self.frames, 1), 'ratio_vs_float32': raw / max(stored, 1)}
+
+
+class FrameStore:
+    """One FrameArchive per records partition (frames_<key>.tfa next to fire_events_<key>.db)"""
+
+    def __init__(self, store, chunk_frames=256, level=6):
+        self.store = store          # partitions.PartitionedStore
+        self.chunk_frames = chunk_frames
+        self.level = level
+        self.key = None
+        self.archive = None
+
+    def _key(self, timestamp):
+        return self.store.key_for(datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S'))
+
+    def append(self, timestamp, device, frame):
+        key = self._key(timestamp)
+        if key != self.key:
+            self.close()
+            self.key = key
+            self.archive = FrameArchive(self.store.frames_path_for(key), self.chunk_frames, self.level)
+        self.archive.append(timestamp, device, frame)
+
+    def read(self, start, end, device=None):
+        """(times, devices, frames in °C) within [start, end) across partitions"""
+        if self.archive:
+            self.archive.flush()
+        parts = []
+        for key in self.store.frame_keys():
+            first, last = self.store.key_range(key)
+            if first.timestamp() < end and last.timestamp() > start:
+                parts.append(FrameArchive(self.store.frames_path_for(key)).read(start, end, device))
+        if not parts:
+            return np.empty(0), [], np.empty((0, PIXELS), dtype=np.float32)
+        return (np.concatenate([p[0] for p in parts]), [d for p in parts for d in p[1]],
+                np.concatenate([p[2] for p in parts]))
+
+    def close(self):
+        if self.archive:
+            self.archive.close()
+        self.key = self.archive = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack captured MLX90640 CSV frames into a compressed archive')
+    sub = parser.add_subparsers(dest='command', required=True)
+    pack = sub.add_parser('pack', help='CSV (label + 768 pixels per line) -> archive')
+    pack.add_argument('csv')
+    pack.add_argument('archive')
+    pack.add_argument('--device', default='ESP32')
+    pack.add_argument('--interval', type=float, default=0.5, help='Seconds between frames (CSV has no time)')
+    pack.add_argument('--chunk-frames', type=int, default=256)
+    pack.add_argument('--level', type=int, default=6)
+    info = sub.add_parser('info', help='Print archive size and check random access')
+    info.add_argument('archive')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        archive = FrameArchive(args.archive, args.chunk_frames, args.level)
+        t0 = time.perf_counter()
+        count = 0
+        with open(args.csv) as f:
+            for line in f:
+                row = line.strip().split(',')
+                if len(row) != PIXELS + 1 or not row[0].isdigit():
+                    continue
+                archive.append(count * args.interval, args.device, [float(v) for v in row[1:]])
+                count += 1
+        archive.close()
+        print(f"Packed {count} frames in {time.perf_counter() - t0:.2f} s")
+    else:
+        archive = FrameArchive(args.archive)
+    stats = archive.stats()
+    print(f"{stats['frames']} frames in {stats['chunks']} chunks, {stats['bytes'] / 1024:.1f} KB, "
+          f"{stats['bytes_per_frame']:.0f} B/frame ({stats['ratio_vs_float32']:.1f}x smaller than float32)")
+    if stats['frames']:
+        t0 = time.perf_counter()
+        archive.frame(stats['frames'] // 2)
+        print(f"Random access to one frame: {(time.perf_counter() - t0) * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Ingest process: owns the MQTT connection and all storage.
+
+Every received message is recorded (storage policy, partitions, rollups,
+frame archive, local API) here and published into a shared-memory ring of
+fixed-size records (shm_ring.py), which the GUI maps and reads on its own
+timer. A slow, frozen or closed GUI therefore never delays ingestion or
+loses stored data; it can only miss display updates, which it counts.
+
+The GUI sends commands (connect, subscribe, publish, mode, clear, ...) over
+a local multiprocessing connection. Off by default: with separate_process
+set, a GUI that finds no ingest process launches one and stops it again when
+its window closes. Only with background set as well is the process launched
+detached, keeping on recording after the GUI exits and connecting to the
+broker saved in config.json on its own.
+
+Usage:
+    python ingest.py            # run in the foreground
+    python ingest.py --stop     # ask the running ingest process to exit
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from multiprocessing.connection import Listener, Client
+
+from mqtt_connection import MqttConnection, DEFAULT_TOPICS
+from recorder import Recorder
+from shm_ring import SharedRing, KIND_DETECTION, KIND_MESSAGE, KIND_STATUS
+from sampling_profiler import SamplingProfiler, DEFAULT_PROFILER, output_prefix, capture
+import rollups
+
+DEFAULT_INGEST = {'separate_process': False, 'background': False, 'ring': 'fire_ingest_ring', 'capacity': 4096,
+                  'port': 8766, 'authkey': 'fire-ingest'}
+MODE_NAMES = ['Threshold', 'TinyML', 'Integral ', 'ML+Integral']  # comboBox_model items, measurement_mode 1-4
+
+
+def load_config(path='config.json'):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def ingest_settings(config):
+    return dict(DEFAULT_INGEST, **config.get('ingest', {}))
+
+
+def command_client(settings, timeout=None):
+    """Connection to a running ingest process (ConnectionRefusedError when none)"""
+    deadline = time.monotonic() + (timeout or 0)
+    while True:
+        try:
+            return Client(('127.0.0.1', settings['port']), authkey=settings['authkey'].encode())
+        except ConnectionRefusedError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.1)
+
+
+class IngestService:
+    def __init__(self, config):
+        self.config = config
+        self.settings = ingest_settings(config)
+        self.ring = SharedRing.create(self.settings['ring'], self.settings['capacity'])
+        self.recorder = Recorder(config)
+        self.mode = MODE_NAMES[0]
+        self.lock = threading.Lock()   # paho's thread and command threads both reach the recorder and ring
+        self.running = True
+        self.profiler = None
+        self.connection = MqttConnection(on_message=self.on_message, on_status=self.on_status,
+                                         settings=config.get('mqtt'))
+        self.connection.subscriptions.update(DEFAULT_TOPICS)  # One SUBSCRIBE whenever the broker has no session
+        if self.recorder.api_error:
+            self.notice(f"API server not started: {self.recorder.api_error}")
+
+    def notice(self, text, connected=None):
+        with self.lock:
+            self.ring.write(KIND_STATUS, time.time(), topic='notice' if connected is None else 'connection',
+                            connected=bool(connected), payload=text.encode())
+
+    def on_status(self, connected, text):
+        self.notice(text, connected)
+
+    def on_message(self, topic, message):
+        if not message:
+            return
+        current_time = datetime.now()
+        with self.lock:
+            self.ring.write(KIND_MESSAGE, current_time.timestamp(), topic=topic, payload=message.encode())
+            try:
+                if topic == "/ESP32/detection_data":
+                    data = json.loads(message)
+                    stored = self.recorder.record(data, current_time, self.mode)
+                    device = data.get('device', rollups.DEFAULT_DEVICE)
+                    temps = self.recorder.latest_temps.get(device, {})
+                    self.ring.write(KIND_DETECTION, current_time.timestamp(), device=device, mode=self.mode,
+                                    t_min=temps.get('min', float('nan')), t_max=temps.get('max', float('nan')),
+                                    t_center=temps.get('center', float('nan')),
+                                    fire=bool(data.get('fireDetected', 0)), stored=min(stored, 255))
+                elif topic in ("/ESP32/config_update", "/ESP32/config"):
+                    mode_index = int(json.loads(message).get("measurement_mode", 0)) - 1
+                    if 0 <= mode_index < len(MODE_NAMES):
+                        self.mode = MODE_NAMES[mode_index]
+            except Exception as e:
+                self.ring.write(KIND_STATUS, current_time.timestamp(), topic='error',
+                                payload=f"Error processing {topic}: {e}".encode())
+
+    # ---- Commands from the GUI ----
+
+    def handle(self, command, args):
+        if command == 'status':
+            return {'connected': self.connection.is_connected, 'subscriptions': sorted(self.connection.subscriptions),
+                    'mode': self.mode, 'write_seq': self.ring.write_seq, 'queued': self.connection.queued}
+        if command == 'connect':
+            self.connection.connect_to_broker(*args)
+            return True
+        if command == 'disconnect':
+            self.connection.disconnect_from_broker()
+            return True
+        if command == 'subscribe':
+            return self.connection.subscribe_topics(args)
+        if command == 'publish':
+            return self.connection.publish_message(*args)
+        if command == 'mode':
+            self.mode = args[0]
+            return True
+        if command == 'flush':
+            with self.lock:
+                self.recorder.flush_rollups()
+            return True
+        if command == 'clear':
+            with self.lock:
+                self.recorder.clear()
+            return True
+        if command == 'profile_start':
+            if not self.profiler:
+                self.profiler = SamplingProfiler(args[0])
+                self.profiler.start()
+            return True
+        if command == 'profile_stop':
+            if not self.profiler:
+                return ()
+            self.profiler.stop()
+            paths = self.profiler.save(output_prefix(self.config.get('profiler'), 'ingest'))
+            self.profiler = None
+            return paths
+        if command == 'stop':
+            self.running = False
+            return True
+        raise ValueError(f'Unknown command {command}')
+
+    def _serve(self, conn):
+        try:
+            while self.running:
+                command, args = conn.recv()
+                try:
+                    conn.send((True, self.handle(command, args)))
+                except Exception as e:
+                    conn.send((False, str(e)))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def run(self):
+        listener = Listener(('127.0.0.1', self.settings['port']), authkey=self.settings['authkey'].encode())
+        threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+        # Record without a GUI: connect to the broker saved by the GUI
+        if self.config.get('host'):
+            self.connection.connect_to_broker(self.config.get('protocol', 'mqtt://'), self.config['host'],
+                                              self.config.get('port', '1883'),
+                                              self.config.get('client_id', 'PySide6_MQTT_Client') + '_ingest',
+                                              self.config.get('username', ''), self.config.get('password', ''))
+        try:
+            while self.running:
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            self.connection.close()
+            with self.lock:
+                self.recorder.close()
+                self.ring.close()
+
+    def _accept(self, listener):
+        while self.running:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run MQTT ingestion and storage in its own process')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--stop', action='store_true', help='Stop the running ingest process')
+    parser.add_argument('--profile', type=float, nargs='?', const=DEFAULT_PROFILER['duration'], metavar='SECONDS',
+                        help='Profile all threads from start-up for SECONDS')
+    args = parser.parse_args()
+    config = load_config(args.config)
+    if args.stop:
+        conn = command_client(ingest_settings(config))
+        conn.send(('stop', ()))
+        print(conn.recv())
+        conn.close()
+        return
+    service = IngestService(config)
+    if args.profile:
+        profiler_config = dict(DEFAULT_PROFILER, **config.get('profiler', {}))
+        capture(args.profile, output_prefix(profiler_config, 'ingest'), profiler_config['interval_ms'] / 1000,
+                done=lambda paths: service.notice(f"Profile written: {', '.join(paths)}"))
+    service.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
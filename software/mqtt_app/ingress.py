@@ -0,0 +1,131 @@
+"""
+Bounded ingress between the MQTT network thread and the window, without Qt.
+
+Messages used to reach the window as one queued Qt signal each, so a busy
+GUI thread let them pile up without bound and the dashboard showed data
+minutes old. Now the network thread only put()s them here and the window
+drain()s the lot on a short timer.
+
+Each topic has a display policy (the `ingress` section of config.json):
+
+*   latest: only the newest pending message per (topic, device) is shown.
+    An older one still waiting is replaced (counted as coalesced).
+*   all: every message is shown, nothing is replaced or dropped. Used for
+    configuration reports, which carry acknowledgements.
+
+Never dropped, whatever the policy:
+
+*   Fire transitions: a message whose fireDetected differs from the
+    previous one of the same device is pinned and shown, so an alarm (or
+    its end) is never coalesced away.
+*   Storage: messages on a store topic (detection data when the window
+    records in-process) that lose their display slot are still delivered,
+    marked for storage only, with their receive time.
+
+At most max_pending devices and topics wait for display under the
+latest policy. Beyond that, the oldest waiting display update is dropped
+(counted as dropped). Pinned, `all` and storage deliveries are not
+bounded, because they must not be lost.
+"""
+import json
+import time
+import threading
+from collections import deque
+
+DEFAULT_INGRESS = {'interval_ms': 50, 'max_pending': 256, 'default_policy': 'latest',
+                   'policies': {'/ESP32/config_update': 'all', '/ESP32/config_response': 'all'}}
+POLICIES = ('latest', 'all')
+
+
+def _fields(payload):
+    """The payload as a dict when it is a JSON object (device, fireDetected), else empty"""
+    if isinstance(payload, dict):
+        return payload
+    if isinstance(payload, str) and payload.startswith('{'):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    return {}
+
+
+class Ingress:
+    def __init__(self, policies=None, default_policy='latest', max_pending=256, store_topics=()):
+        for policy in [default_policy, *(policies or {}).values()]:
+            if policy not in POLICIES:
+                raise ValueError(f"Unknown ingress policy '{policy}', expected one of {', '.join(POLICIES)}")
+        self.policies = dict(policies or {})
+        self.default_policy = default_policy
+        self.max_pending = max_pending
+        self.store_topics = set(store_topics)
+        self.lock = threading.Lock()  # put() runs on the network thread, drain() on the GUI thread
+        self.entries = deque()        # [topic, payload, received, display, store] in arrival order
+        self.latest = {}              # (topic, device) -> its entry waiting for display, oldest first
+        self.fire = {}                # (topic, device) -> last fireDetected
+        self.counters = {'received': 0, 'delivered': 0, 'coalesced': 0, 'dropped': 0, 'transitions': 0,
+                         'store_only': 0, 'backlog': 0, 'latency': 0.0, 'max_latency': 0.0}
+
+    @classmethod
+    def from_config(cls, config=None, store_topics=()):
+        config = dict(DEFAULT_INGRESS, **(config or {}))
+        return cls(config['policies'], config['default_policy'], config['max_pending'], store_topics)
+
+    def put(self, topic, payload, received=None):
+        """Called for every message, from any thread"""
+        received = time.time() if received is None else received
+        fields = _fields(payload)
+        key = (topic, fields.get('device'))
+        store = topic in self.store_topics
+        with self.lock:
+            self.counters['received'] += 1
+            pinned = False
+            if 'fireDetected' in fields:
+                fire = bool(fields['fireDetected'])
+                pinned = fire != self.fire.get(key, False)
+                if pinned and key in self.fire:
+                    self.counters['transitions'] += 1
+                self.fire[key] = fire
+            entry = [topic, payload, received, True, store]
+            if self.policies.get(topic, self.default_policy) == 'latest':
+                previous = self.latest.pop(key, None)
+                if previous is not None:
+                    self._supersede(previous)
+                    self.counters['coalesced'] += 1
+                    if isinstance(payload, dict) and isinstance(previous[1], dict) and 'stored' in payload:
+                        # Rows stored for the replaced update still have to reach the record table
+                        entry[1] = dict(payload, stored=payload['stored'] + previous[1].get('stored', 0))
+                if not pinned:
+                    self.latest[key] = entry
+                    if len(self.latest) > self.max_pending:
+                        self._supersede(self.latest.pop(next(iter(self.latest))))
+                        self.counters['dropped'] += 1
+            self.entries.append(entry)
+
+    @staticmethod
+    def _supersede(entry):
+        entry[3] = False  # Kept for storage when entry[4] is set, skipped otherwise
+
+    def drain(self):
+        """Everything pending as (topic, payload, received, display) in arrival order; display=False is storage only"""
+        with self.lock:
+            entries, self.entries = self.entries, deque()
+            self.latest.clear()
+        now = time.time()
+        delivered = [(topic, payload, received, display) for topic, payload, received, display, store in entries
+                     if display or store]
+        shown = [received for _, _, received, display in delivered if display]
+        counters = self.counters
+        counters['backlog'] = len(entries)
+        counters['delivered'] += len(shown)
+        counters['store_only'] += len(delivered) - len(shown)
+        if shown:
+            counters['latency'] = now - min(shown)
+            counters['max_latency'] = max(counters['max_latency'], counters['latency'])
+        return delivered
+
+    def summary(self):
+        """Short status text for the memory panel"""
+        c = self.counters
+        return (f"Display lag {c['latency'] * 1000:.0f} ms (max {c['max_latency'] * 1000:.0f})  |  "
+                f"Coalesced {c['coalesced']}  |  Dropped {c['dropped']}  |  Fire transitions {c['transitions']}")
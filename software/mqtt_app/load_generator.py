@@ -0,0 +1,299 @@
+"""
+Synthetic ESP32 fleet: N virtual devices publishing detection data like the firmware.
+
+Each device has its own ambient temperature drifting slowly and fire
+episodes that heat a hot spot up and cool it down again. It decides
+fireDetected with the firmware's four measurement modes and thresholds:
+
+    1 Threshold     tMax >= threshold_1
+    2 TinyML        score >= threshold_2
+    3 Integral      6 of the last 10 frames with tMax >= threshold_3
+    4 ML+Integral   share of the last 10 frames with score >= threshold_4 reaches threshold_5 %
+
+The score stands in for the on-device model: a logistic function of the
+hot spot's heat above ambient. Devices subscribe to /ESP32/config,
+apply the fields within the firmware's ranges and confirm on
+/ESP32/config_response with the firmware's message.
+
+Messages go out at an aggregate rate, spread over the devices with random
+jitter. Optional bursts multiply the rate for a few seconds. Unless --plain,
+payloads carry "device" and "seq" and config responses carry "device".
+With --frames, payloads also carry the 32x24 frame. Every send is logged
+as device,seq,topic,sent,bytes to the --log CSV. The latency command joins
+that log with a receive log (device,seq,received) and prints percentiles;
+--receive-log records one at the broker with its own subscriber.
+
+Usage:
+    python load_generator.py --devices 50 --rate 100 --duration 600 --local-broker --log sends.csv
+    python load_generator.py --broker 192.168.1.10 --devices 8 --rate 8 --burst-every 60 --burst-factor 10
+    python load_generator.py latency sends.csv receives.csv
+"""
+import sys
+import csv
+import json
+import math
+import time
+import heapq
+import random
+import argparse
+import threading
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+from mini_broker import MiniBroker
+
+FRAME_WIDTH, FRAME_HEIGHT = 32, 24
+# sysConfig defaults and accepted ranges of the firmware (main.cpp)
+FIRMWARE_CONFIG = {'measurement_mode': 1, 'threshold_1': 45.0, 'threshold_2': 0.7, 'threshold_3': 45.0,
+                   'threshold_4': 0.7, 'threshold_5': 70.0}
+CONFIG_RANGES = {'measurement_mode': (1, 4), 'threshold_1': (0, 150), 'threshold_2': (0, 1.0),
+                 'threshold_3': (0, 100), 'threshold_4': (0, 1.0), 'threshold_5': (0, 100)}
+WINDOW, WINDOW_FIRE = 10, 6
+
+
+class VirtualDevice:
+    def __init__(self, device_id, rng, frames=False):
+        self.device_id = device_id
+        self.rng = rng
+        self.frames = frames
+        self.config = dict(FIRMWARE_CONFIG)
+        self.seq = 0
+        self.ambient = rng.uniform(18, 30)
+        self.heat = 0.0           # Hot spot excess over ambient, degrees
+        self.fire_left = 0.0      # Seconds of active fire episode remaining
+        self.window = deque([False] * WINDOW, maxlen=WINDOW)
+        self.hot_x, self.hot_y = rng.randrange(FRAME_WIDTH), rng.randrange(FRAME_HEIGHT)
+
+    def apply_config(self, config):
+        """Apply /ESP32/config fields like onMQTTMessage, returns the /ESP32/config_response payload"""
+        for key, (low, high) in CONFIG_RANGES.items():
+            if key in config:
+                value = int(config[key]) if key == 'measurement_mode' else float(config[key])
+                if low <= value <= high:
+                    self.config[key] = value
+        c = self.config
+        return (f'{{"status":"ok","mode":{c["measurement_mode"]},"th1":{c["threshold_1"]:.1f},'
+                f'"th2":{c["threshold_2"]:.2f},"th3":{c["threshold_3"]:.1f},"th4":{c["threshold_4"]:.2f},'
+                f'"th5":{c["threshold_5"]:.1f}}}')
+
+    def step(self, dt, fire_rate):
+        """Advance dt seconds; returns the detection payload dict"""
+        rng = self.rng
+        self.ambient += rng.gauss(0, 0.02 * math.sqrt(dt)) + (24 - self.ambient) * 0.0005 * dt
+        if self.fire_left <= 0 and rng.random() < fire_rate * dt:
+            self.fire_left = rng.uniform(20, 180)
+            self.hot_x, self.hot_y = rng.randrange(FRAME_WIDTH), rng.randrange(FRAME_HEIGHT)
+        if self.fire_left > 0:
+            self.fire_left -= dt
+            self.heat += (rng.uniform(60, 250) - self.heat) * min(1.0, 0.15 * dt)   # Flames flicker
+        else:
+            self.heat *= math.exp(-0.08 * dt)                                      # Cooling
+        t_min = self.ambient - 3 + rng.gauss(0, 0.2)
+        t_max = self.ambient + 2 + self.heat + rng.gauss(0, 0.3)
+        distance = math.hypot(self.hot_x - FRAME_WIDTH / 2, self.hot_y - FRAME_HEIGHT / 2)
+        t_center = self.ambient + self.heat * math.exp(-distance / 4) + rng.gauss(0, 0.2)
+        score = 1 / (1 + math.exp(-(self.heat - 25) / 6))
+
+        c = self.config
+        mode = c['measurement_mode']
+        if mode == 1:
+            fire = t_max >= c['threshold_1']
+        elif mode == 2:
+            fire = score >= c['threshold_2']
+        elif mode == 3:
+            self.window.append(t_max >= c['threshold_3'])
+            fire = sum(self.window) >= WINDOW_FIRE
+        else:
+            self.window.append(score >= c['threshold_4'])
+            fire = sum(self.window) / WINDOW * 100 >= c['threshold_5']
+
+        self.seq += 1
+        payload = {'tMin': round(t_min, 1), 'tMax': round(t_max, 1), 'tCenter': round(t_center, 1),
+                   'fireDetected': int(fire)}
+        if self.frames:
+            payload['frame'] = self.frame()
+        return payload
+
+    def frame(self):
+        """32x24 row-major frame: ambient with sensor noise and a Gaussian hot spot"""
+        rng = self.rng
+        return [round(self.ambient + rng.gauss(0, 0.4)
+                      + self.heat * math.exp(-((x - self.hot_x) ** 2 + (y - self.hot_y) ** 2) / 8), 2)
+                for y in range(FRAME_HEIGHT) for x in range(FRAME_WIDTH)]
+
+
+class FleetGenerator:
+    def __init__(self, client, devices, rate, jitter=0.2, burst_every=0.0, burst_factor=1.0, burst_seconds=5.0,
+                 fire_interval=1800.0, plain=False, log=None, seed=None):
+        self.client = client
+        self.devices = devices
+        self.rate = rate                    # Aggregate messages per second outside bursts
+        self.jitter = jitter                # Relative random spread of each device's interval
+        self.burst_every = burst_every      # Mean seconds between bursts, 0 disables them
+        self.burst_factor = burst_factor
+        self.burst_seconds = burst_seconds
+        self.fire_rate = 1 / fire_interval  # Fire episodes per second per device
+        self.plain = plain                  # Exactly the firmware's payload (no device, seq)
+        self.log = log
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()        # Config messages arrive on paho's thread
+        self.burst_until = 0.0
+        self.next_burst = None
+        self.sent = 0
+
+    def on_config(self, payload):
+        """/ESP32/config is a broadcast: every device applies it and confirms"""
+        try:
+            config = json.loads(payload)
+        except json.JSONDecodeError:
+            return
+        with self.lock:
+            responses = [device.apply_config(config) if self.plain
+                         else device.apply_config(config)[:-1] + f',"device":"{device.device_id}"}}'
+                         for device in self.devices]
+        for response in responses:
+            self.client.publish('/ESP32/config_response', response)
+
+    def current_rate(self, now):
+        if not self.burst_every:
+            return self.rate
+        if self.next_burst is None:
+            self.next_burst = now + self.rng.expovariate(1 / self.burst_every)
+        if now >= self.next_burst:
+            self.burst_until = now + self.burst_seconds
+            self.next_burst = now + self.rng.expovariate(1 / self.burst_every)
+        return self.rate * (self.burst_factor if now < self.burst_until else 1)
+
+    def run(self, duration):
+        start = time.time()
+        per_device = len(self.devices) / self.rate
+        # Devices start spread over one interval, like a fleet powered up at different times
+        queue = [(start + self.rng.uniform(0, per_device), i, start) for i in range(len(self.devices))]
+        heapq.heapify(queue)
+        while queue:
+            due, index, last = heapq.heappop(queue)
+            if due - start > duration:
+                break
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            device = self.devices[index]
+            with self.lock:
+                payload = device.step(max(due - last, 1e-3), self.fire_rate)
+            if not self.plain:
+                payload = dict(payload, device=device.device_id, seq=device.seq)
+            message = json.dumps(payload, separators=(',', ':'))
+            sent = time.time()
+            self.client.publish('/ESP32/detection_data', message)
+            self.sent += 1
+            if self.log:
+                self.log.writerow((device.device_id, device.seq, '/ESP32/detection_data', f'{sent:.6f}',
+                                   len(message)))
+            interval = len(self.devices) / self.current_rate(due)
+            next_due = due + interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+            heapq.heappush(queue, (next_due, index, due))
+        return time.time() - start
+
+
+def latency_report(send_log, receive_log):
+    """Join device,seq of both logs and print receive - send percentiles in milliseconds"""
+    with open(send_log, newline='') as f:
+        sent = {(row['device'], row['seq']): float(row['sent']) for row in csv.DictReader(f)}
+    with open(receive_log, newline='') as f:
+        delays = sorted((float(row['received']) - sent[(row['device'], row['seq'])]) * 1000
+                        for row in csv.DictReader(f) if (row['device'], row['seq']) in sent)
+    if not delays:
+        print('No matching messages')
+        return
+    pick = lambda q: delays[min(len(delays) - 1, int(q * len(delays)))]
+    print(f'{len(delays)} of {len(sent)} messages matched ({len(sent) - len(delays)} lost or not logged)')
+    print(f'p50 {pick(0.5):.2f} ms  p90 {pick(0.9):.2f} ms  p99 {pick(0.99):.2f} ms  max {delays[-1]:.2f} ms')
+
+
+def receive_logger(host, port, path):
+    """Subscriber logging device,seq,received of every detection message (stopped by disconnecting it)"""
+    f = open(path, 'w', newline='')
+    writer = csv.writer(f)
+    writer.writerow(('device', 'seq', 'received'))
+
+    def on_message(client, userdata, msg):
+        received = time.time()
+        data = json.loads(msg.payload)
+        writer.writerow((data.get('device'), data.get('seq'), f'{received:.6f}'))
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id='load_generator_receiver')
+    client.on_connect = lambda c, u, flags, rc, props: c.subscribe('/ESP32/detection_data')
+    client.on_message = on_message
+    client.on_disconnect = lambda *args: f.close()
+    client.connect(host, port, 60)
+    client.loop_start()
+    return client
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'latency':
+        parser = argparse.ArgumentParser(prog='load_generator.py latency')
+        parser.add_argument('send_log')
+        parser.add_argument('receive_log')
+        args = parser.parse_args(sys.argv[2:])
+        latency_report(args.send_log, args.receive_log)
+        return
+    parser = argparse.ArgumentParser(description='Simulate a fleet of ESP32 fire detectors')
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=10.0, help='Aggregate messages per second')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds to run')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Relative spread of send intervals (0-1)')
+    parser.add_argument('--burst-every', type=float, default=0.0, help='Mean seconds between bursts (0: none)')
+    parser.add_argument('--burst-factor', type=float, default=5.0, help='Rate multiplier during a burst')
+    parser.add_argument('--burst-seconds', type=float, default=5.0)
+    parser.add_argument('--fire-interval', type=float, default=1800.0,
+                        help='Mean seconds between fire episodes per device')
+    parser.add_argument('--frames', action='store_true', help='Include the 768-pixel frame')
+    parser.add_argument('--plain', action='store_true', help='Firmware payload only (no device and seq)')
+    parser.add_argument('--broker', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--local-broker', action='store_true', help='Start the stand-in broker (mini_broker.py)')
+    parser.add_argument('--log', help='CSV of every send: device,seq,topic,sent,bytes')
+    parser.add_argument('--receive-log', help='CSV of every delivery seen by a subscriber at the broker')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    broker = MiniBroker(args.broker, args.port).start() if args.local_broker else None
+    rng = random.Random(args.seed)
+    devices = [VirtualDevice(f'esp32-{i:04d}', random.Random(rng.random()), args.frames) for i in range(args.devices)]
+    log_file = open(args.log, 'w', newline='') if args.log else None
+    log = csv.writer(log_file) if log_file else None
+    if log:
+        log.writerow(('device', 'seq', 'topic', 'sent', 'bytes'))
+
+    receiver = receive_logger(args.broker, args.port, args.receive_log) if args.receive_log else None
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id='load_generator')
+    generator = FleetGenerator(client, devices, args.rate, args.jitter, args.burst_every, args.burst_factor,
+                               args.burst_seconds, args.fire_interval, args.plain, log, args.seed)
+    client.on_connect = lambda c, u, flags, rc, props: c.subscribe('/ESP32/config')
+    client.on_message = lambda c, u, msg: generator.on_config(msg.payload)
+    client.connect(args.broker, args.port, 60)
+    client.loop_start()
+    try:
+        elapsed = generator.run(args.duration)
+    except KeyboardInterrupt:
+        elapsed = None
+    time.sleep(0.5)   # Let the last messages reach the receiver
+    client.disconnect()
+    client.loop_stop()
+    if receiver:
+        receiver.disconnect()
+        receiver.loop_stop()
+    if log_file:
+        log_file.close()
+    if broker:
+        broker.stop()
+    if elapsed:
+        print(f'{generator.sent} messages from {len(devices)} devices in {elapsed:.1f} s '
+              f'({generator.sent / elapsed:.1f}/s)')
+    if args.log and args.receive_log:
+        latency_report(args.log, args.receive_log)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,18 +3,39 @@ import json
 from datetime import datetime
 from collections import deque
 import csv
-from PySide6.QtWidgets import QApplication, QWidget, QMessageBox, QListWidgetItem, QVBoxLayout, QTableView, QHeaderView, QPushButton, QHBoxLayout, QSizePolicy, QFileDialog
-from PySide6.QtCore import QThread, Signal, QTimer, QStringListModel, Qt
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QPainter, QBrush, QColor, QPalette, QIcon
-import paho.mqtt.client as mqtt
-import sqlite3
+from PySide6.QtWidgets import QApplication, QWidget, QMessageBox, QListWidgetItem, QVBoxLayout, QTableView, QHeaderView, QPushButton, QHBoxLayout, QSizePolicy, QFileDialog, QComboBox, QLabel
+from PySide6.QtCore import QObject, Signal, QTimer, QStringListModel, Qt
+from PySide6.QtGui import QStandardItemModel, QStandardItem, QPainter, QBrush, QColor, QPalette, QIcon, QAction, QKeySequence
+import os
+import subprocess
+import argparse
 from ui.Ui_Main import Ui_Form
+from storage_policy import TIME_FORMAT
+from mqtt_connection import MqttConnection, DEFAULT_TOPICS
+from recorder import DatabaseManager, Recorder
+from shm_ring import SharedRing, KIND_DETECTION, KIND_MESSAGE, KIND_STATUS
+from ingest import ingest_settings, command_client
+from memory_stats import MemoryMonitor, format_bytes
+from sampling_profiler import SamplingProfiler, DEFAULT_PROFILER, output_prefix
+from config_sync import ConfigSync, parse_report
+from ingress import Ingress, DEFAULT_INGRESS
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import matplotlib.dates as mdates
 from matplotlib.animation import FuncAnimation
 
+# Summary export: range label -> (span, bucket step) in seconds
+SUMMARY_RANGES = {
+    "Last Hour": (3600, 60),
+    "Last Day": (86400, 900),
+    "Last Week": (7 * 86400, 3600),
+    "Last 30 Days": (30 * 86400, 86400),
+}
+
+# Ingress topic of the decoded detection updates from the ingest process
+DETECTION = "detection"
+
 class TemperatureChart(FigureCanvas):
     def __init__(self, title, parent=None):
         self.fig = Figure(figsize=(8, 6), dpi=100)
@@ -135,133 +156,215 @@ class TemperatureChart(FigureCanvas):
         
         self.draw()
 
-class DatabaseManager:
-    def __init__(self, db_name='fire_records.db'):
-        self.db_name = db_name
-        self.conn = None
-        self.cursor = None
-
-    def connect(self):
-        self.conn = sqlite3.connect(self.db_name)
-        self.cursor = self.conn.cursor()
-
+class MQTTClient(QObject):
+    """MQTT connection in the GUI process; signals are delivered on the GUI thread"""
+    # Signal definitions
+    message_received = Signal(str, str, float)  # topic, message, receive time
+    message_stored = Signal(str, str, float)  # topic, message, receive time: storage only, display coalesced
+    connection_status = Signal(bool, str)  # connected, message
+    
+    def __init__(self, settings=None, ingress=None):
+        super().__init__()
+        # Messages wait in the bounded ingress until the GUI thread drains them
+        self.ingress = Ingress.from_config(ingress, store_topics=["/ESP32/detection_data"])
+        self.connection = MqttConnection(on_message=self.ingress.put,
+                                         on_status=self.connection_status.emit, settings=settings)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.drain)
+        self.timer.start(int(dict(DEFAULT_INGRESS, **(ingress or {}))['interval_ms']))
+    
+    def drain(self):
+        for topic, message, received, display in self.ingress.drain():
+            if display:
+                self.message_received.emit(topic, message, received)
+            else:
+                self.message_stored.emit(topic, message, received)
+    
+    @property
+    def is_connected(self):
+        return self.connection.is_connected
+    
+    def connect_to_broker(self, protocol, host, port, client_id, username, password):
+        self.connection.connect_to_broker(protocol, host, port, client_id, username, password)
+    
+    def subscribe_topic(self, topic):
+        return self.connection.subscribe_topic(topic)
+    
+    def subscribe_topics(self, topics):
+        return self.connection.subscribe_topics(topics)
+    
+    def publish_message(self, topic, message, queue=False):
+        return self.connection.publish_message(topic, message, queue=queue)
+    
+    def disconnect_from_broker(self):
+        self.connection.disconnect_from_broker()
+    
     def close(self):
-        if self.conn:
-            self.conn.close()
-
-    def create_table(self):
-        self.connect()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS fire_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                min_temp REAL NOT NULL,
-                max_temp REAL NOT NULL,
-                center_temp REAL NOT NULL,
-                fire_detected BOOLEAN NOT NULL,
-                mode TEXT NOT NULL
-            )
-        ''')
-        self.conn.commit()
-        self.close()
-
-    def log_fire_event(self, timestamp, min_temp, max_temp, center_temp, fire_detected, mode):
-        self.connect()
-        self.cursor.execute('''
-            INSERT INTO fire_events (timestamp, min_temp, max_temp, center_temp, fire_detected, mode)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (timestamp, min_temp, max_temp, center_temp, fire_detected, mode))
-        self.conn.commit()
-        self.close()
-
-    def get_all_fire_events(self, fire_detected_filter=None):
-        self.connect()
-        query = 'SELECT id, timestamp, min_temp, max_temp, center_temp, fire_detected, mode FROM fire_events'
-        params = []
-        if fire_detected_filter is not None:
-            query += ' WHERE fire_detected = ?'
-            params.append(fire_detected_filter)
-        query += ' ORDER BY id'
-        self.cursor.execute(query, params)
-        records = self.cursor.fetchall()
-        self.close()
-        return records
+        self.timer.stop()
+        self.connection.close()
 
-class MQTTClient(QThread):
-    # Signal definitions
-    message_received = Signal(str, str)  # topic, message
+class IngestClient(QObject):
+    """Same interface as MQTTClient, backed by the ingest process and its shared-memory ring"""
+    message_received = Signal(str, str, float)  # topic, message, receive time
     connection_status = Signal(bool, str)  # connected, message
+    detection_received = Signal(object)  # dict with time, tMin, tMax, tCenter, fireDetected, stored, device, mode
+    notice = Signal(str)
     
-    def __init__(self):
+    def __init__(self, settings, interval=50, ingress=None):
         super().__init__()
-        self.client = None
+        self.settings = settings
+        self.ingress = Ingress.from_config(ingress)  # Display only, the ingest process has stored everything
+        self.conn = None
+        self.ring = None
+        self.cursor = None
         self.is_connected = False
-        self.subscriptions = set()
-        
-    def connect_to_broker(self, protocol, host, port, client_id, username, password):
-        try:
-            # 创建MQTT客户端
-            if protocol in ['ws://', 'wss://']:
-                self.client = mqtt.Client(client_id=client_id, transport="websockets")
+        self.missed = 0  # Display updates lapped by the writer while the GUI was busy; storage is unaffected
+        self.spawned = False  # This window launched the ingest process (and stops it unless it runs in background)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.interval = interval
+    
+    def start(self):
+        """Reach (or launch) the ingest process, report its state and start reading the ring"""
+        if self._attach():
+            if not self.spawned:
+                self.notice.emit("Using the recorder process already running (ingest.py); it keeps recording "
+                                 "after this window closes, stop it with: python ingest.py --stop")
+            elif self.settings['background']:
+                self.notice.emit("Started a background recorder (ingest.py); it keeps recording after this window "
+                                 "closes, stop it with: python ingest.py --stop")
             else:
-                self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
-            
-            # 设置用户名和密码
-            if username and password:
-                self.client.username_pw_set(username, password)
-            
-            # 设置回调函数
-            self.client.on_connect = self.on_connect
-            self.client.on_disconnect = self.on_disconnect
-            self.client.on_message = self.on_message
-            
-            # 连接到代理
-            if protocol in ['mqtts://', 'wss://']:
-                self.client.tls_set()
-            
-            self.client.connect(host, int(port), 60)
-            self.client.loop_start()
-            
-        except Exception as e:
-            self.connection_status.emit(False, f"Connection failed: {str(e)}")
-    
-    def on_connect(self, client, userdata, flags, reason_code, properties):
-        if reason_code == 0:
-            self.is_connected = True
-            self.connection_status.emit(True, "Connected successfully")
-            # Re-subscribe to all topics
-            for topic in self.subscriptions:
-                self.subscribe_topic(topic)
-        else:
+                self.notice.emit("Started the recorder process (ingest.py); it stops when this window closes")
+            status = self._call('status')
+            if status and status['connected']:
+                self.is_connected = True
+                self.connection_status.emit(True, "Connected (ingest process)")
+        self.timer.start(self.interval)
+    
+    @property
+    def keeps_running(self):
+        """The ingest process goes on recording after this window closes"""
+        return self.conn is not None and (not self.spawned or self.settings['background'])
+    
+    def _attach(self):
+        try:
+            self.conn = command_client(self.settings)
+        except ConnectionRefusedError:
+            # Detached only when it should keep recording after the GUI exits
+            subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ingest.py')],
+                             start_new_session=self.settings['background'], stdin=subprocess.DEVNULL,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.spawned = True
+            try:
+                self.conn = command_client(self.settings, timeout=10)
+            except ConnectionRefusedError:
+                self.notice.emit("Ingest process did not start")
+                return False
+        self.ring = SharedRing.attach(self.settings['ring'])
+        self.cursor = None
+        return True
+    
+    def _call(self, command, *args):
+        if self.conn is None and not self._attach():
+            return None
+        try:
+            self.conn.send((command, args))
+            ok, result = self.conn.recv()
+        except (EOFError, OSError):
+            self._detach()
+            self.notice.emit("Ingest process stopped")
+            return None
+        if not ok:
+            self.notice.emit(f"Ingest command {command} failed: {result}")
+            return None
+        return result
+    
+    def _detach(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+        if self.is_connected:
             self.is_connected = False
-            self.connection_status.emit(False, f"Connection failed, error code: {reason_code}")
+            self.connection_status.emit(False, "Connection disconnected")
     
-    def on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
-        self.is_connected = False
-        self.connection_status.emit(False, "Connection disconnected")
+    def poll(self):
+        """Dispatch records written since the last poll"""
+        if self.ring is None:
+            return
+        views, self.cursor, lost = self.ring.read(self.cursor)
+        if lost:
+            self.missed += lost
+            self.notice.emit(f"{lost} live updates skipped while the window was busy (all data was stored)")
+        for view in views:
+            for record in view:
+                kind = record['kind']
+                if kind == KIND_MESSAGE:
+                    payload = record['payload'].decode(errors='replace')
+                    if record['truncated']:
+                        payload += f" ... ({record['payload_len']} bytes)"
+                    self.ingress.put(record['topic'].decode(), payload, float(record['time']))
+                elif kind == KIND_DETECTION:
+                    self.ingress.put(DETECTION, {
+                        'time': float(record['time']), 'tMin': float(record['t_min']), 'tMax': float(record['t_max']),
+                        'tCenter': float(record['t_center']), 'fireDetected': bool(record['fire']),
+                        'stored': int(record['stored']), 'device': record['device'].decode(),
+                        'mode': record['mode'].decode()}, float(record['time']))
+                elif kind == KIND_STATUS:
+                    text = record['payload'].decode(errors='replace')
+                    if record['topic'] == b'connection':
+                        self.is_connected = bool(record['connected'])
+                        self.connection_status.emit(self.is_connected, text)
+                    else:
+                        self.notice.emit(text)
+        # Only the newest update per device and topic is shown, plus every fire transition
+        for topic, payload, received, display in self.ingress.drain():
+            if topic == DETECTION:
+                self.detection_received.emit(payload)
+            else:
+                self.message_received.emit(topic, payload, received)
     
-    def on_message(self, client, userdata, msg):
-        topic = msg.topic
-        message = msg.payload.decode('utf-8')
-        self.message_received.emit(topic, message)
+    def connect_to_broker(self, protocol, host, port, client_id, username, password):
+        self._call('connect', protocol, host, port, client_id, username, password)
     
     def subscribe_topic(self, topic):
-        if self.client and self.is_connected:
-            self.client.subscribe(topic)
-            self.subscriptions.add(topic)
-            return True
-        return False
+        return bool(self._call('subscribe', topic))
     
-    def publish_message(self, topic, message):
-        if self.client and self.is_connected:
-            self.client.publish(topic, message)
-            return True
-        return False
+    def subscribe_topics(self, topics):
+        return bool(self._call('subscribe', *topics))
+    
+    def publish_message(self, topic, message, queue=False):
+        return bool(self._call('publish', topic, message, 0, queue))
     
     def disconnect_from_broker(self):
-        if self.client:
-            self.client.loop_stop()
-            self.client.disconnect()
+        self._call('disconnect')
+    
+    def set_mode(self, mode):
+        """Detection mode the ingest process stores with new rows"""
+        self._call('mode', mode)
+    
+    def flush_rollups(self):
+        self._call('flush')
+    
+    def clear(self):
+        self._call('clear')
+    
+    def profile_start(self, interval):
+        self._call('profile_start', interval)
+    
+    def profile_stop(self):
+        """Stop profiling the ingest process, returns the paths it wrote"""
+        return self._call('profile_stop') or ()
+    
+    def close(self):
+        """Stop reading; stop the ingest process too when this window launched it and it is not in background"""
+        self.timer.stop()
+        if self.conn is not None and not self.keeps_running:
+            self._call('stop')
+        self.is_connected = False
+        self._detach()
 
 class MQTTDemo(QWidget):
     def __init__(self):
@@ -272,11 +375,24 @@ class MQTTDemo(QWidget):
         # Set window icon
         self.setWindowIcon(QIcon("ui/Logo.png"))
         
-        # MQTT client
-        self.mqtt_client = MQTTClient()
+        # MQTT client: in the ingest process by default, so storage never waits on the GUI
+        config = self.load_config()
+        settings = ingest_settings(config)
+        if settings['separate_process']:
+            self.recorder = None
+            self.mqtt_client = IngestClient(settings, ingress=config.get('ingress'))
+            self.mqtt_client.detection_received.connect(self.show_detection)
+            self.mqtt_client.notice.connect(lambda text: self.append_received_message("Ingest", text, "orange"))
+        else:
+            self.recorder = Recorder(config)
+            self.mqtt_client = MQTTClient(config.get('mqtt'), config.get('ingress'))
+            self.mqtt_client.message_stored.connect(self.store_detection)
         self.mqtt_client.message_received.connect(self.on_message_received)
         self.mqtt_client.connection_status.connect(self.on_connection_status_changed)
         
+        # Device configuration: debounced, versioned diffs with per-device acknowledgements
+        self.config_sync = ConfigSync.from_config(self.publish_config, config.get('config_sync'))
+        
         # Subscription list model
         self.subscription_model = QStandardItemModel()
         self.ui.listView_Subscription.setModel(self.subscription_model)
@@ -297,20 +413,40 @@ class MQTTDemo(QWidget):
         # Set status indicator
         self.setup_state_widget()
         
-        # Set database
-        self.db_manager = DatabaseManager()
-        self.db_manager.create_table()
+        # Set database (read-only here when the ingest process stores)
+        if self.recorder:
+            self.db_manager = self.recorder.db_manager
+            if self.recorder.api_error:
+                self.append_received_message("System", f"API server not started: {self.recorder.api_error}", "red")
+        else:
+            self.db_manager = DatabaseManager(database_config=config.get('database'))
         self.setup_record_table()
         self.load_fire_records()
 
         # Set temperature charts
         self.setup_temperature_charts()
         
+        # Memory panel under the record table
+        self.setup_memory_panel()
+        
+        # Start reading the ingest ring once the display is ready
+        if not self.recorder:
+            self.mqtt_client.start()
+            self.mqtt_client.set_mode(self.ui.comboBox_model.currentText())
+            if self.mqtt_client.keeps_running:
+                self.setWindowTitle("Fire Detection (background recorder running)")
+        
         # Auto subscribe to default topics
         self.auto_subscribe_default_topics()
         
         # Monitor system theme changes (optional)
         self.setup_theme_monitoring()
+        
+        # Sampling profiler (right-click menu or Ctrl+Shift+P)
+        self.setup_profiler_action()
+        
+        # Fleet push button and configuration sync status
+        self.setup_config_sync()
     
     def setup_connections(self):
         # Connect button
@@ -336,6 +472,13 @@ class MQTTDemo(QWidget):
         self.ui.doubleSpinBox_4.valueChanged.connect(self.on_config_changed)
         self.ui.doubleSpinBox_5.valueChanged.connect(self.on_config_changed)
     
+    def load_config(self):
+        try:
+            with open('config.json', 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
     def load_connection_settings(self):
         try:
             with open('config.json', 'r') as f:
@@ -349,13 +492,16 @@ class MQTTDemo(QWidget):
             self.setup_default_values()
 
     def save_connection_settings(self):
-        config = {
+        # Keep other sections (e.g. storage policy) untouched
+        config = self.load_config()
+        config.update({
+            'protocol': self.ui.comboBox_Protocol.currentText(),
             'host': self.ui.lineEdit_Address.text(),
             'port': self.ui.lineEdit_2.text(),
             'client_id': self.ui.lineEdit_6.text(),
             'username': self.ui.lineEdit_UserName.text(),
             'password': self.ui.lineEdit_5.text(),
-        }
+        })
         with open('config.json', 'w') as f:
             json.dump(config, f, indent=4)
 
@@ -431,8 +577,8 @@ class MQTTDemo(QWidget):
         self.ui.widget_state.paintEvent = self.paint_state_indicator
     
     def setup_record_table(self):
-        self.record_model = QStandardItemModel(0, 7)
-        self.record_model.setHorizontalHeaderLabels(['ID', 'Timestamp', 'Min Temp', 'Max Temp', 'Center Temp', 'Fire Detected', 'Mode'])
+        self.record_model = QStandardItemModel(0, 8)
+        self.record_model.setHorizontalHeaderLabels(['ID', 'Timestamp', 'Min Temp', 'Max Temp', 'Center Temp', 'Fire Detected', 'Mode', 'Device'])
         self.ui.tableView.setModel(self.record_model)
         self.ui.tableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.ui.tableView.verticalHeader().setVisible(False)
@@ -443,7 +589,12 @@ class MQTTDemo(QWidget):
         self.filter_fire_button = QPushButton("Filter Fire Events")
         self.show_all_button = QPushButton("Show All")
         self.export_button = QPushButton("Export to CSV")
+        self.summary_range = QComboBox()
+        self.summary_range.addItems(list(SUMMARY_RANGES))
+        self.export_summary_button = QPushButton("Export Summary")
 
+        button_layout.addWidget(self.summary_range)
+        button_layout.addWidget(self.export_summary_button)
         button_layout.addStretch()
         button_layout.addWidget(self.clear_button)
         button_layout.addWidget(self.filter_fire_button)
@@ -460,6 +611,7 @@ class MQTTDemo(QWidget):
         self.filter_fire_button.clicked.connect(self.filter_fire_events)
         self.show_all_button.clicked.connect(self.show_all_records)
         self.export_button.clicked.connect(self.export_to_csv)
+        self.export_summary_button.clicked.connect(self.export_summary_to_csv)
 
     def load_fire_records(self, fire_detected_filter=None):
         records = self.db_manager.get_all_fire_events(fire_detected_filter)
@@ -479,10 +631,10 @@ class MQTTDemo(QWidget):
             self.record_model.appendRow(items)
 
     def clear_table(self):
-        self.db_manager.connect()
-        self.db_manager.cursor.execute('DELETE FROM fire_events')
-        self.db_manager.conn.commit()
-        self.db_manager.close()
+        if self.recorder:
+            self.recorder.clear()
+        else:
+            self.mqtt_client.clear()
         self.load_fire_records()
 
     def filter_fire_events(self):
@@ -511,6 +663,31 @@ class MQTTDemo(QWidget):
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to export data: {e}")
 
+    def export_summary_to_csv(self):
+        """Export min/max/avg and fire counts per bucket for the selected range, read from the rollup tables"""
+        span, step = SUMMARY_RANGES[self.summary_range.currentText()]
+        if self.recorder:
+            self.recorder.flush_rollups()
+        else:
+            self.mqtt_client.flush_rollups()
+        end = datetime.now().timestamp()
+        rows, table = self.db_manager.get_rollups(end - span, end, step)
+        if not rows:
+            QMessageBox.information(self, "Info", "No data to export.")
+            return
+
+        path, _ = QFileDialog.getSaveFileName(self, "Save CSV", "", "CSV Files (*.csv)")
+        if path:
+            try:
+                with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+                    writer = csv.DictWriter(csvfile, fieldnames=['time'] + list(rows[0]))
+                    writer.writeheader()
+                    for row in rows:
+                        writer.writerow(dict(row, time=datetime.fromtimestamp(row['bucket']).strftime(TIME_FORMAT)))
+                QMessageBox.information(self, "Success", f"Exported {len(rows)} rows from {table}.")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to export data: {e}")
+
     def setup_temperature_charts(self):
         """Setup temperature charts for the three widgets"""
         # Create three temperature charts
@@ -534,6 +711,93 @@ class MQTTDemo(QWidget):
         layout3.setContentsMargins(0, 0, 0, 0)
         self.ui.widget_chart3.setLayout(layout3)
     
+    def setup_memory_panel(self):
+        """Resident memory, Qt objects and buffer sizes, refreshed every 2 s"""
+        self.memory_monitor = MemoryMonitor()
+        self.memory_label = QLabel()
+        tab_layout = self.ui.tab_3.layout()
+        if tab_layout:
+            tab_layout.addWidget(self.memory_label)
+        self.memory_timer = QTimer(self)
+        self.memory_timer.timeout.connect(self.update_memory_panel)
+        self.memory_timer.start(2000)
+        self.update_memory_panel()
+    
+    def memory_counts(self):
+        """Sizes of everything that grows or churns with incoming messages"""
+        return {
+            'qt_objects': len(self.findChildren(QObject)),
+            'widgets': len(QApplication.allWidgets()),
+            'table_rows': self.record_model.rowCount(),
+            'log_lines': self.ui.textEdit_Received.document().blockCount(),
+            'chart_points': sum(len(chart.data_buffer) for chart in
+                                (self.chart_min_temp, self.chart_max_temp, self.chart_center_temp)),
+            'skipped': getattr(self.mqtt_client, 'missed', 0),
+            'coalesced': self.mqtt_client.ingress.counters['coalesced'],
+            'dropped': self.mqtt_client.ingress.counters['dropped'],
+        }
+    
+    def update_memory_panel(self):
+        sample = self.memory_monitor.sample(**self.memory_counts())
+        if self.memory_monitor.baseline is None:
+            self.memory_monitor.set_baseline()
+        growth = self.memory_monitor.growth()
+        cpu = self.memory_monitor.cpu_per_message()
+        self.memory_label.setText(
+            f"RSS {format_bytes(sample['rss'])} ({growth.get('rss', 0) / (1 << 20):+.1f} MB)  |  "
+            f"Qt objects {sample['qt_objects']} ({growth['qt_objects']:+d})  |  "
+            f"Table rows {sample['table_rows']}  |  Log lines {sample['log_lines']}  |  "
+            f"Chart points {sample['chart_points']}  |  Messages {sample['messages']}"
+            + (f"  |  CPU {cpu * 1000:.2f} ms/msg" if cpu is not None else "")
+            + (f"  |  Skipped {sample['skipped']}" if sample['skipped'] else "")
+            + f"  |  {self.mqtt_client.ingress.summary()}")
+    
+    def setup_profiler_action(self):
+        self.profiler_config = dict(DEFAULT_PROFILER, **self.load_config().get('profiler', {}))
+        self.profiler = None
+        self.profiler_timer = QTimer(self)
+        self.profiler_timer.setSingleShot(True)
+        self.profiler_timer.timeout.connect(self.stop_profiler)
+        self.profile_action = QAction(f"Profile ({self.profiler_config['duration']:g} s)", self)
+        self.profile_action.setCheckable(True)
+        self.profile_action.setShortcut(QKeySequence("Ctrl+Shift+P"))
+        self.profile_action.toggled.connect(self.toggle_profiler)
+        self.addAction(self.profile_action)
+        self.setContextMenuPolicy(Qt.ActionsContextMenu)
+    
+    def toggle_profiler(self, checked):
+        if checked:
+            self.start_profiler()
+        else:
+            self.stop_profiler()
+    
+    def start_profiler(self, duration=None):
+        """Sample all threads (and the ingest process) for `duration` seconds or until toggled off"""
+        if self.profiler:
+            return
+        duration = duration or self.profiler_config['duration']
+        interval = self.profiler_config['interval_ms'] / 1000
+        self.profiler = SamplingProfiler(interval)
+        self.profiler.start()
+        if not self.recorder:
+            self.mqtt_client.profile_start(interval)
+        self.profiler_timer.start(int(duration * 1000))
+        self.profile_action.setChecked(True)
+        self.append_received_message("Profiler", f"Sampling all threads for {duration:g} s", "orange")
+    
+    def stop_profiler(self):
+        if not self.profiler:
+            return
+        self.profiler_timer.stop()
+        self.profiler.stop()
+        paths = list(self.profiler.save(output_prefix(self.profiler_config, 'gui')))
+        samples = self.profiler.samples
+        self.profiler = None
+        if not self.recorder:
+            paths += self.mqtt_client.profile_stop()
+        self.profile_action.setChecked(False)
+        self.append_received_message("Profiler", f"{samples} samples written to {', '.join(paths)}", "orange")
+    
     def setup_theme_monitoring(self):
         """Setup theme monitoring (optional feature)"""
         # Create timer to periodically check theme changes
@@ -600,45 +864,46 @@ class MQTTDemo(QWidget):
         painter.drawText(text_x, text_y, text)
         painter.end()
     
-    def handle_detection_data(self, message):
-        """Handle detection data messages"""
+    def handle_detection_data(self, message, received=None, display=True):
+        """Handle detection data messages (single-process mode: store at the receive time, then display)"""
         try:
             data = json.loads(message)
-            current_time = datetime.now()
-            
-            # Update temperature display and chart data
-            if "tMin" in data:
-                temp_min = float(data['tMin'])
-                self.ui.label__MinTemp.setText(f"{temp_min:.1f}°C")
-                self.chart_min_temp.add_data_point(current_time, temp_min)
-            
-            if "tMax" in data:
-                temp_max = float(data['tMax'])
-                self.ui.label_MaxTemp.setText(f"{temp_max:.1f}°C")
-                self.chart_max_temp.add_data_point(current_time, temp_max)
-            
-            if "tCenter" in data:
-                temp_center = float(data['tCenter'])
-                self.ui.label_CenterTemp.setText(f"{temp_center:.1f}°C")
-                self.chart_center_temp.add_data_point(current_time, temp_center)
-            
-            # Update fire detection status
-            if "fireDetected" in data:
-                new_fire_state = bool(data["fireDetected"])
-                timestamp = current_time.strftime('%Y-%m-%d %H:%M:%S')
-                mode = self.ui.comboBox_model.currentText()
-                self.db_manager.log_fire_event(timestamp, temp_min, temp_max, temp_center, new_fire_state, mode)
-                self.load_fire_records()
-                self.fire_detected = new_fire_state
-                self.ui.widget_state.update()  # Trigger redraw
-            
-            self.append_received_message("Detection Data", "Temperature and fire detection data updated", "blue")
-            
+            current_time = datetime.now() if received is None else datetime.fromtimestamp(received)
+            stored = self.recorder.record(data, current_time, self.ui.comboBox_model.currentText())
+            if display:
+                self.show_detection(dict(data, time=current_time.timestamp(), stored=stored))
         except json.JSONDecodeError:
             self.append_received_message("Error", "Detection data message format error", "red")
         except Exception as e:
             self.append_received_message("Error", f"Error processing detection data: {str(e)}", "red")
     
+    def store_detection(self, topic, message, received):
+        """Record a detection message whose display was coalesced into a newer one"""
+        self.memory_monitor.messages += 1
+        self.handle_detection_data(message, received, display=False)
+    
+    def show_detection(self, data):
+        """Update temperature display, chart data and fire state from a detection update"""
+        current_time = datetime.fromtimestamp(data['time'])
+        for key, label, chart in (('tMin', self.ui.label__MinTemp, self.chart_min_temp),
+                                  ('tMax', self.ui.label_MaxTemp, self.chart_max_temp),
+                                  ('tCenter', self.ui.label_CenterTemp, self.chart_center_temp)):
+            if key in data and data[key] == data[key]:  # NaN when the ingest process has no reading yet
+                temperature = float(data[key])
+                label.setText(f"{temperature:.1f}°C")
+                chart.add_data_point(current_time, temperature)
+        
+        # Update fire detection status
+        if "fireDetected" in data:
+            self.fire_detected = bool(data["fireDetected"])
+            self.ui.widget_state.update()  # Trigger redraw
+        
+        # Rows the storage policy kept
+        if data.get('stored'):
+            self.load_fire_records()
+        
+        self.append_received_message("Detection Data", "Temperature and fire detection data updated", "blue")
+    
     def eventFilter(self, obj, event):
         # Handle Ctrl+Enter to send message
         if obj == self.ui.textEdit_Send:
@@ -746,28 +1011,33 @@ class MQTTDemo(QWidget):
             QMessageBox.warning(self, "Warning", "Please enter message to send")
             return
         
-        if not self.mqtt_client.is_connected:
-            QMessageBox.warning(self, "Warning", "Please connect to MQTT broker first")
-            return
-        
-        # Send message
-        if self.mqtt_client.publish_message(topic, message):
-            self.append_received_message("Sent", f"Topic: {topic}\nContent: {message}", "purple")
+        # Send message; while offline it waits in the outbox and goes out on reconnect
+        connected = self.mqtt_client.is_connected
+        if self.mqtt_client.publish_message(topic, message, queue=True):
+            if connected:
+                self.append_received_message("Sent", f"Topic: {topic}\nContent: {message}", "purple")
+            else:
+                self.append_received_message("Queued", f"Topic: {topic}\nContent: {message}\n"
+                                             "Sent when the connection is back", "gray")
             self.ui.textEdit_Send.clear()
         else:
             QMessageBox.warning(self, "Warning", "Send failed, please check connection status")
     
-    def on_message_received(self, topic, message):
+    def on_message_received(self, topic, message, received=None):
         if not message:
             return
+        self.memory_monitor.messages += 1
         self.append_received_message("Received", f"Topic: {topic}\nContent: {message}", "black")
         
         # Handle configuration update messages
         if topic == "/ESP32/config_update":
             self.handle_config_update(message)
-        # Handle detection data messages
-        elif topic == "/ESP32/detection_data":
-            self.handle_detection_data(message)
+        # Handle configuration acknowledgements
+        elif topic == "/ESP32/config_response":
+            self.handle_config_response(message)
+        # Handle detection data messages (the ingest process sends them decoded)
+        elif topic == "/ESP32/detection_data" and self.recorder:
+            self.handle_detection_data(message, received)
     
     def append_received_message(self, msg_type, content, color="black"):
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -793,36 +1063,41 @@ class MQTTDemo(QWidget):
         if not self.mqtt_client.is_connected:
             return
             
-        default_topics = ["/ESP32/detection_data", "/ESP32/config_update"]
-        
-        for topic in default_topics:
-            # Check if already subscribed
-            already_subscribed = False
-            for i in range(self.subscription_model.rowCount()):
-                if self.subscription_model.item(i).text() == topic:
-                    already_subscribed = True
-                    break
+        # Check which are not subscribed yet
+        subscribed = {self.subscription_model.item(i).text() for i in range(self.subscription_model.rowCount())}
+        missing = [topic for topic in DEFAULT_TOPICS if topic not in subscribed]
+        
+        # One SUBSCRIBE for all of them
+        if missing and self.mqtt_client.subscribe_topics(missing):
+            for topic in missing:
+                # Add to subscription list
+                item = QStandardItem(topic)
+                self.subscription_model.appendRow(item)
+                
+                # Add to send topic dropdown
+                topics = self.topic_model.stringList()
+                if topic not in topics:
+                    topics.append(topic)
+                    self.topic_model.setStringList(topics)
             
-            if not already_subscribed:
-                if self.mqtt_client.subscribe_topic(topic):
-                    # Add to subscription list
-                    item = QStandardItem(topic)
-                    self.subscription_model.appendRow(item)
-                    
-                    # Add to send topic dropdown
-                    topics = self.topic_model.stringList()
-                    if topic not in topics:
-                        topics.append(topic)
-                        self.topic_model.setStringList(topics)
-                    
-                    self.append_received_message("System", f"Auto subscribed to topic: {topic}", "blue")
+            self.append_received_message("System", f"Auto subscribed to topics: {', '.join(missing)}", "blue")
     
-    def on_config_changed(self):
-        """Send configuration when parameters change"""
-        if not self.mqtt_client.is_connected:
-            return
-            
-        config_data = {
+    def setup_config_sync(self):
+        sync_layout = QHBoxLayout()
+        self.push_fleet_button = QPushButton("Push to Fleet")
+        self.push_fleet_button.clicked.connect(self.push_config_to_fleet)
+        self.config_sync_label = QLabel(self.config_sync.summary())
+        sync_layout.addWidget(self.push_fleet_button)
+        sync_layout.addWidget(self.config_sync_label)
+        sync_layout.addStretch()
+        self.ui.verticalLayout_11.insertLayout(1, sync_layout)
+        self.config_sync_timer = QTimer(self)
+        self.config_sync_timer.timeout.connect(self.poll_config_sync)
+        self.config_sync_timer.start(100)
+    
+    def device_config(self):
+        """Configuration shown in the controls"""
+        return {
             "measurement_mode": self.ui.comboBox_model.currentIndex() + 1,  # Send 1-4
             "threshold_1": self.ui.doubleSpinBox_1.value(),
             "threshold_2": self.ui.doubleSpinBox_2.value(),
@@ -830,17 +1105,58 @@ class MQTTDemo(QWidget):
             "threshold_4": self.ui.doubleSpinBox_4.value(),
             "threshold_5": self.ui.doubleSpinBox_5.value()
         }
-        
-        config_json = json.dumps(config_data)
-        
+    
+    def on_config_changed(self):
+        """Queue configuration changes; poll_config_sync sends them once editing settles"""
+        if not self.recorder:
+            self.mqtt_client.set_mode(self.ui.comboBox_model.currentText())
+        if not self.mqtt_client.is_connected:
+            return
+        self.config_sync.edit(self.device_config())
+    
+    def publish_config(self, config_json):
+        if not self.mqtt_client.is_connected:
+            return False
         if self.mqtt_client.publish_message("/ESP32/config", config_json):
             self.append_received_message("Config Sent", f"Topic: /ESP32/config\nContent: {config_json}", "orange")
+            return True
+        return False
+    
+    def poll_config_sync(self):
+        self.config_sync.poll()
+        summary = self.config_sync.summary()
+        if self.config_sync_label.text() != summary:
+            self.config_sync_label.setText(summary)
+    
+    def push_config_to_fleet(self):
+        """Send the whole configuration to every device as one version"""
+        if not self.mqtt_client.is_connected:
+            QMessageBox.warning(self, "Warning", "Please connect to MQTT broker first")
+            return
+        self.config_sync.edit(self.device_config())
+        self.config_sync.push_fleet()
+    
+    def handle_config_response(self, message):
+        """Device acknowledgement of /ESP32/config"""
+        try:
+            report = parse_report("/ESP32/config_response", message)
+            if report:
+                state = self.config_sync.report(*report)
+                self.append_received_message("Config Ack", f"{report[0]}: {state}",
+                                             "green" if state == "in sync" else "orange")
+        except (json.JSONDecodeError, ValueError, TypeError):
+            self.append_received_message("Error", "Configuration response message format error", "red")
     
     def handle_config_update(self, message):
         """Handle device configuration update messages"""
         try:
             config_data = json.loads(message)
             
+            # The device changed its own configuration: showing it must not send it back
+            report = parse_report("/ESP32/config_update", message)
+            if report:
+                self.config_sync.remote_update(*report)
+            
             # Update interface control values
             if "measurement_mode" in config_data:
                 # Receive 1-4 values, convert to 0-3 index
@@ -871,19 +1187,32 @@ class MQTTDemo(QWidget):
             self.append_received_message("Error", f"Error processing configuration update: {str(e)}", "red")
     
     def closeEvent(self, event):
-        # Disconnect MQTT connection when closing
-        if self.mqtt_client.is_connected:
-            self.mqtt_client.disconnect_from_broker()
+        self.stop_profiler()
+        if self.recorder:
+            # Store the tail of the current storage segment and the partial rollup minute
+            self.recorder.close()
+            # Disconnect MQTT connection when closing (the outbox keeps unsent messages for the next start)
+            self.mqtt_client.close()
+        else:
+            # The ingest process keeps the connection and goes on recording
+            self.mqtt_client.close()
+            self.db_manager.close()
         event.accept()
 
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile', type=float, nargs='?', const=DEFAULT_PROFILER['duration'], metavar='SECONDS',
+                        help='Profile all threads from start-up for SECONDS')
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     
     # Set application icon
     app.setWindowIcon(QIcon("ui/Logo.png"))
     
     window = MQTTDemo()
     window.show()
+    if args.profile:
+        window.start_profiler(args.profile)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
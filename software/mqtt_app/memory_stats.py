@@ -0,0 +1,101 @@
+"""
+Process memory and CPU measurements, without Qt.
+
+Used by the in-app memory panel and by soak.py. A MemoryMonitor takes
+samples of resident memory, the traced Python heap (when tracemalloc runs),
+CPU time and whatever counts the caller adds (Qt objects, table rows, log
+lines, chart points). The first sample after the warm-up becomes the
+baseline; budgets limit growth from that baseline, so start-up allocations
+and caches filling once do not count.
+"""
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+DEFAULT_BUDGET = {'rss_growth_mb': 64.0, 'python_growth_mb': 16.0, 'qt_object_growth': 64,
+                  'cpu_ms_per_message': 20.0}
+
+
+def rss_bytes():
+    """Current resident set size, or the peak where only that is available, None when unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryMonitor:
+    def __init__(self, trace_frames=0, history=256):
+        self.samples = deque(maxlen=history)  # history=None keeps every sample
+        self.baseline = None
+        self.baseline_snapshot = None
+        self.messages = 0
+        if trace_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(trace_frames)
+
+    def sample(self, **counts):
+        """Record a sample: rss, python_heap, cpu, messages and the given counts"""
+        sample = dict(time=time.time(), rss=rss_bytes(),
+                      python_heap=tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+                      cpu=time.process_time(), messages=self.messages, **counts)
+        self.samples.append(sample)
+        return sample
+
+    def set_baseline(self):
+        """Measure growth from the latest sample on (call after the warm-up)"""
+        self.baseline = self.samples[-1] if self.samples else self.sample()
+        if tracemalloc.is_tracing():
+            self.baseline_snapshot = tracemalloc.take_snapshot()
+
+    def growth(self):
+        """Change of every measured value between the baseline and the latest sample"""
+        if self.baseline is None or not self.samples:
+            return {}
+        last = self.samples[-1]
+        return {key: last[key] - value for key, value in self.baseline.items()
+                if isinstance(value, (int, float)) and last.get(key) is not None}
+
+    def cpu_per_message(self):
+        """CPU seconds per message since the baseline"""
+        growth = self.growth()
+        return growth['cpu'] / growth['messages'] if growth.get('messages') else None
+
+    def top_allocators(self, limit=10):
+        """Source lines whose traced allocations grew the most since the baseline"""
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap>')))
+        if self.baseline_snapshot is None:
+            return snapshot.statistics('lineno')[:limit]
+        return snapshot.compare_to(self.baseline_snapshot, 'lineno')[:limit]
+
+    def check(self, budget=None):
+        """Budget violations since the baseline, as readable strings (empty when within budget)"""
+        budget = dict(DEFAULT_BUDGET, **(budget or {}))
+        growth = self.growth()
+        violations = []
+        for key, limit, scale, unit in (('rss', budget['rss_growth_mb'], 1 << 20, 'MB'),
+                                        ('python_heap', budget['python_growth_mb'], 1 << 20, 'MB'),
+                                        ('qt_objects', budget['qt_object_growth'], 1, 'objects')):
+            if key in growth and growth[key] / scale > limit:
+                violations.append(f'{key} grew by {growth[key] / scale:.1f} {unit} (budget {limit} {unit})')
+        cpu = self.cpu_per_message()
+        if cpu is not None and cpu * 1000 > budget['cpu_ms_per_message']:
+            violations.append(f"cpu {cpu * 1000:.2f} ms per message (budget {budget['cpu_ms_per_message']} ms)")
+        return violations
+
+
+def format_bytes(value):
+    if value is None:
+        return 'n/a'
+    return f'{value / (1 << 20):.1f} MB'
@@ -0,0 +1,229 @@
+"""
+Minimal local MQTT 3.1.1 broker, a stand-in for load tests and offline development.
+
+Standard library only (asyncio). It covers what the devices and the app
+use: CONNECT (username and password are accepted, not checked), SUBSCRIBE
+and UNSUBSCRIBE with + and # wildcards, PUBLISH at QoS 0/1/2, retained
+messages, last will, keep-alive pings and DISCONNECT. Sessions are not kept
+across connections, and messages are forwarded at most at QoS 1
+without redelivery.
+
+Usage:
+    python mini_broker.py --port 1883
+"""
+import asyncio
+import argparse
+import threading
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(topic_filter, topic):
+    filter_parts, topic_parts = topic_filter.split('/'), topic.split('/')
+    for i, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts) or (part != '+' and part != topic_parts[i]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def _string(data, pos):
+    length = int.from_bytes(data[pos:pos + 2], 'big')
+    return data[pos + 2:pos + 2 + length], pos + 2 + length
+
+
+def _encode_string(value):
+    return len(value).to_bytes(2, 'big') + value
+
+
+def _packet(kind, flags, body):
+    length, header = len(body), bytearray([kind << 4 | flags])
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(header) + body
+
+
+class Session:
+    def __init__(self, writer):
+        self.writer = writer
+        self.client_id = ''
+        self.subscriptions = {}  # topic filter -> granted QoS
+        self.will = None
+        self.next_id = 0
+
+    def send(self, kind, flags, body):
+        if not self.writer.is_closing():
+            self.writer.write(_packet(kind, flags, body))
+
+    def deliver(self, topic, payload, qos, retain=False):
+        body = _encode_string(topic)
+        if qos:
+            self.next_id = self.next_id % 0xFFFF + 1
+            body += self.next_id.to_bytes(2, 'big')
+        self.send(PUBLISH, qos << 1 | int(retain), body + payload)
+
+
+class MiniBroker:
+    def __init__(self, host='127.0.0.1', port=1883):
+        self.host = host
+        self.port = port
+        self.sessions = set()
+        self.retained = {}
+        self.server = None
+        self.loop = None
+        self.task = None
+        self.thread = None
+        self.started = threading.Event()
+        self.stats = {'connections': 0, 'received': 0, 'delivered': 0}
+
+    async def serve(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]   # Port 0 picks a free port
+        self.started.set()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start(self):
+        """Run in a daemon thread (for tools that embed the broker); returns once it listens"""
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.task = self.loop.create_task(self.serve())
+            try:
+                self.loop.run_until_complete(self.task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                # Close the client connections too
+                pending = asyncio.all_tasks(self.loop)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    self.loop.run_until_complete(asyncio.wait(pending))
+                self.loop.close()
+        self.thread = threading.Thread(target=run, name='mini-broker', daemon=True)
+        self.thread.start()
+        self.started.wait(5)
+        return self
+
+    def stop(self):
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        if self.thread:
+            self.thread.join(5)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.stats['received'] += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        for session in list(self.sessions):
+            granted = [q for f, q in session.subscriptions.items() if topic_matches(f, topic.decode())]
+            if granted:
+                session.deliver(topic, payload, min(qos, max(granted), 1))
+                self.stats['delivered'] += 1
+
+    async def _read_packet(self, reader):
+        first = (await reader.readexactly(1))[0]
+        length, shift = 0, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return first >> 4, first & 0x0F, await reader.readexactly(length)
+
+    async def _handle(self, reader, writer):
+        session = Session(writer)
+        clean_exit = False
+        keepalive = None
+        try:
+            while True:
+                kind, flags, data = await asyncio.wait_for(self._read_packet(reader), keepalive)
+                if kind == CONNECT:
+                    keepalive = self._connect(session, data)
+                    self.sessions.add(session)
+                    self.stats['connections'] += 1
+                    session.send(CONNACK, 0, b'\x00\x00')
+                elif kind == PUBLISH:
+                    qos, retain = flags >> 1 & 3, bool(flags & 1)
+                    topic, pos = _string(data, 0)
+                    if qos:
+                        packet_id, pos = data[pos:pos + 2], pos + 2
+                        session.send(PUBACK if qos == 1 else PUBREC, 0, packet_id)
+                    self.publish(topic, data[pos:], qos, retain)
+                elif kind == PUBREL:
+                    session.send(PUBCOMP, 0, data[:2])
+                elif kind == PUBREC:
+                    session.send(PUBREL, 2, data[:2])
+                elif kind == SUBSCRIBE:
+                    granted, pos = bytearray(), 2
+                    while pos < len(data):
+                        topic_filter, pos = _string(data, pos)
+                        qos = min(data[pos], 1)
+                        pos += 1
+                        session.subscriptions[topic_filter.decode()] = qos
+                        granted.append(qos)
+                    session.send(SUBACK, 0, data[:2] + bytes(granted))
+                    for topic, (payload, qos) in list(self.retained.items()):
+                        for topic_filter in session.subscriptions:
+                            if topic_matches(topic_filter, topic.decode()):
+                                session.deliver(topic, payload, min(qos, session.subscriptions[topic_filter]), True)
+                                break
+                elif kind == UNSUBSCRIBE:
+                    pos = 2
+                    while pos < len(data):
+                        topic_filter, pos = _string(data, pos)
+                        session.subscriptions.pop(topic_filter.decode(), None)
+                    session.send(UNSUBACK, 0, data[:2])
+                elif kind == PINGREQ:
+                    session.send(PINGRESP, 0, b'')
+                elif kind == DISCONNECT:
+                    clean_exit = True
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, asyncio.CancelledError):
+            pass  # Cancelled when the broker stops
+        finally:
+            self.sessions.discard(session)
+            if session.will and not clean_exit:
+                self.publish(*session.will)
+            writer.close()
+
+    def _connect(self, session, data):
+        _, pos = _string(data, 0)   # Protocol name
+        flags = data[pos + 1]
+        keepalive = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        pos += 4
+        if data[pos - 4] == 5:      # MQTT 5 properties, ignored
+            raise ConnectionError('MQTT 5 is not supported by the stand-in broker')
+        client_id, pos = _string(data, pos)
+        session.client_id = client_id.decode()
+        if flags & 0x04:
+            will_topic, pos = _string(data, pos)
+            will_payload, pos = _string(data, pos)
+            session.will = (will_topic, will_payload, flags >> 3 & 3, bool(flags & 0x20))
+        return keepalive * 1.5 if keepalive else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Minimal local MQTT 3.1.1 broker')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    args = parser.parse_args()
+    broker = MiniBroker(args.host, args.port)
+    print(f'Listening on {args.host}:{args.port}')
+    try:
+        asyncio.run(broker.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+MQTT connection without Qt, shared by the GUI's MQTTClient and the ingest process.
+
+Callbacks run on paho's network thread: on_message(topic, message) and
+on_status(connected, text).
+
+Broker restarts and network blips are handled as follows (the `mqtt`
+section of config.json). With persistent_session the client connects with
+clean_session=False (MQTT 3.1.1) or clean_start=False and a session expiry
+(MQTT 5) and subscribes at QoS 1, so the broker keeps the subscriptions and
+queues messages while the client is away. When the broker reports the
+session as present, nothing is resubscribed; otherwise every topic is
+resubscribed in a single SUBSCRIBE.
+
+Reconnect attempts back off exponentially from reconnect_min up to
+reconnect_max seconds with jitter, so many clients that lost the same
+broker do not come back in lockstep. Publishes made while offline are
+kept in a small SQLite outbox (it survives a restart) and sent in order,
+in one pass, as soon as the connection is back.
+"""
+import time
+import random
+import sqlite3
+import threading
+
+import paho.mqtt.client as mqtt
+
+DEFAULT_TOPICS = ["/ESP32/detection_data", "/ESP32/config_update", "/ESP32/config_response"]
+DEFAULT_MQTT = {'protocol_version': 4, 'persistent_session': True, 'session_expiry': 3600, 'qos': 1,
+                'reconnect_min': 1.0, 'reconnect_max': 60.0, 'outbox': 'outbox.db', 'outbox_limit': 10000}
+
+
+class Outbox:
+    """Publishes waiting for a connection, oldest dropped beyond `limit`"""
+
+    def __init__(self, path, limit=10000):
+        self.limit = limit
+        self.lock = threading.Lock()  # Appended from the caller's thread, flushed from paho's thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                          'topic TEXT NOT NULL, payload BLOB NOT NULL, qos INTEGER NOT NULL, created REAL NOT NULL)')
+        self.conn.commit()
+
+    def put(self, topic, payload, qos):
+        """Queue a publish; returns the number of old messages dropped to stay within the limit"""
+        with self.lock:
+            self.conn.execute('INSERT INTO outbox (topic, payload, qos, created) VALUES (?, ?, ?, ?)',
+                              (topic, payload, qos, time.time()))
+            dropped = self.conn.execute('DELETE FROM outbox WHERE id <= (SELECT max(id) FROM outbox) - ?',
+                                        (self.limit,)).rowcount
+            self.conn.commit()
+        return dropped
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT count(*) FROM outbox').fetchone()[0]
+
+    def flush(self, publish):
+        """Hand every queued message to publish(topic, payload, qos) -> bool in order; returns the number sent"""
+        with self.lock:
+            sent = []
+            for row_id, topic, payload, qos in self.conn.execute(
+                    'SELECT id, topic, payload, qos FROM outbox ORDER BY id').fetchall():
+                if not publish(topic, payload, qos):
+                    break  # Connection lost again, the rest waits for the next one
+                sent.append((row_id,))
+            self.conn.executemany('DELETE FROM outbox WHERE id = ?', sent)
+            self.conn.commit()
+        return len(sent)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class MqttConnection:
+    def __init__(self, on_message=None, on_status=None, settings=None):
+        self.on_message_callback = on_message
+        self.on_status_callback = on_status
+        self.settings = dict(DEFAULT_MQTT, **(settings or {}))
+        self.client = None
+        self.is_connected = False
+        self.subscriptions = set()
+        self.attempts = 0  # Failed attempts since the last successful connection
+        self.outbox = Outbox(self.settings['outbox'], self.settings['outbox_limit']) if self.settings['outbox'] else None
+
+    def _status(self, connected, text):
+        if self.on_status_callback:
+            self.on_status_callback(connected, text)
+
+    def connect_to_broker(self, protocol, host, port, client_id, username, password):
+        self.disconnect_from_broker()  # Never leave a previous client running alongside the new one
+        persistent = self.settings['persistent_session']
+        mqtt5 = self.settings['protocol_version'] == 5
+        try:
+            # 创建MQTT客户端
+            transport = "websockets" if protocol in ['ws://', 'wss://'] else "tcp"
+            if mqtt5:
+                self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id,
+                                          transport=transport, protocol=mqtt.MQTTv5)
+            else:
+                self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id,
+                                          transport=transport, clean_session=not persistent)
+
+            # 设置用户名和密码
+            if username and password:
+                self.client.username_pw_set(username, password)
+
+            # 设置回调函数
+            self.client.on_connect = self.on_connect
+            self.client.on_connect_fail = self.on_connect_fail
+            self.client.on_disconnect = self.on_disconnect
+            self.client.on_message = self.on_message
+            self.attempts = 0
+            self._backoff()
+
+            # 连接到代理
+            if protocol in ['mqtts://', 'wss://']:
+                self.client.tls_set()
+
+            if mqtt5:
+                properties = mqtt.Properties(mqtt.PacketTypes.CONNECT)
+                properties.SessionExpiryInterval = int(self.settings['session_expiry']) if persistent else 0
+                self.client.connect(host, int(port), 60, clean_start=not persistent, properties=properties)
+            else:
+                self.client.connect(host, int(port), 60)
+            self.client.loop_start()
+
+        except Exception as e:
+            self._status(False, f"Connection failed: {str(e)}")
+
+    def _backoff(self):
+        """Delay of paho's next reconnect attempt: exponential in the failed attempts, with jitter"""
+        low, high = self.settings['reconnect_min'], self.settings['reconnect_max']
+        delay = min(high, low * 2 ** min(self.attempts, 16)) * random.uniform(0.5, 1.0)
+        # Equal bounds keep paho from doubling on its own and reset its current delay (fractions work too)
+        self.client.reconnect_delay_set(delay, delay)
+
+    def on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code == 0:
+            self.is_connected = True
+            self.attempts = 0
+            self._backoff()
+            self._status(True, "Session resumed" if flags.session_present else "Connected successfully")
+            # A resumed session still holds the subscriptions; otherwise one SUBSCRIBE for all of them
+            if self.subscriptions and not flags.session_present:
+                client.subscribe([(topic, self.settings['qos']) for topic in sorted(self.subscriptions)])
+            if self.outbox is not None:
+                sent = self.outbox.flush(self._publish)
+                if sent:
+                    self._status(True, f"Sent {sent} messages queued while offline")
+        else:
+            self.is_connected = False
+            self._status(False, f"Connection failed, error code: {reason_code}")
+
+    def on_connect_fail(self, client, userdata):
+        self.attempts += 1
+        self._backoff()
+
+    def on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
+        self.is_connected = False
+        self.attempts += 1
+        if self.client:
+            self._backoff()
+        self._status(False, "Connection disconnected")
+
+    def on_message(self, client, userdata, msg):
+        if self.on_message_callback:
+            self.on_message_callback(msg.topic, msg.payload.decode('utf-8'))
+
+    def subscribe_topic(self, topic):
+        return self.subscribe_topics([topic])
+
+    def subscribe_topics(self, topics):
+        """Subscribe to several topics with one SUBSCRIBE packet"""
+        topics = list(topics)
+        if self.client and self.is_connected and topics:
+            self.client.subscribe([(topic, self.settings['qos']) for topic in topics])
+            self.subscriptions.update(topics)
+            return True
+        return False
+
+    def _publish(self, topic, payload, qos):
+        return self.client.publish(topic, payload, qos).rc == mqtt.MQTT_ERR_SUCCESS
+
+    def publish_message(self, topic, message, qos=0, queue=False):
+        """Publish now; while offline, queue=True keeps it in the outbox. False when it was neither sent nor queued"""
+        if self.client and self.is_connected and self._publish(topic, message, qos):
+            return True
+        if queue and self.outbox is not None:
+            self.outbox.put(topic, message, max(qos, self.settings['qos']))
+            return True
+        return False
+
+    @property
+    def queued(self):
+        """Messages waiting in the outbox"""
+        return len(self.outbox) if self.outbox is not None else 0
+
+    def disconnect_from_broker(self):
+        if self.client:
+            client, self.client = self.client, None
+            client.disconnect()
+            client.loop_stop()
+
+    def close(self):
+        self.disconnect_from_broker()
+        if self.outbox is not None:
+            self.outbox.close()
+            self.outbox = None
@@ -0,0 +1,427 @@
+"""
+Time-partitioned storage for fire_events.
+
+Rows go to one SQLite file per day (or ISO week) in the records directory;
+the rollup tables live in a small catalog database next to them. Only the
+current partition is held open for writing, so write latency and index size
+stay the same after months of operation. Reads attach the partitions that
+overlap the requested range (in batches, SQLite attaches at most 10 databases
+at once) and union their rows. Ids are unique across partitions: the
+highest id handed out is kept in the catalog, and every partition opened for
+writing continues from it, even when late rows go back to an older one.
+
+A background thread enforces retention by deleting whole partition files
+(and minute rollups of the same age) and archives partitions older than
+archive_after_days as vacuumed, gzip-compressed copies. It runs on start-up,
+on rollover and every maintenance_hours, so an idle process keeps to the
+retention too. Archiving holds the partition lock from the snapshot to the
+removal of the live file, so a late row can only reopen a partition before
+it is archived (and is then skipped) or after (and brings the archive back).
+Archived partitions are decompressed to a temporary directory when a query
+needs them.
+"""
+import os
+import re
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import rollups
+from storage_policy import TIME_FORMAT
+
+PARTITIONS = ('day', 'week')
+DEFAULT_DATABASE = {'directory': 'records', 'partition': 'day', 'retention_days': 90, 'archive_after_days': 7,
+                    'maintenance_hours': 1}
+CATALOG_NAME = 'catalog.db'
+ATTACH_BATCH = 9
+EVENT_COLUMNS = 'id, timestamp, min_temp, max_temp, center_temp, fire_detected, mode, device'
+LEGACY_COLUMNS = 'id, timestamp, min_temp, max_temp, center_temp, fire_detected, mode'
+
+_FILE_PATTERN = re.compile(r'^fire_events_(\d{8}|\d{4}W\d{2})\.db(\.gz)?$')
+_FRAMES_PATTERN = re.compile(r'^frames_(\d{8}|\d{4}W\d{2})\.tfa$')
+
+
+def _create_events_table(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS fire_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            min_temp REAL NOT NULL,
+            max_temp REAL NOT NULL,
+            center_temp REAL NOT NULL,
+            fire_detected BOOLEAN NOT NULL,
+            mode TEXT NOT NULL,
+            device TEXT NOT NULL DEFAULT '{rollups.DEFAULT_DEVICE}'
+        )
+    ''')
+    if 'device' not in {row[1] for row in cursor.execute('PRAGMA table_info(fire_events)')}:
+        # Partitions written before rows carried their device
+        cursor.execute(f"ALTER TABLE fire_events ADD COLUMN device TEXT NOT NULL DEFAULT '{rollups.DEFAULT_DEVICE}'")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fire_events_timestamp ON fire_events (timestamp)')
+
+
+def _sequence(conn):
+    """Highest id the partition's AUTOINCREMENT has handed out, 0 when none"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'fire_events'").fetchone()
+    return row[0] if row else 0
+
+
+class PartitionedStore:
+    def __init__(self, directory='records', partition='day', retention_days=90, archive_after_days=7,
+                 maintenance_hours=1):
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition period '{partition}', expected one of {PARTITIONS}")
+        self.directory = directory
+        self.archive_dir = os.path.join(directory, 'archive')
+        self.partition = partition
+        self.retention_days = retention_days          # 0 keeps everything
+        self.archive_after_days = archive_after_days  # 0 never archives
+        self.lock = threading.Lock()                  # Guards partition files moving between states
+        self.hot_key = None
+        self.hot_conn = None
+        self.last_id = None
+        self.cache_dir = None
+        self.maintenance_thread = None
+        self.maintenance_lock = threading.Lock()      # Rollover and the timer may both start maintenance
+        self.maintenance_hours = maintenance_hours    # 0 maintains on start-up and rollover only
+        self.stopping = threading.Event()
+        self.timer_thread = None
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn = self.catalog()
+        rollups.create_tables(conn.cursor())
+        conn.execute('CREATE TABLE IF NOT EXISTS id_sequence (name TEXT PRIMARY KEY, seq INTEGER NOT NULL)')
+        conn.commit()
+        conn.close()
+        for key, archived in self.partitions():
+            if not archived:
+                self._upgrade(self.path_for(key))
+        if maintenance_hours:
+            self.timer_thread = threading.Thread(target=self._maintenance_timer, name='partition-maintenance-timer',
+                                                 daemon=True)
+            self.timer_thread.start()
+
+    @classmethod
+    def from_config(cls, config=None):
+        return cls(**dict(DEFAULT_DATABASE, **(config or {})))
+
+    # ---- Partition naming ----
+
+    def key_for(self, timestamp):
+        """Partition key of a TIME_FORMAT timestamp"""
+        if self.partition == 'day':
+            return timestamp[:10].replace('-', '')
+        year, week, _ = datetime.strptime(timestamp[:10], '%Y-%m-%d').isocalendar()
+        return f'{year}W{week:02d}'
+
+    @staticmethod
+    def key_range(key):
+        """(start, end) local datetimes covered by a partition key"""
+        if 'W' in key:
+            start = datetime.strptime(key + '1', '%GW%V%u')
+            return start, start + timedelta(days=7)
+        start = datetime.strptime(key, '%Y%m%d')
+        return start, start + timedelta(days=1)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f'fire_events_{key}.db')
+
+    def archive_path_for(self, key):
+        return os.path.join(self.archive_dir, f'fire_events_{key}.db.gz')
+
+    def frames_path_for(self, key):
+        """Frame archive (frame_archive.FrameArchive) of a partition period"""
+        return os.path.join(self.directory, f'frames_{key}.tfa')
+
+    def frame_keys(self):
+        return sorted(m.group(1) for m in map(_FRAMES_PATTERN.match, os.listdir(self.directory)) if m)
+
+    def partitions(self):
+        """Sorted (key, archived) of every partition on disk"""
+        found = {}
+        for folder, archived in ((self.directory, False), (self.archive_dir, True)):
+            for name in os.listdir(folder):
+                match = _FILE_PATTERN.match(name)
+                if match and bool(match.group(2)) == archived:
+                    found.setdefault(match.group(1), archived)
+        return sorted(found.items())
+
+    def catalog(self):
+        return sqlite3.connect(os.path.join(self.directory, CATALOG_NAME), timeout=10)
+
+    # ---- Writing ----
+
+    def write_events(self, rows):
+        """Insert (timestamp, min, max, center, fire, mode, device) rows into their partitions"""
+        by_key = {}
+        for row in rows:
+            by_key.setdefault(self.key_for(row[0]), []).append(row)
+        for key, key_rows in by_key.items():
+            conn = self._hot(key)
+            conn.executemany(f'INSERT INTO fire_events ({EVENT_COLUMNS.split(", ", 1)[1]}) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?)', key_rows)
+            conn.commit()
+            self.last_id = _sequence(conn)  # lastrowid is not set by executemany
+
+    def _hot(self, key):
+        """Connection to the partition being written, switching (and triggering maintenance) on rollover"""
+        if key == self.hot_key and self.hot_conn:
+            return self.hot_conn
+        if self.last_id is None:
+            self.last_id = self._latest_id()
+        self.close_hot()
+        with self.lock:
+            self.hot_key = key  # Claimed under the lock, so maintenance no longer archives or drops it
+            path = self.path_for(key)
+            if not os.path.exists(path) and os.path.exists(self.archive_path_for(key)):
+                # Late rows for an archived period: bring it back as a live partition
+                with gzip.open(self.archive_path_for(key), 'rb') as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.archive_path_for(key))
+            # Callers serialize writes; the ingest process writes from paho's thread and closes from its own
+            conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _create_events_table(conn.cursor())
+        if self.last_id and _sequence(conn) < self.last_id:
+            # Continue from the highest id of any partition so ids stay unique across files
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'fire_events'")
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('fire_events', ?)", (self.last_id,))
+        conn.commit()
+        self.hot_key, self.hot_conn = key, conn
+        self.start_maintenance()
+        return conn
+
+    @staticmethod
+    def _upgrade(path):
+        """Bring a partition file written by an earlier version to the current schema"""
+        conn = sqlite3.connect(path, timeout=10)
+        _create_events_table(conn.cursor())
+        conn.commit()
+        conn.close()
+
+    def _latest_id(self):
+        """Highest id in any partition: the catalog's counter and the sequences of the live partitions"""
+        conn = self.catalog()
+        row = conn.execute("SELECT seq FROM id_sequence WHERE name = 'fire_events'").fetchone()
+        conn.close()
+        last = row[0] if row else 0
+        for key, archived in self.partitions():
+            # Archived partitions were closed (and counted in the catalog) before; without a counter, read them too
+            if not archived or row is None:
+                conn = sqlite3.connect(self._readable_path(key))
+                _create_events_table(conn.cursor())
+                last = max(last, _sequence(conn),
+                           conn.execute('SELECT coalesce(max(id), 0) FROM fire_events').fetchone()[0])
+                conn.close()
+        return last
+
+    def _save_latest_id(self):
+        conn = self.catalog()
+        conn.execute("INSERT OR REPLACE INTO id_sequence (name, seq) VALUES ('fire_events', "
+                     "max(?, coalesce((SELECT seq FROM id_sequence WHERE name = 'fire_events'), 0)))",
+                     (self.last_id,))
+        conn.commit()
+        conn.close()
+
+    def close_hot(self):
+        if self.hot_conn:
+            self.hot_conn.close()
+            if self.last_id:
+                self._save_latest_id()
+        self.hot_key = self.hot_conn = None
+
+    # ---- Reading ----
+
+    def _readable_path(self, key):
+        """Path of a partition's database, decompressing archived ones to the cache"""
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return path
+        if self.cache_dir is None:
+            self.cache_dir = tempfile.TemporaryDirectory(prefix='fire_events_')
+        cached = os.path.join(self.cache_dir.name, os.path.basename(path))
+        if not os.path.exists(cached):
+            with gzip.open(self.archive_path_for(key), 'rb') as src, open(cached + '.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            self._upgrade(cached + '.tmp')
+            os.replace(cached + '.tmp', cached)
+        return cached
+
+    def _keys_between(self, start=None, end=None):
+        keys = []
+        for key, _ in self.partitions():
+            first, last = self.key_range(key)
+            if (end is None or first.timestamp() < end) and (start is None or last.timestamp() > start):
+                keys.append(key)
+        return keys
+
+    def events(self, start=None, end=None, fire_detected_filter=None, mode=None, after_id=None, limit=None):
+        """fire_events rows across partitions in id order, optionally within [start, end) epoch seconds
+
+        after_id and limit page through the result (keyset pagination on id).
+        """
+        where, params = [], []
+        if start is not None:
+            where.append('timestamp >= ?')
+            params.append(datetime.fromtimestamp(start).strftime(TIME_FORMAT))
+        if end is not None:
+            where.append('timestamp < ?')
+            params.append(datetime.fromtimestamp(end).strftime(TIME_FORMAT))
+        if fire_detected_filter is not None:
+            where.append('fire_detected = ?')
+            params.append(fire_detected_filter)
+        if mode is not None:
+            where.append('mode = ?')
+            params.append(mode)
+        if after_id is not None:
+            where.append('id > ?')
+            params.append(after_id)
+        condition = f' WHERE {" AND ".join(where)}' if where else ''
+
+        keys = self._keys_between(start, end)
+        records = []
+        for i in range(0, len(keys), ATTACH_BATCH):
+            batch = keys[i:i + ATTACH_BATCH]
+            conn = sqlite3.connect(':memory:')
+            with self.lock:
+                for j, key in enumerate(batch):
+                    conn.execute(f'ATTACH DATABASE ? AS p{j}', (self._readable_path(key),))
+            union = ' UNION ALL '.join(f'SELECT {EVENT_COLUMNS} FROM p{j}.fire_events{condition}'
+                                       for j in range(len(batch)))
+            remaining = '' if limit is None else f' LIMIT {int(limit) - len(records)}'
+            records += conn.execute(f'{union} ORDER BY id{remaining}', params * len(batch)).fetchall()
+            conn.close()
+            if limit is not None and len(records) >= limit:
+                break
+        return records
+
+    # ---- Maintenance ----
+
+    def start_maintenance(self):
+        """Run retention and archival in a background thread (no-op while one is running)"""
+        with self.maintenance_lock:
+            if self.maintenance_thread and self.maintenance_thread.is_alive():
+                return
+            self.maintenance_thread = threading.Thread(target=self.maintain, name='partition-maintenance',
+                                                       daemon=True)
+            self.maintenance_thread.start()
+
+    def _maintenance_timer(self):
+        while not self.stopping.wait(self.maintenance_hours * 3600):
+            self.start_maintenance()
+
+    def maintain(self, now=None):
+        """Drop partitions past retention and archive cold ones, returns (dropped, archived) keys"""
+        now = now or datetime.now()
+        dropped, archived = [], []
+        for key, is_archived in self.partitions():
+            if key == self.hot_key:
+                continue
+            _, end = self.key_range(key)
+            age_days = (now - end).total_seconds() / 86400
+            if self.retention_days and age_days >= self.retention_days:
+                with self.lock:
+                    if key == self.hot_key:
+                        continue  # Reopened for late rows since the listing
+                    self._remove(key)
+                dropped.append(key)
+            elif self.archive_after_days and not is_archived and age_days >= self.archive_after_days:
+                if self._archive(key):
+                    archived.append(key)
+        for key in self.frame_keys():
+            if key not in dropped and key != self.hot_key and self.retention_days and \
+                    (now - self.key_range(key)[1]).total_seconds() / 86400 >= self.retention_days:
+                with self.lock:
+                    self._remove(key)
+                dropped.append(key)
+        if self.retention_days:
+            conn = self.catalog()
+            rollups.prune(conn.cursor(), (now - timedelta(days=self.retention_days)).timestamp())
+            conn.commit()
+            conn.close()
+        return dropped, archived
+
+    def _archive(self, key):
+        """Replace a cold partition by its compressed copy, False when the writer has reopened it"""
+        path = self.path_for(key)
+        compact = os.path.join(self.archive_dir, f'fire_events_{key}.vacuum')
+        target = self.archive_path_for(key)
+        # Held from the snapshot to the removal: rows written in between would be lost with the live file
+        with self.lock:
+            if key == self.hot_key or not os.path.exists(path):
+                return False
+            if os.path.exists(compact):
+                os.remove(compact)
+            conn = sqlite3.connect(path, timeout=10)
+            conn.execute('VACUUM INTO ?', (compact,))
+            conn.close()
+            with open(compact, 'rb') as src, gzip.open(target + '.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(compact)
+            os.replace(target + '.tmp', target)
+            self._remove(key, all_files=False)
+        return True
+
+    def _remove(self, key, all_files=True):
+        paths = [self.path_for(key) + suffix for suffix in ('', '-wal', '-shm')]
+        if all_files:
+            paths += [self.archive_path_for(key), self.frames_path_for(key), self.frames_path_for(key) + '.idx']
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        """Delete every partition and rollup"""
+        self.close_hot()
+        if self.maintenance_thread:
+            self.maintenance_thread.join()
+        with self.lock:
+            for key in {key for key, _ in self.partitions()} | set(self.frame_keys()):
+                self._remove(key)
+        conn = self.catalog()
+        for _, table in rollups.TABLES:
+            conn.execute(f'DELETE FROM {table}')
+        conn.execute('DELETE FROM id_sequence')
+        conn.commit()
+        conn.close()
+        self.last_id = 0
+
+    def import_legacy(self, db_name):
+        """Move rows and rollups of a single-file database into partitions (renamed to .migrated after)"""
+        legacy = sqlite3.connect(db_name)
+        tables = {r[0] for r in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'fire_events' in tables:
+            by_key = {}
+            for row in legacy.execute(f'SELECT {LEGACY_COLUMNS} FROM fire_events ORDER BY id'):
+                by_key.setdefault(self.key_for(row[1]), []).append(row)
+            for key, rows in sorted(by_key.items()):
+                conn = sqlite3.connect(self.path_for(key))
+                _create_events_table(conn.cursor())
+                conn.executemany(f'INSERT OR IGNORE INTO fire_events ({LEGACY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 rows)
+                conn.commit()
+                conn.close()
+        legacy.close()
+        conn = self.catalog()
+        conn.execute('ATTACH DATABASE ? AS legacy', (db_name,))
+        for _, table in rollups.TABLES:
+            if table in tables:
+                conn.execute(f'INSERT OR IGNORE INTO {table} SELECT * FROM legacy.{table}')
+        conn.commit()
+        conn.execute('DETACH DATABASE legacy')
+        conn.close()
+        os.replace(db_name, db_name + '.migrated')
+
+    def close(self):
+        self.stopping.set()
+        if self.timer_thread:
+            self.timer_thread.join()
+        self.close_hot()
+        if self.maintenance_thread:
+            self.maintenance_thread.join()
+        if self.cache_dir:
+            self.cache_dir.cleanup()
+            self.cache_dir = None
@@ -0,0 +1,149 @@
+"""
+Recording pipeline for detection messages, without Qt.
+
+Owned by whichever process stores data: the GUI in single-process mode, or
+ingest.py when ingestion runs in its own process. A detection message goes
+through the storage policy into the partitioned fire_events, into the
+minute/hour rollups, the frame archive (when it carries a frame) and the
+local API.
+"""
+import os
+from datetime import datetime
+
+import rollups
+from storage_policy import StoragePolicy, Sample, TIME_FORMAT
+from partitions import PartitionedStore
+from frame_archive import FrameStore
+from api_server import ApiServer
+
+
+class DatabaseManager:
+    """fire_events in per-day / per-week partition files, rollups in the catalog database"""
+
+    def __init__(self, db_name='fire_records.db', database_config=None):
+        self.db_name = db_name  # Single-file database of earlier versions, imported once
+        self.store = PartitionedStore.from_config(database_config)
+
+    def create_table(self):
+        if os.path.exists(self.db_name) and not self.store.partitions():
+            self.store.import_legacy(self.db_name)
+        self.store.start_maintenance()
+
+    def log_fire_event(self, timestamp, min_temp, max_temp, center_temp, fire_detected, mode,
+                       device=rollups.DEFAULT_DEVICE):
+        self.store.write_events([(timestamp, min_temp, max_temp, center_temp, fire_detected, mode, device)])
+
+    def log_samples(self, samples, device=rollups.DEFAULT_DEVICE):
+        """Store one device's storage-policy samples in one transaction per partition"""
+        self.store.write_events([(datetime.fromtimestamp(s.time).strftime(TIME_FORMAT), *s.values, s.fire, s.mode,
+                                  device) for s in samples])
+
+    def log_rollups(self, rows):
+        """Merge per-minute aggregates into the minute and hour rollup tables"""
+        conn = self.store.catalog()
+        rollups.merge_buckets(conn.cursor(), rows)
+        conn.commit()
+        conn.close()
+
+    def get_rollups(self, start, end, step, group_by=rollups.GROUP_COLUMNS, device=None):
+        """Aggregates per step over [start, end) from the coarsest sufficient rollup, returns (rows, table)"""
+        conn = self.store.catalog()
+        result = rollups.query(conn.cursor(), start, end, step, group_by, device, raw_records=self.store.events)
+        conn.close()
+        return result
+
+    def get_all_fire_events(self, fire_detected_filter=None, start=None, end=None, mode=None, after_id=None,
+                            limit=None):
+        return self.store.events(start, end, fire_detected_filter, mode, after_id, limit)
+
+    def clear(self):
+        self.store.clear()
+
+    def close(self):
+        self.store.close()
+
+
+class Recorder:
+    def __init__(self, config):
+        self.db_manager = DatabaseManager(database_config=config.get('database'))
+        self.db_manager.create_table()
+        self.storage_config = config.get('storage')
+        self.storage_policies = {}  # device -> StoragePolicy, so one device's samples never decide another's rows
+        self.rollup_accumulator = rollups.RollupAccumulator()
+        self.frame_store = FrameStore(self.db_manager.store)
+        self.latest_temps = {}      # device -> {'min', 'max', 'center'}
+
+        # Local HTTP/WebSocket API for other dashboards
+        self.api_error = None
+        self.api_server = ApiServer.from_config(self.db_manager, config.get('api'))
+        if self.api_server:
+            self.api_server.start()
+            if self.api_server.error:
+                self.api_error = self.api_server.error
+                self.api_server = None
+
+    def record(self, data, current_time, mode):
+        """Store one decoded detection message, returns the number of fire_events rows written"""
+        device = data.get('device', rollups.DEFAULT_DEVICE)
+        temps = self.latest_temps.setdefault(device, {})
+        for key, name in (('tMin', 'min'), ('tMax', 'max'), ('tCenter', 'center')):
+            if key in data:
+                temps[name] = float(data[key])
+
+        if self.api_server and "fireDetected" in data:
+            self.api_server.publish({'device': device, 'time': current_time.timestamp(),
+                                     'tMin': temps.get('min'), 'tMax': temps.get('max'), 'tCenter': temps.get('center'),
+                                     'fireDetected': bool(data['fireDetected']), 'mode': mode})
+
+        # Full 768-pixel frames, when the device sends them, go to the compressed frame archive
+        if "frame" in data:
+            self.frame_store.append(current_time.timestamp(), device, data["frame"])
+
+        if "fireDetected" not in data or len(temps) < 3:
+            return 0
+        # Only rows the device's storage policy keeps are written (transitions, deadband / swinging door, heartbeat)
+        sample = Sample(current_time.timestamp(), (temps['min'], temps['max'], temps['center']),
+                        bool(data["fireDetected"]), mode)
+        policy = self.storage_policies.get(device)
+        if policy is None:
+            policy = self.storage_policies[device] = StoragePolicy.from_config(self.storage_config)
+        stored = self.store_samples(policy.offer(sample), device)
+        finished = self.rollup_accumulator.add(sample, device)
+        if finished:
+            self.log_rollups(finished)
+        return stored
+
+    def store_samples(self, samples, device=rollups.DEFAULT_DEVICE):
+        if samples:
+            self.db_manager.log_samples(samples, device)
+            if self.api_server:
+                self.api_server.invalidate('events')
+        return len(samples)
+
+    def log_rollups(self, rows):
+        self.db_manager.log_rollups(rows)
+        if self.api_server:
+            self.api_server.invalidate('rollups')
+
+    def flush_rollups(self):
+        pending = self.rollup_accumulator.flush()
+        if pending:
+            self.log_rollups(pending)
+
+    def clear(self):
+        self.rollup_accumulator.flush()
+        self.frame_store.close()
+        self.db_manager.clear()
+        if self.api_server:
+            self.api_server.invalidate('events')
+            self.api_server.invalidate('rollups')
+
+    def close(self):
+        """Store the tail of the current storage segment and the partial rollup minute"""
+        for device, policy in self.storage_policies.items():
+            self.store_samples(policy.flush(), device)
+        self.flush_rollups()
+        self.frame_store.close()
+        if self.api_server:
+            self.api_server.stop()
+        self.db_manager.close()
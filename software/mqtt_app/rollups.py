@@ -0,0 +1,194 @@
+"""
+Incrementally maintained per-minute and per-hour rollups of detection samples.
+
+Every detection message is folded into an in-memory bucket per (minute,
+device, mode). Buckets are merged into rollup_minute and rollup_hour with an
+additive upsert (counts and sums add, min/max combine), so a partial minute
+can be flushed at any time and later samples of the same minute merge into
+the same row.
+
+Queries ask for a time range and a step; the coarsest table whose buckets
+tile the step is used (hour, then minute), and only steps finer than a
+minute fall back to the raw fire_events rows.
+"""
+from datetime import datetime
+
+from storage_policy import TIME_FORMAT
+
+CHANNELS = ('min_temp', 'max_temp', 'center_temp')
+TABLES = ((3600, 'rollup_hour'), (60, 'rollup_minute'))
+DEFAULT_DEVICE = 'ESP32'
+GROUP_COLUMNS = ('device', 'mode')
+
+_VALUE_COLUMNS = [f'{c}_{stat}' for c in CHANNELS for stat in ('min', 'max', 'sum')]
+_COLUMNS = ['bucket', 'device', 'mode', 'samples', 'fire_samples', 'fire_onsets'] + _VALUE_COLUMNS
+
+
+def create_tables(cursor):
+    for _, table in TABLES:
+        values = ',\n'.join(f'                {name} REAL NOT NULL' for name in _VALUE_COLUMNS)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket INTEGER NOT NULL,
+                device TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                samples INTEGER NOT NULL,
+                fire_samples INTEGER NOT NULL,
+                fire_onsets INTEGER NOT NULL,
+{values},
+                PRIMARY KEY (bucket, device, mode)
+            ) WITHOUT ROWID
+        ''')
+
+
+def _upsert_sql(table):
+    merge = ['samples = samples + excluded.samples',
+             'fire_samples = fire_samples + excluded.fire_samples',
+             'fire_onsets = fire_onsets + excluded.fire_onsets']
+    for c in CHANNELS:
+        merge += [f'{c}_min = min({c}_min, excluded.{c}_min)',
+                  f'{c}_max = max({c}_max, excluded.{c}_max)',
+                  f'{c}_sum = {c}_sum + excluded.{c}_sum']
+    return (f'INSERT INTO {table} ({", ".join(_COLUMNS)}) VALUES ({", ".join("?" * len(_COLUMNS))}) '
+            f'ON CONFLICT (bucket, device, mode) DO UPDATE SET {", ".join(merge)}')
+
+
+def merge_buckets(cursor, rows):
+    """Upsert minute aggregates (tuples in _COLUMNS order) into every rollup table"""
+    for size, table in TABLES:
+        cursor.executemany(_upsert_sql(table), [(row[0] // size * size,) + tuple(row[1:]) for row in rows])
+
+
+def _new_aggregate(values):
+    agg = [0, 0, 0]
+    for v in values:
+        agg += [v, v, 0.0]
+    return agg
+
+
+def _fold(agg, values, fire, onset):
+    agg[0] += 1
+    agg[1] += fire
+    agg[2] += onset
+    for i, v in enumerate(values):
+        j = 3 + 3 * i
+        if v < agg[j]:
+            agg[j] = v
+        if v > agg[j + 1]:
+            agg[j + 1] = v
+        agg[j + 2] += v
+
+
+class RollupAccumulator:
+    """Per-minute aggregates of the samples seen since the last flush"""
+
+    def __init__(self):
+        self.buckets = {}      # (minute, device, mode) -> [samples, fire, onsets, then min, max, sum per channel]
+        self.last_fire = {}    # device -> fire state of its previous sample
+        self.current_minute = None
+
+    def add(self, sample, device=DEFAULT_DEVICE):
+        """Fold one storage_policy.Sample in, returns finished minute rows when the minute rolls over"""
+        minute = int(sample.time // 60) * 60
+        finished = []
+        if self.current_minute is not None and minute != self.current_minute:
+            finished = self.flush()
+        self.current_minute = minute
+
+        onset = sample.fire and not self.last_fire.get(device, False)
+        self.last_fire[device] = sample.fire
+        key = (minute, device, sample.mode)
+        agg = self.buckets.get(key)
+        if agg is None:
+            agg = self.buckets[key] = _new_aggregate(sample.values)
+        _fold(agg, sample.values, sample.fire, onset)
+        return finished
+
+    def flush(self):
+        """All pending aggregates as rows, safe to call mid-minute (the upsert merges)"""
+        rows = [key + tuple(agg) for key, agg in sorted(self.buckets.items())]
+        self.buckets.clear()
+        return rows
+
+
+def choose_table(start, end, step):
+    """Coarsest rollup table whose buckets tile [start, end) in steps of `step`, None for raw rows"""
+    for size, table in TABLES:
+        if step % size == 0 and start % size == 0 and end % size == 0:
+            return table
+    return None
+
+
+def _result(bucket, group, agg):
+    samples = agg[0]
+    row = {'bucket': int(bucket), 'device': group.get('device'), 'mode': group.get('mode'),
+           'samples': int(samples), 'fire_samples': int(agg[1]), 'fire_onsets': int(agg[2])}
+    for i, c in enumerate(CHANNELS):
+        lo, hi, total = agg[3 + 3 * i:6 + 3 * i]
+        row[f'{c}_min'], row[f'{c}_max'], row[f'{c}_avg'] = lo, hi, total / samples if samples else None
+    return row
+
+
+def align(start, end, step):
+    """Floor start and ceil end to the step"""
+    step = int(step)
+    return int(start) // step * step, -(-int(end) // step) * step
+
+
+def query(cursor, start, end, step, group_by=GROUP_COLUMNS, device=None, raw_records=None):
+    """Aggregates per step-aligned bucket over [start, end) epoch seconds
+
+    start is floored and end ceiled to the step; group_by is a subset of
+    ('device', 'mode'). Sub-minute steps aggregate fire_events rows, read with
+    raw_records(start, end) when given. Returns (rows as dicts ordered by
+    bucket, source table).
+    """
+    step = int(step)
+    start, end = align(start, end, step)
+    group_by = [g for g in GROUP_COLUMNS if g in group_by]
+    table = choose_table(start, end, step)
+    if table is None:
+        records = raw_records(start, end) if raw_records else _raw_records(cursor, start, end)
+        if device:
+            records = [r for r in records if r[7] == device]
+        return aggregate_records(records, step, group_by), 'fire_events'
+
+    select = ', '.join(f'min({c}_min), max({c}_max), sum({c}_sum)' for c in CHANNELS)
+    groups = ''.join(f', {g}' for g in group_by)
+    where = 'bucket >= ? AND bucket < ?' + (' AND device = ?' if device else '')
+    params = [start, end] + ([device] if device else [])
+    cursor.execute(f'SELECT bucket / {step} * {step} AS b{groups}, sum(samples), sum(fire_samples), '
+                   f'sum(fire_onsets), {select} FROM {table} WHERE {where} '
+                   f'GROUP BY b{groups} ORDER BY b{groups}', params)
+    n = len(group_by)
+    return [_result(r[0], dict(zip(group_by, r[1:1 + n])), r[1 + n:]) for r in cursor.fetchall()], table
+
+
+def prune(cursor, before):
+    """Drop minute rollups older than `before` (hour rollups are kept)"""
+    cursor.execute('DELETE FROM rollup_minute WHERE bucket < ?', (int(before),))
+
+
+def _raw_records(cursor, start, end):
+    cursor.execute('SELECT id, timestamp, min_temp, max_temp, center_temp, fire_detected, mode, device FROM fire_events '
+                   'WHERE timestamp >= ? AND timestamp < ? ORDER BY id',
+                   (datetime.fromtimestamp(start).strftime(TIME_FORMAT),
+                    datetime.fromtimestamp(end).strftime(TIME_FORMAT)))
+    return cursor.fetchall()
+
+
+def aggregate_records(records, step, group_by=GROUP_COLUMNS):
+    """Aggregate fire_events rows (storage-policy samples) per step, onsets counted per device"""
+    aggregates = {}
+    previous_fire = {}
+    for _, timestamp, t_min, t_max, t_center, fire, mode, device in records:
+        bucket = int(datetime.strptime(timestamp, TIME_FORMAT).timestamp()) // step * step
+        key = (bucket, device if 'device' in group_by else '', mode if 'mode' in group_by else '')
+        values = (t_min, t_max, t_center)
+        agg = aggregates.get(key)
+        if agg is None:
+            agg = aggregates[key] = _new_aggregate(values)
+        _fold(agg, values, bool(fire), bool(fire) and not previous_fire.get(device, False))
+        previous_fire[device] = bool(fire)
+    return [_result(bucket, {g: value for g, value in (('device', device), ('mode', mode)) if g in group_by}, agg)
+            for (bucket, device, mode), agg in sorted(aggregates.items())]
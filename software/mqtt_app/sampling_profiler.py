@@ -0,0 +1,163 @@
+"""
+Sampling profiler for every thread of the running process, without Qt.
+
+A daemon thread wakes every `interval` seconds, takes sys._current_frames()
+and counts each thread's call stack (GUI thread, paho's network thread,
+storage maintenance, API server, ...). Nothing is installed in the profiled
+threads, so the cost is one stack walk per thread per sample and the
+profiler can be started and stopped while the application runs.
+
+Results are written as collapsed stacks (one "thread;outer;...;inner count"
+line per stack, for flamegraph.pl / inferno / speedscope) and as a
+speedscope JSON file with one sampled profile per thread.
+
+Usage from the command line, profiling a script:
+    python sampling_profiler.py --duration 30 --output profiles/run ingest.py
+"""
+import os
+import sys
+import json
+import time
+import runpy
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime
+
+DEFAULT_PROFILER = {'duration': 30.0, 'interval_ms': 5.0, 'directory': 'profiles'}
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+def _frame_key(frame):
+    code = frame.f_code
+    return (getattr(code, 'co_qualname', code.co_name), code.co_filename, code.co_firstlineno)
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()   # (thread name, (frame key, ...) outermost first) -> samples
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self.stacks.clear()
+        self.samples = 0
+        self.stop_event.clear()
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_key(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[(names.get(ident, f'thread-{ident}'), tuple(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Collapsed-stack lines, heaviest first"""
+        return [';'.join([thread] + [f'{name} ({os.path.basename(path)}:{line})' for name, path, line in stack])
+                + f' {count}' for (thread, stack), count in self.stacks.most_common()]
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+
+    def write_speedscope(self, path, name='profile'):
+        frames, index = [], {}
+        profiles = {}
+        # Samples are rarer than the interval when threads hold the GIL, so weigh them by the measured time
+        weight = self.elapsed / self.samples if self.samples and self.elapsed else self.interval
+        for (thread, stack), count in self.stacks.items():
+            ids = []
+            for key in stack:
+                if key not in index:
+                    index[key] = len(frames)
+                    frames.append({'name': key[0], 'file': key[1], 'line': key[2]})
+                ids.append(index[key])
+            profile = profiles.setdefault(thread, {'type': 'sampled', 'name': thread, 'unit': 'seconds',
+                                                   'startValue': 0, 'endValue': 0, 'samples': [], 'weights': []})
+            profile['samples'].append(ids)
+            profile['weights'].append(count * weight)
+            profile['endValue'] += count * weight
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'$schema': SPEEDSCOPE_SCHEMA, 'name': name, 'exporter': 'sampling_profiler.py',
+                       'shared': {'frames': frames},
+                       'profiles': sorted(profiles.values(), key=lambda p: -p['endValue'])}, f)
+
+    def save(self, prefix):
+        """Write prefix.collapsed and prefix.speedscope.json, returns both paths"""
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        paths = (prefix + '.collapsed', prefix + '.speedscope.json')
+        self.write_collapsed(paths[0])
+        self.write_speedscope(paths[1], os.path.basename(prefix))
+        return paths
+
+
+def output_prefix(config=None, label='gui'):
+    config = dict(DEFAULT_PROFILER, **(config or {}))
+    return os.path.join(config['directory'], f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{label}")
+
+
+def capture(duration, prefix, interval=0.005, done=None):
+    """Profile in the background for `duration` seconds, then save; done(paths) is called from a worker thread"""
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+
+    def finish():
+        profiler.stop()
+        paths = profiler.save(prefix)
+        if done:
+            done(paths)
+    timer = threading.Timer(duration, finish)
+    timer.daemon = True
+    timer.start()
+    return profiler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile a Python script by sampling all of its threads')
+    parser.add_argument('--duration', type=float, default=DEFAULT_PROFILER['duration'],
+                        help='Seconds to profile (the script keeps running afterwards)')
+    parser.add_argument('--interval-ms', type=float, default=DEFAULT_PROFILER['interval_ms'])
+    parser.add_argument('--output', help='Output prefix (default profiles/profile_<time>_<script>)')
+    parser.add_argument('script')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    prefix = args.output or output_prefix(label=os.path.splitext(os.path.basename(args.script))[0])
+    capture(args.duration, prefix, args.interval_ms / 1000, done=lambda paths: print(f'Profile written: {paths}'))
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    runpy.run_path(args.script, run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Single-writer ring buffer of fixed-size records in multiprocessing.shared_memory.
+
+The ingest process writes; any number of readers map the same segment and
+read numpy structured views of the slots without copying. Each slot carries
+the 1-based sequence number of the record in it: the writer zeroes it,
+fills the slot, then stores the sequence and finally advances the header's
+write_seq. A reader keeps its own cursor, and a slot whose sequence does not
+match (being rewritten, or already lapped) counts as lost for that reader only.
+Readers never block the writer.
+"""
+import os
+import sys
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+MAGIC = b'FRNG'
+VERSION = 1
+
+KIND_DETECTION = 1   # Decoded detection update (temperatures, fire state, rows stored)
+KIND_MESSAGE = 2     # Raw MQTT message for the debug log (payload may be truncated)
+KIND_STATUS = 3      # Connection status change or ingest notice
+
+HEADER = np.dtype([('magic', 'S4'), ('version', '<u4'), ('capacity', '<u4'), ('record_size', '<u4'),
+                   ('write_seq', '<u8'), ('writer_pid', '<u4'), ('pad', 'V36')])
+RECORD = np.dtype([('seq', '<u8'), ('time', '<f8'),
+                   ('kind', 'u1'), ('fire', 'u1'), ('stored', 'u1'), ('connected', 'u1'), ('truncated', 'u1'),
+                   ('pad', 'V3'),
+                   ('t_min', '<f4'), ('t_max', '<f4'), ('t_center', '<f4'), ('payload_len', '<u4'),
+                   ('device', 'S24'), ('mode', 'S24'), ('topic', 'S64'), ('payload', 'S256')])
+PAYLOAD_BYTES = RECORD.fields['payload'][0].itemsize
+
+
+class SharedRing:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), dtype=HEADER, buffer=shm.buf)
+        if self.header['magic'] != MAGIC or self.header['version'] != VERSION:
+            raise ValueError(f"Shared memory '{shm.name}' is not a record ring")
+        self.capacity = int(self.header['capacity'])
+        self.slots = np.ndarray((self.capacity,), dtype=RECORD, buffer=shm.buf, offset=HEADER.itemsize)
+
+    @classmethod
+    def create(cls, name, capacity=4096):
+        """Create the ring (replacing a stale segment of the same name)"""
+        size = HEADER.itemsize + capacity * RECORD.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        header = np.ndarray((), dtype=HEADER, buffer=shm.buf)
+        header[()] = (MAGIC, VERSION, capacity, RECORD.itemsize, 0, os.getpid(), b'')
+        np.ndarray((capacity,), dtype=RECORD, buffer=shm.buf, offset=HEADER.itemsize)['seq'] = 0
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Map an existing ring for reading; raises FileNotFoundError when no writer created it"""
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name)
+            # Before 3.13 the resource tracker would unlink the writer's segment when this reader exits
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+
+    @property
+    def write_seq(self):
+        return int(self.header['write_seq'])
+
+    def write(self, kind, time, **fields):
+        """Append one record (writer only); payload bytes beyond the slot are cut and flagged"""
+        seq = self.write_seq
+        slot = self.slots[seq % self.capacity]
+        slot['seq'] = 0
+        payload = fields.pop('payload', b'')
+        slot['truncated'] = len(payload) > PAYLOAD_BYTES
+        slot['payload_len'] = len(payload)
+        slot['payload'] = payload[:PAYLOAD_BYTES]
+        slot['kind'] = kind
+        slot['time'] = time
+        for name in ('fire', 'stored', 'connected', 't_min', 't_max', 't_center', 'device', 'mode', 'topic'):
+            value = fields.get(name, b'' if RECORD.fields[name][0].kind == 'S' else 0)
+            slot[name] = value.encode()[:RECORD.fields[name][0].itemsize] if isinstance(value, str) else value
+        slot['seq'] = seq + 1
+        self.header['write_seq'] = seq + 1
+
+    def read(self, cursor, limit=None):
+        """Views of the records after `cursor`: (list of slot views, new cursor, lost records)
+
+        A cursor of None starts at the current end. At most two views are
+        returned (the ring wraps); their contents stay valid until the writer
+        laps them, so process them before the next read.
+        """
+        end = self.write_seq
+        if cursor is None or cursor > end:
+            return [], end, 0
+        start = max(cursor, end - self.capacity + 1)   # Leave the slot the writer is filling next
+        if limit is not None:
+            start = max(start, end - limit)
+        lost = start - cursor
+        views = []
+        position = start
+        while position < end:
+            slot = position % self.capacity
+            count = min(end - position, self.capacity - slot)
+            view = self.slots[slot:slot + count]
+            valid = view['seq'] == np.arange(position + 1, position + count + 1, dtype=np.uint64)
+            if not valid.all():
+                lost += int(np.count_nonzero(~valid))
+                view = view[valid]   # Boolean indexing copies, only when some slots were lapped
+            views.append(view)
+            position += count
+        return views, end, lost
+
+    def close(self):
+        self.header = self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,186 @@
+"""
+Soak test: drive synthetic traffic through MQTTDemo offscreen for hours of simulated time.
+
+The window runs with the offscreen Qt platform in a scratch directory
+(recording in-process, API off) and receives detection messages exactly as
+from MQTT, with a simulated clock advancing by the message interval, plus a
+configuration update every simulated hour. Every sample interval the
+harness records resident memory, the traced Python heap, Qt object and
+widget counts, record table rows, log lines, chart points and CPU time per
+message.
+
+After the warm-up the first sample becomes the baseline. At the end the
+growth since the baseline is compared with the budget (memory_stats.DEFAULT_BUDGET,
+overridden with --budget), the top growing allocation sites are printed,
+and the exit status is 1 when any budget is exceeded.
+
+Usage:
+    python soak.py --hours 6 --rate 1 --csv soak.csv
+    python soak.py --hours 48 --rate 2 --budget rss_growth_mb=32 --budget cpu_ms_per_message=10
+"""
+import os
+import sys
+import gc
+import csv
+import json
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication
+
+import main
+from memory_stats import MemoryMonitor, DEFAULT_BUDGET, format_bytes
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SimulatedDatetime(datetime):
+    """datetime whose now() follows the harness clock, so storage, rollups and charts see simulated time"""
+    current = 0.0
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.fromtimestamp(cls.current, tz)
+
+
+def synthetic_messages(rng, rate, fire_interval):
+    """Endless (topic, payload) stream of one device; a fire episode starts every fire_interval s on average"""
+    center = 28.0
+    fire_left = 0
+    index = 0
+    while True:
+        if fire_left == 0 and rng.random() < 1 / (fire_interval * rate):
+            fire_left = int(rng.uniform(30, 120) * rate)
+        target = 60.0 if fire_left else 28.0
+        center += (target - center) * 0.05 + rng.gauss(0, 0.3)
+        yield "/ESP32/detection_data", json.dumps({
+            "tMin": round(center - 6 + rng.gauss(0, 0.2), 2), "tMax": round(center + 4 + rng.gauss(0, 0.2), 2),
+            "tCenter": round(center, 2), "fireDetected": int(fire_left > 0)})
+        fire_left = max(0, fire_left - 1)
+        index += 1
+        if index % int(3600 * rate) == 0:
+            yield "/ESP32/config_update", json.dumps({"measurement_mode": rng.randint(1, 4), "threshold_1": 35.0})
+
+
+def parse_budget(items):
+    budget = {}
+    for item in items:
+        key, _, value = item.partition('=')
+        if key not in DEFAULT_BUDGET:
+            raise SystemExit(f"Unknown budget '{key}', expected one of {', '.join(DEFAULT_BUDGET)}")
+        budget[key] = float(value)
+    return budget
+
+
+def write_config(directory):
+    try:
+        with open(os.path.join(APP_DIR, 'config.json')) as f:
+            storage = json.load(f).get('storage', {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        storage = {}
+    config = {'storage': storage, 'database': {'directory': 'records'}, 'api': {'enabled': False},
+              'ingest': {'separate_process': False}}
+    with open(os.path.join(directory, 'config.json'), 'w') as f:
+        json.dump(config, f, indent=4)
+
+
+def report(monitor, violations, top):
+    growth = monitor.growth()
+    print('\nGrowth since the baseline:')
+    for key, value in growth.items():
+        if key in ('time', 'cpu', 'messages'):
+            continue
+        print(f'    {key:<14}{format_bytes(value) if key in ("rss", "python_heap") else value:>12}')
+    cpu = monitor.cpu_per_message()
+    if cpu is not None:
+        print(f'    {"cpu/message":<14}{cpu * 1000:>9.2f} ms')
+    if top:
+        print('\nTop growing allocation sites:')
+        for stat in top:
+            print(f'    {stat}')
+    print('\n' + ('\n'.join(f'FAIL {v}' for v in violations) if violations else 'PASS: within budget'))
+
+
+def main_soak():
+    parser = argparse.ArgumentParser(description='Soak-test the dashboard offscreen with synthetic traffic')
+    parser.add_argument('--hours', type=float, default=6.0, help='Simulated hours of traffic')
+    parser.add_argument('--rate', type=float, default=1.0, help='Detection messages per simulated second')
+    parser.add_argument('--fire-interval', type=float, default=1800.0, help='Mean seconds between fire episodes')
+    parser.add_argument('--sample-minutes', type=float, default=10.0, help='Simulated minutes between samples')
+    parser.add_argument('--warmup', type=float, default=0.1, help='Fraction of the run before the baseline')
+    parser.add_argument('--events-every', type=int, default=20, help='Messages between Qt event processing')
+    parser.add_argument('--trace-frames', type=int, default=1,
+                        help='tracemalloc frames per allocation, 0 disables it (it also slows every message)')
+    parser.add_argument('--budget', action='append', default=[], metavar='KEY=VALUE',
+                        help=f'Override a budget: {", ".join(f"{k}={v}" for k, v in DEFAULT_BUDGET.items())}')
+    parser.add_argument('--csv', help='Write every sample to this CSV file')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directory with the recorded data')
+    args = parser.parse_args()
+    budget = parse_budget(args.budget)
+    csv_path = os.path.abspath(args.csv) if args.csv else None
+
+    workdir = tempfile.mkdtemp(prefix='soak_')
+    write_config(workdir)
+    os.chdir(workdir)
+    main.datetime = SimulatedDatetime
+    SimulatedDatetime.current = datetime.now().timestamp()  # Runs ahead of real time, so retention never drops it
+
+    app = QApplication(sys.argv)
+    window = main.MQTTDemo()
+    window.memory_timer.stop()  # The harness samples on simulated time instead
+    window.show()
+    monitor = MemoryMonitor(trace_frames=args.trace_frames, history=None)
+
+    total = int(args.hours * 3600 * args.rate)
+    warmup = max(1, int(total * args.warmup))
+    interval = 1 / args.rate
+    sample_every = max(1, int(args.sample_minutes * 60 * args.rate))
+    messages = synthetic_messages(random.Random(args.seed), args.rate, args.fire_interval)
+    print(f'{total} messages over {args.hours} simulated hours in {workdir}')
+
+    def take_sample():
+        app.processEvents()
+        gc.collect()
+        sample = monitor.sample(**window.memory_counts())
+        print(f"[{datetime.fromtimestamp(SimulatedDatetime.current):%m-%d %H:%M}] {sample['messages']:>8} msgs  "
+              f"rss {format_bytes(sample['rss'])}  heap {format_bytes(sample['python_heap'])}  "
+              f"qt {sample['qt_objects']}  rows {sample['table_rows']}  log {sample['log_lines']}", flush=True)
+
+    for index in range(total):
+        SimulatedDatetime.current += interval
+        topic, payload = next(messages)
+        window.on_message_received(topic, payload)
+        monitor.messages = index + 1
+        if (index + 1) % args.events_every == 0:
+            app.processEvents()
+        if index + 1 == warmup:
+            take_sample()
+            monitor.set_baseline()
+        elif (index + 1) % sample_every == 0 or index + 1 == total:
+            take_sample()
+
+    violations = monitor.check(budget)
+    report(monitor, violations, monitor.top_allocators())
+    if csv_path:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(monitor.samples[0]))
+            writer.writeheader()
+            writer.writerows(monitor.samples)
+
+    window.close()
+    os.chdir(APP_DIR)
+    if args.keep:
+        print(f'Recorded data kept in {workdir}')
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_soak())
@@ -0,0 +1,154 @@
+"""
+Storage policy for detection records.
+
+Decides which /ESP32/detection_data messages become fire_events rows, so the
+table grows with information content instead of publish rate:
+
+- Every fire-state change is stored, together with the last sample of the
+  previous state, so the edge is exact.
+- 'deadband': a sample is stored when any temperature channel moved more than
+  `deadband` °C away from the last stored row (reconstruct with hold).
+- 'swinging_door': a sample is kept only where a straight line between stored
+  rows would miss a skipped sample by more than `deviation` °C on some
+  channel (reconstruct with linear interpolation, error <= deviation).
+- 'all': every message is stored (the default, and the previous behaviour);
+  the lossy modes above are opt-in.
+- In every mode a heartbeat row is written at least every `heartbeat` seconds.
+"""
+import math
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime
+
+MODES = ('all', 'deadband', 'swinging_door')
+DEFAULT_POLICY = {'mode': 'all', 'deadband': 0.5, 'deviation': 0.5, 'heartbeat': 60.0}
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# time: epoch seconds, values: (min, max, center) °C, fire: bool, mode: detection mode text
+Sample = namedtuple('Sample', 'time values fire mode')
+
+
+class StoragePolicy:
+    """Filter a stream of samples down to the rows worth storing"""
+
+    def __init__(self, mode='all', deadband=0.5, deviation=0.5, heartbeat=60.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown storage mode '{mode}', expected one of {MODES}")
+        self.mode = mode
+        self.deadband = float(deadband)
+        self.deviation = float(deviation)
+        self.heartbeat = float(heartbeat)
+        self.received = 0
+        self.stored = 0
+        self.previous = None          # Last offered sample
+        self.previous_stored = False
+        self.anchor = None            # Last stored sample, start of the current segment
+        self.low = self.high = None   # Per-channel slope bounds of the current segment
+
+    @classmethod
+    def from_config(cls, config=None):
+        return cls(**dict(DEFAULT_POLICY, **(config or {})))
+
+    def offer(self, sample):
+        """Feed one sample, returns the samples to store now (oldest first)"""
+        self.received += 1
+        rows = []
+        if self.mode == 'all' or self.previous is None:
+            store = True
+        else:
+            transition = sample.fire != self.previous.fire
+            heartbeat = self.heartbeat > 0 and sample.time - self.anchor.time >= self.heartbeat
+            if self.mode == 'deadband':
+                store = transition or heartbeat or any(
+                    abs(v - a) > self.deadband for v, a in zip(sample.values, self.anchor.values))
+                if transition and not self.previous_stored:
+                    rows.append(self._keep(self.previous))
+            else:
+                # A skipped sample would be off the line to this one: the previous sample becomes a vertex
+                if (transition or not self._fits(sample)) and not self.previous_stored:
+                    rows.append(self._keep(self.previous))
+                store = transition or heartbeat
+                if not store:
+                    self._extend(sample)
+        if store:
+            rows.append(self._keep(sample))
+        self.previous = sample
+        self.previous_stored = store
+        return rows
+
+    def flush(self):
+        """Samples still pending (the tail of the current segment), call before closing"""
+        if self.previous is None or self.previous_stored:
+            return []
+        self.previous_stored = True
+        return [self._keep(self.previous)]
+
+    def ratio(self):
+        """Received messages per stored row"""
+        return self.received / max(self.stored, 1)
+
+    def _keep(self, sample):
+        self.stored += 1
+        self.anchor = sample
+        self.low = [-math.inf] * len(sample.values)
+        self.high = [math.inf] * len(sample.values)
+        return sample
+
+    def _slopes(self, sample):
+        dt = max(sample.time - self.anchor.time, 1e-3)
+        return dt, [(v - a) / dt for v, a in zip(sample.values, self.anchor.values)]
+
+    def _fits(self, sample):
+        """Does the line from the anchor to this sample stay within deviation of every skipped sample"""
+        _, slopes = self._slopes(sample)
+        return all(lo <= s <= hi for s, lo, hi in zip(slopes, self.low, self.high))
+
+    def _extend(self, sample):
+        """Skip this sample: narrow the slopes a later segment end may take"""
+        dt, slopes = self._slopes(sample)
+        door = self.deviation / dt
+        self.low = [max(lo, s - door) for s, lo in zip(slopes, self.low)]
+        self.high = [min(hi, s + door) for s, hi in zip(slopes, self.high)]
+
+
+def samples_from_records(records):
+    """One device's fire_events rows (id, timestamp, min, max, center, fire, mode, ...) -> samples ordered by time"""
+    samples = [Sample(datetime.strptime(r[1], TIME_FORMAT).timestamp(), (r[2], r[3], r[4]), bool(r[5]), r[6])
+               for r in records]
+    samples.sort(key=lambda s: s.time)
+    return samples
+
+
+def reconstruct(samples, times, method='linear'):
+    """Values and fire state at the given epoch times: 'linear' for swinging door, 'hold' for deadband
+
+    Returns one (values, fire) per time, None before the first stored sample.
+    Fire state is always held, since every transition is stored.
+    """
+    if method not in ('linear', 'hold'):
+        raise ValueError(f"Unknown reconstruction method '{method}'")
+    stamps = [s.time for s in samples]
+    out = []
+    for t in times:
+        i = bisect_right(stamps, t) - 1
+        if i < 0:
+            out.append(None)
+            continue
+        left = samples[i]
+        if method == 'hold' or i + 1 == len(samples) or left.fire != samples[i + 1].fire:
+            out.append((left.values, left.fire))
+            continue
+        right = samples[i + 1]
+        w = (t - left.time) / (right.time - left.time) if right.time > left.time else 0.0
+        out.append((tuple(a + (b - a) * w for a, b in zip(left.values, right.values)), left.fire))
+    return out
+
+
+def resample(samples, step=1.0, method='linear'):
+    """Regular series (times, values, fire) across the stored samples, for charts"""
+    if not samples:
+        return [], [], []
+    start, end = samples[0].time, samples[-1].time
+    times = [start + i * step for i in range(int((end - start) // step) + 1)]
+    points = reconstruct(samples, times, method)
+    return times, [p[0] for p in points], [p[1] for p in points]